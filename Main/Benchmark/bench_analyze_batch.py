@@ -0,0 +1,83 @@
+import argparse
+import os
+import shutil
+import sys
+import time
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+root_dir = os.path.dirname(os.path.dirname(current_dir))
+if root_dir not in sys.path:
+    sys.path.append(root_dir)
+
+from Main.Benchmark.stub_jisho import isolated_definitions, start_stub_server
+
+"""
+    Compares analysing a paragraph with one /hover_analyze request per word (what the extension does on hover) against
+    a single /analyze_batch request. Both run with the response cache disabled, after one untimed pass so definitions
+    are cached alike. The paragraph is read from a file or made of the first sentences of the book index.
+
+    Usage: python Main/Benchmark/bench_analyze_batch.py [paragraph.txt] [--sentences N] [--level N3]
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-hover versus batch analysis benchmark")
+    parser.add_argument("paragraph", nargs="?", help="text file to analyse")
+    parser.add_argument("--sentences", type=int, default=10, help="indexed sentences used when no file is given")
+    parser.add_argument("--level", default="N5")
+    args = parser.parse_args()
+
+    stub, api_url = start_stub_server()
+    os.environ["JISHO_API_URL"] = api_url
+    from Main import server
+    from Main.Model import sudachipi, tokenizer_pool
+    # Books added since the last start are indexed in the background, which would disturb the measurements
+    server.start().wait_until_finished()
+
+    jlpt_lists = server.user.JLPT_lists
+    cache_directory = isolated_definitions(jlpt_lists, api_url)
+    server.user.response_cache.resize(0)
+
+    if args.paragraph:
+        with open(args.paragraph, 'r', encoding='utf-8') as file:
+            text = file.read()[:server.MAX_BATCH_TEXT]
+    else:
+        index = server.user.sentence_dictionary.index
+        text = "".join(index.get_sentence(sentence_id).strip()
+                       for sentence_id in range(min(args.sentences, len(index))))
+
+    offsets = []
+    position = 0
+    for token in tokenizer_pool.tokenize(text):
+        if sudachipi.is_content_token(token):
+            offsets.append(position)
+        position += len(token.surface())
+    client = server.app.test_client()
+
+    def per_hover():
+        for offset in offsets:
+            client.post('/hover_analyze', json={'text': text, 'offset': offset, 'level': args.level})
+
+    def batch():
+        return client.post('/analyze_batch', json={'text': text, 'level': args.level}).get_json()
+
+    per_hover()
+    response = batch()
+    start = time.perf_counter()
+    per_hover()
+    hover_time = time.perf_counter() - start
+    start = time.perf_counter()
+    batch()
+    batch_time = time.perf_counter() - start
+
+    print(f"{len(text)} characters, {len(offsets)} words, {len(response['words'])} distinct")
+    print(f"One /hover_analyze per word: {hover_time * 1000:8.1f} ms")
+    print(f"One /analyze_batch:          {batch_time * 1000:8.1f} ms")
+
+    stub.shutdown()
+    jlpt_lists.definitions.cache.close()
+    shutil.rmtree(cache_directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
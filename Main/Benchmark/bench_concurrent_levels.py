@@ -0,0 +1,125 @@
+import argparse
+import json
+import logging
+import os
+import random
+import shutil
+import sys
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+root_dir = os.path.dirname(os.path.dirname(current_dir))
+if root_dir not in sys.path:
+    sys.path.append(root_dir)
+
+from Main.Benchmark.stub_jisho import isolated_definitions, start_stub_server
+
+"""
+    Load test of /hover_analyze under concurrent requests for mixed JLPT levels. Hovers over the words of sentences
+    from the book index are first answered one at a time, for every level, to record the expected responses. They are
+    then replayed in random order from many threads against the threaded server, and every response has to equal the
+    one recorded for it. The response cache is disabled, so each request is searched and ranked again.
+
+    Definitions come from the offline dictionary or the local Jisho stub and are cached in a temporary database, so the
+    real definition cache is left untouched.
+
+    Usage: python Main/Benchmark/bench_concurrent_levels.py [--sentences N] [--threads N] [--rounds N]
+"""
+
+LEVELS = ["N5", "N4", "N3", "N2", "N1"]
+
+
+def hover_requests(index, tokenizer_pool, sentence_count, words_per_sentence):
+    """
+    :return: (text, offset) of hovers over the first words of the first sentences in the index
+    """
+    hovers = []
+    for sentence_id in range(len(index)):
+        if len(hovers) >= sentence_count * words_per_sentence:
+            break
+        if hasattr(index, "is_live") and not index.is_live(sentence_id):
+            continue
+        text = index.get_sentence(sentence_id).strip()
+        if not text:
+            continue
+        position = 0
+        for token in list(tokenizer_pool.tokenize(text))[:words_per_sentence]:
+            hovers.append((text, position))
+            position += len(token.surface())
+    return hovers
+
+
+def post(url, payload):
+    data = json.dumps(payload).encode('utf-8')
+    http_request = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(http_request, timeout=60) as response:
+        return json.loads(response.read().decode('utf-8'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent mixed-level /hover_analyze load test")
+    parser.add_argument("--sentences", type=int, default=40, help="number of indexed sentences to hover over")
+    parser.add_argument("--words", type=int, default=3, help="words hovered per sentence")
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--rounds", type=int, default=3, help="times every request is replayed concurrently")
+    args = parser.parse_args()
+
+    stub, api_url = start_stub_server()
+    os.environ["JISHO_API_URL"] = api_url
+    from werkzeug.serving import make_server
+    from Main import server
+    from Main.Model import tokenizer_pool
+    # Books added since the last start are indexed in the background, which would disturb the measurements
+    server.start().wait_until_finished()
+
+    jlpt_lists = server.user.JLPT_lists
+    cache_directory = isolated_definitions(jlpt_lists, api_url)
+    server.user.response_cache.resize(0)
+
+    hovers = hover_requests(server.user.sentence_dictionary.index, tokenizer_pool, args.sentences, args.words)
+    if not hovers:
+        print("The book index is empty, add books to book_files first.")
+        return
+    requests = [{"text": text, "offset": offset, "level": level} for text, offset in hovers for level in LEVELS]
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    http_server = make_server("127.0.0.1", 0, server.app, threaded=True)
+    threading.Thread(target=http_server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{http_server.server_port}/hover_analyze"
+
+    # Also fills the definition caches, so both timings below see the same caches
+    expected = [post(url, payload) for payload in requests]
+    varying = sum(1 for i in range(0, len(expected), len(LEVELS))
+                  if any(response != expected[i] for response in expected[i + 1:i + len(LEVELS)]))
+
+    start = time.perf_counter()
+    for payload in requests:
+        post(url, payload)
+    sequential = time.perf_counter() - start
+
+    replay = list(range(len(requests))) * args.rounds
+    random.Random(0).shuffle(replay)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.threads) as executor:
+        responses = list(executor.map(lambda i: post(url, requests[i]), replay))
+    concurrent = time.perf_counter() - start
+    mismatches = sum(1 for i, response in zip(replay, responses) if response != expected[i])
+
+    print(f"{len(hovers)} hovers x {len(LEVELS)} levels, {varying} hovers answered differently for some level")
+    print(f"Sequential:              {len(requests) / sequential:8.1f} requests/s")
+    print(f"{args.threads:2d} threads, {args.rounds} rounds:    {len(replay) / concurrent:8.1f} requests/s")
+    print(f"Responses differing from the sequential ones: {mismatches}/{len(replay)}")
+
+    http_server.shutdown()
+    stub.shutdown()
+    jlpt_lists.definitions.cache.close()
+    shutil.rmtree(cache_directory, ignore_errors=True)
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+import argparse
+import os
+import random
+import sys
+import time
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+root_dir = os.path.dirname(os.path.dirname(current_dir))
+if root_dir not in sys.path:
+    sys.path.append(root_dir)
+
+from Main.Model import sudachipi, tokenizer_pool
+
+"""
+    Measures finding the word under the cursor for hovers around one paragraph: tokenizing the paragraph and walking
+    its tokens on every hover (the old behaviour) against the cached tokenization searched by bisection.
+
+    Usage: python Main/Benchmark/bench_hover_lookup.py [paragraph.txt] [--hovers N]
+"""
+
+SAMPLE = "吾輩は猫である。名前はまだ無い。どこで生れたかとんと見当がつかぬ。何でも薄暗いじめじめした所でニャーニャー泣いていた事だけは記憶している。"
+
+
+def word_at_by_walking(text, offset):
+    current_pos = 0
+    for token in tokenizer_pool.tokenize(text):
+        token_len = len(token.surface())
+        if current_pos <= offset < current_pos + token_len:
+            return token.dictionary_form()
+        current_pos += token_len
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hover offset lookup benchmark")
+    parser.add_argument("paragraph", nargs="?", help="text file to hover over, a sample paragraph if omitted")
+    parser.add_argument("--repeat", type=int, default=20, help="times the sample paragraph is repeated")
+    parser.add_argument("--hovers", type=int, default=200)
+    args = parser.parse_args()
+
+    if args.paragraph:
+        with open(args.paragraph, 'r', encoding='utf-8') as file:
+            text = file.read()
+    else:
+        text = SAMPLE * args.repeat
+    offsets = [random.Random(0).randrange(len(text)) for _ in range(args.hovers)]
+    word_at_by_walking(text, 0)
+
+    start = time.perf_counter()
+    walked = [word_at_by_walking(text, offset) for offset in offsets]
+    walking = time.perf_counter() - start
+
+    sudachipi.chunk_cache.clear()
+    start = time.perf_counter()
+    cached = [sudachipi.tokenize_chunk(text).word_at(offset) for offset in offsets]
+    bisecting = time.perf_counter() - start
+
+    print(f"{len(text)} characters, {len(sudachipi.tokenize_chunk(text))} tokens, {len(offsets)} hovers")
+    print(f"Tokenize and walk per hover: {walking / len(offsets) * 1e6:10.1f} us/hover")
+    print(f"Cached chunk and bisection:  {bisecting / len(offsets) * 1e6:10.1f} us/hover (first hover included)")
+    print(f"Same words: {walked == cached}")
+
+
+if __name__ == "__main__":
+    main()
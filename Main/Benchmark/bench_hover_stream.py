@@ -0,0 +1,56 @@
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+root_dir = os.path.dirname(os.path.dirname(current_dir))
+if root_dir not in sys.path:
+    sys.path.append(root_dir)
+
+from Main.Benchmark.stub_jisho import isolated_definitions, start_stub_server
+
+"""
+    Time to first content of /hover_analyze: how long the popup waits for the first sentence with the plain JSON
+    response against the streamed NDJSON one. Definitions not in the offline dictionary come from the local Jisho stub
+    with a simulated latency, and every mode starts with empty definition and response caches.
+
+    Usage: python Main/Benchmark/bench_hover_stream.py [word] [--level N5] [--latency S]
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Streamed versus plain /hover_analyze benchmark")
+    parser.add_argument("word", nargs="?", default="猫")
+    parser.add_argument("--level", default="N5")
+    parser.add_argument("--latency", type=float, default=0.2, help="simulated Jisho round-trip time in seconds")
+    args = parser.parse_args()
+
+    stub, api_url = start_stub_server(latency=args.latency)
+    os.environ["JISHO_API_URL"] = api_url
+    from Main import server
+    # Books added since the last start are indexed in the background, which would disturb the measurements
+    server.start().wait_until_finished()
+
+    client = server.app.test_client()
+    request = {'text': args.word, 'offset': 0, 'level': args.level}
+    for stream in (False, True):
+        cache_directory = isolated_definitions(server.user.JLPT_lists, api_url)
+        server.user.response_cache.clear()
+        start = time.perf_counter()
+        response = client.post('/hover_analyze', json={**request, 'stream': stream}, buffered=False)
+        first = None
+        for chunk in response.response:
+            if first is None and (not stream or json.loads(chunk)['type'] == 'sentence'):
+                first = time.perf_counter() - start
+        total = time.perf_counter() - start
+        print(f"{'Streamed' if stream else 'Plain':8}  first sentence {first * 1000:8.1f} ms, complete {total * 1000:8.1f} ms")
+        server.user.JLPT_lists.definitions.cache.close()
+        shutil.rmtree(cache_directory, ignore_errors=True)
+    stub.shutdown()
+
+
+if __name__ == "__main__":
+    main()
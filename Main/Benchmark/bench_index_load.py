@@ -0,0 +1,93 @@
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+root_dir = os.path.dirname(os.path.dirname(current_dir))
+if root_dir not in sys.path:
+    sys.path.append(root_dir)
+
+from Main.Model import index_format
+from Main.Model.sentence_store import NON_JLPT, SentenceStore
+
+"""
+    Load-time benchmark for the book index: the old book_dictionary.txt format against the memory-mapped binary format.
+
+    Usage: python Main/Benchmark/bench_index_load.py [--sentences N] [--words N] [--queries N]
+"""
+
+
+def build_corpus(sentence_count, word_count, seed=0):
+    """
+    Builds a synthetic index where word frequencies follow a rough Zipf distribution.
+    :return: the SentenceStore and its vocabulary
+    """
+    rng = random.Random(seed)
+    vocabulary = [f"語{i}" for i in range(word_count)]
+    levels = [rng.randint(0, NON_JLPT) for _ in range(word_count)]
+    weights = [1 / (rank + 1) for rank in range(word_count)]
+    store = SentenceStore()
+    for _ in range(sentence_count):
+        words = sorted(set(rng.choices(range(word_count), weights=weights, k=rng.randint(4, 15))))
+        sentence = "".join(vocabulary[w] for w in words) + "。"
+        store.add_sentence(sentence, [vocabulary[w] for w in words], [levels[w] for w in words])
+    store.finalise()
+    return store, vocabulary
+
+
+def write_text_index(path, store):
+    with open(path, 'w', encoding='utf-8') as file:
+        for word_id in range(store.word_count):
+            sentences = store.get_sentences(store.get_posting(word_id))
+            file.write(f"{store.get_word(word_id)}|{str(sentences)}\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Book index load-time benchmark")
+    parser.add_argument("--sentences", type=int, default=50000)
+    parser.add_argument("--words", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=100)
+    args = parser.parse_args()
+
+    store, vocabulary = build_corpus(args.sentences, args.words)
+    queries = random.Random(1).sample(vocabulary, min(args.queries, len(vocabulary)))
+
+    with tempfile.TemporaryDirectory() as directory:
+        text_path = os.path.join(directory, 'book_dictionary.txt')
+        index_path = os.path.join(directory, 'book_index.bin')
+        write_text_index(text_path, store)
+        index_format.write_index(index_path, store)
+
+        start = time.perf_counter()
+        text_index = index_format.read_text_index(text_path)
+        text_load = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for word in queries:
+            text_index.get(word)
+        text_query = time.perf_counter() - start
+
+        start = time.perf_counter()
+        mapped = index_format.MappedIndex(index_path)
+        mapped_load = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for word in queries:
+            sentence_ids = mapped.search(word)
+            if sentence_ids is not None:
+                mapped.get_sentences(sentence_ids)
+        mapped_query = time.perf_counter() - start
+        mapped.close()
+
+        print(f"Corpus: {args.sentences} sentences, {args.words} words")
+        print(f"Text file:   {os.path.getsize(text_path) / 1e6:8.1f} MB, load {text_load * 1000:9.1f} ms, "
+              f"{len(queries)} queries {text_query * 1000:7.2f} ms")
+        print(f"Binary file: {os.path.getsize(index_path) / 1e6:8.1f} MB, load {mapped_load * 1000:9.1f} ms, "
+              f"{len(queries)} queries (with sentences) {mapped_query * 1000:7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
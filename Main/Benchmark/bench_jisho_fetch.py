@@ -0,0 +1,63 @@
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+root_dir = os.path.dirname(os.path.dirname(current_dir))
+if root_dir not in sys.path:
+    sys.path.append(root_dir)
+
+from Main.Benchmark.stub_jisho import start_stub_server
+from Main.Model.definition_cache import DefinitionCache
+from Main.Model.definition_provider import DefinitionProvider
+from Main.Model.jisho_client import JishoClient
+
+"""
+    Compares fetching the definitions of a sentence's non-JLPT words one at a time (the old behaviour, with its fixed
+    0.1s pause) against one concurrent, rate-limited batch through DefinitionProvider, as the server defines them, using
+    the local stub instead of jisho.org and an empty definition cache.
+
+    Usage: python Main/Benchmark/bench_jisho_fetch.py [--words N] [--latency S] [--budget S]
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Jisho batch fetching benchmark")
+    parser.add_argument("--words", type=int, default=6)
+    parser.add_argument("--latency", type=float, default=0.2, help="simulated round-trip time in seconds")
+    parser.add_argument("--budget", type=float, default=1.5, help="latency budget of the batch in seconds")
+    args = parser.parse_args()
+
+    server, api_url = start_stub_server(latency=args.latency)
+    words = [f"単語{i}" for i in range(args.words - 1)] + ["無い言葉"]
+
+    client = JishoClient(api_url=api_url)
+    start = time.perf_counter()
+    for word in words:
+        time.sleep(0.1)
+        client.fetch(word)
+    sequential = time.perf_counter() - start
+
+    cache_directory = tempfile.mkdtemp()
+    cache = DefinitionCache(os.path.join(cache_directory, "definitions.sqlite3"))
+    client = JishoClient(api_url=api_url)
+    provider = DefinitionProvider(cache, client)
+    start = time.perf_counter()
+    results = provider.get_many(words, budget=args.budget)
+    batched = time.perf_counter() - start
+
+    print(f"{len(words)} words, {args.latency * 1000:.0f} ms simulated latency")
+    print(f"One at a time:      {sequential * 1000:8.1f} ms")
+    print(f"Concurrent batch:   {batched * 1000:8.1f} ms ({len(results)}/{len(words)} finished within budget)")
+    print(f"Not found in batch: {[word for word, definitions in results.items() if not definitions]}")
+    client.close()
+    cache.close()
+    shutil.rmtree(cache_directory, ignore_errors=True)
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+root_dir = os.path.dirname(os.path.dirname(current_dir))
+if root_dir not in sys.path:
+    sys.path.append(root_dir)
+
+from Main.Model import jlpt_table
+
+"""
+    Benchmark of JLPT level lookups: the old chain of five per-level probes against the merged table, plus the
+    startup cost of parsing the JLPT_lists files against loading the prebuilt table.
+
+    Usage: python Main/Benchmark/bench_jlpt_lookup.py [--lookups N]
+"""
+
+
+def chained_search(level_lists, word):
+    """The lookup as it was done before: probe N5, N4, N3, N2 and N1 one after another."""
+    for level, level_list in zip(jlpt_table.LEVELS, level_lists):
+        result = level_list.search_dic(word)
+        if result is not None:
+            return result, level
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JLPT lookup benchmark")
+    parser.add_argument("--lookups", type=int, default=200000)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    level_lists = jlpt_table._create_level_lists()
+    for level_list in level_lists:
+        level_list.create_dic()
+    parse_time = time.perf_counter() - start
+
+    table = jlpt_table.JLPTTable.from_lists(level_lists)
+    rng = random.Random(0)
+    jlpt_words = list(table.entries)
+    # Roughly half of the words in real sentences are particles, names or other words outside the lists
+    words = [rng.choice(jlpt_words) if rng.random() < 0.5 else f"外{rng.randint(0, 9999)}"
+             for _ in range(args.lookups)]
+
+    start = time.perf_counter()
+    for word in words:
+        chained_search(level_lists, word)
+    chained_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for word in words:
+        table.search(word)
+    table_time = time.perf_counter() - start
+
+    assert all(chained_search(level_lists, word) == table.search(word) for word in jlpt_words)
+
+    with tempfile.TemporaryDirectory() as directory:
+        artifact_path = os.path.join(directory, 'jlpt_table.pickle')
+        jlpt_table.load_or_build(artifact_path)
+        start = time.perf_counter()
+        jlpt_table.load_or_build(artifact_path)
+        artifact_time = time.perf_counter() - start
+
+    print(f"Words in the JLPT lists: {len(jlpt_words)}")
+    print(f"Five chained probes: {len(words) / chained_time:12.0f} lookups/s")
+    print(f"Merged table:        {len(words) / table_time:12.0f} lookups/s")
+    print(f"Parsing JLPT_lists:  {parse_time * 1000:8.1f} ms")
+    print(f"Prebuilt table load: {artifact_time * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
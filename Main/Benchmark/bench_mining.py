@@ -0,0 +1,107 @@
+import argparse
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+root_dir = os.path.dirname(os.path.dirname(current_dir))
+if root_dir not in sys.path:
+    sys.path.append(root_dir)
+
+from Main.Benchmark.corpus import generate_corpus, jlpt_vocabulary
+
+"""
+    "i+1" sentence mining over a synthetic corpus: finding the sentences that contain a word and have at most one word
+    the user does not know. The known words are the most frequent share of the vocabulary, and the words mined for
+    are drawn from the most frequent of the others.
+
+    It reports how long counting the unknown words of every sentence takes when the known words are first used and
+    after a word is added, then the latency of mining the whole corpus and for single words. For comparison, the same
+    words are mined by tokenizing each sentence containing them again, which is what finding a sentence's words took
+    before the index stored them.
+
+    Usage: python Main/Benchmark/bench_mining.py [--sentences N] [--known-share S] [--words N]
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description="i+1 sentence mining benchmark")
+    parser.add_argument("--sentences", type=int, default=100000)
+    parser.add_argument("--known-share", type=float, default=0.1, help="share of the vocabulary the user knows")
+    parser.add_argument("--words", type=int, default=20, help="words to mine for")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    from Main.Model import sudachipi
+    from Main.Model.user import User
+
+    work_directory = tempfile.mkdtemp()
+    try:
+        books_directory = os.path.join(work_directory, "books")
+        generate_corpus(books_directory, args.sentences, seed=args.seed)
+        user = User("N5", scan_books=False, books_directory=books_directory,
+                    index_directory=os.path.join(work_directory, "index", "book_index"),
+                    known_words_path=os.path.join(work_directory, "known_words.txt"))
+        user.sentence_dictionary.workers = os.cpu_count() or 1
+        user.update_book_library()
+        user.sentence_dictionary.wait_for_compaction()
+        index = user.sentence_dictionary.index
+
+        frequencies = {}
+        for word in jlpt_vocabulary():
+            sentence_ids = index.search(word)
+            if sentence_ids is not None:
+                frequencies[word] = len(sentence_ids)
+        by_frequency = sorted(frequencies, key=frequencies.get, reverse=True)
+        known = by_frequency[:int(len(by_frequency) * args.known_share)]
+        user.known_words.add(known)
+        # The most frequent of the unknown words, the ones most worth learning next
+        unknown = by_frequency[len(known):len(known) + args.words * 5]
+        rng = random.Random(args.seed)
+        words = rng.sample(unknown, min(args.words, len(unknown)))
+
+        start = time.perf_counter()
+        user.known_words.unknown_counts(index)
+        first = time.perf_counter() - start
+        user.known_words.add([words[0]])
+        user.known_words.remove([words[0]])
+        start = time.perf_counter()
+        user.known_words.unknown_counts(index)
+        recount = time.perf_counter() - start
+        print(f"{len(index)} sentences, {len(user.known_words)} known words")
+        print(f"Counting the unknown words of every sentence: {first * 1000:.1f} ms at first, "
+              f"{recount * 1000:.1f} ms after the known words changed")
+        start = time.perf_counter()
+        count, _ = user.mine_sentences(None, 1, limit=10)
+        print(f"Mining the whole corpus: {count} sentences with one unknown word in "
+              f"{(time.perf_counter() - start) * 1000:.1f} ms")
+
+        mined, tokenized = [], []
+        for word in words:
+            start = time.perf_counter()
+            count, _ = user.mine_sentences(word, 1, limit=10)
+            mined.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            matches = 0
+            for sentence in index.get_sentences(index.search(word)):
+                sudachipi.dict_form_cache.clear()
+                sentence_words = set(sudachipi.get_dict_forms(sentence))
+                if len(sentence_words - user.known_words.words) <= 1:
+                    matches += 1
+            tokenized.append(time.perf_counter() - start)
+            assert matches == count, (word, matches, count)
+        print(f"Mining for {len(words)} words ({statistics.mean(frequencies[word] for word in words):.0f} sentences "
+              f"each on average): {statistics.median(mined) * 1000:.2f} ms median, against "
+              f"{statistics.median(tokenized) * 1000:.2f} ms tokenizing the sentences")
+        index.close()
+    finally:
+        shutil.rmtree(work_directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+root_dir = os.path.dirname(os.path.dirname(current_dir))
+if root_dir not in sys.path:
+    sys.path.append(root_dir)
+
+from Main.Benchmark.stub_jisho import start_stub_server
+from Main.Model import offline_dictionary
+from Main.Model.jisho_client import JishoClient
+
+"""
+    Compares defining words from an offline dictionary against the Jisho API (the local stub, so only the round trip
+    is measured), and times importing the dictionary.
+
+    Without a JMdict file a synthetic one is generated. Real files can be downloaded from
+    https://www.edrdg.org/jmdict/j_jmdict.html.
+
+    Usage: python Main/Benchmark/bench_offline_dictionary.py [--jmdict JMdict_e.xml] [--entries N] [--lookups N]
+"""
+
+
+def write_synthetic_jmdict(path, entry_count, seed=0):
+    """
+    Writes a JMdict style XML file with entry_count entries, each with one kanji and one kana writing.
+    :return: the headwords written
+    """
+    rng = random.Random(seed)
+    kanji = [chr(code) for code in range(0x4E00, 0x4E00 + 2000)]
+    kana = [chr(code) for code in range(0x3041, 0x3097)]
+    headwords = []
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write("<JMdict>\n")
+        for i in range(entry_count):
+            writing = "".join(rng.choice(kanji) for _ in range(rng.randint(1, 3)))
+            reading = "".join(rng.choice(kana) for _ in range(rng.randint(2, 5)))
+            headwords.extend([writing, reading])
+            file.write(f"<entry><ent_seq>{1000000 + i}</ent_seq><k_ele><keb>{writing}</keb></k_ele>"
+                       f"<r_ele><reb>{reading}</reb></r_ele><sense><gloss>meaning {i}</gloss>"
+                       f"<gloss>sense {i}</gloss></sense></entry>\n")
+        file.write("</JMdict>\n")
+    return headwords
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline dictionary benchmark")
+    parser.add_argument("--jmdict", help="JMdict XML or JSON file to import instead of a synthetic one")
+    parser.add_argument("--entries", type=int, default=200000, help="entries in the synthetic file")
+    parser.add_argument("--lookups", type=int, default=100000)
+    parser.add_argument("--network-lookups", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.05, help="simulated Jisho round-trip time in seconds")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        source_path = args.jmdict
+        headwords = None
+        if source_path is None:
+            source_path = os.path.join(directory, 'JMdict_e.xml')
+            headwords = write_synthetic_jmdict(source_path, args.entries)
+        dictionary_path = os.path.join(directory, 'jmdict.bin')
+
+        start = time.perf_counter()
+        headword_count, entry_count = offline_dictionary.import_jmdict(source_path, dictionary_path)
+        import_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        dictionary = offline_dictionary.OfflineDictionary(dictionary_path)
+        open_time = time.perf_counter() - start
+
+        if headwords is None:
+            headwords = [dictionary.get_headword(i) for i in range(headword_count)]
+        rng = random.Random(1)
+        words = [rng.choice(headwords) for _ in range(args.lookups)]
+
+        start = time.perf_counter()
+        for word in words:
+            dictionary.lookup(word)
+        offline_time = time.perf_counter() - start
+        dictionary.close()
+
+    server, api_url = start_stub_server(latency=args.latency)
+    client = JishoClient(api_url=api_url)
+    start = time.perf_counter()
+    for word in words[:args.network_lookups]:
+        client.fetch(word)
+    network_time = time.perf_counter() - start
+    client.close()
+    server.shutdown()
+
+    print(f"Imported {headword_count} headwords and {entry_count} entries in {import_time:.2f} s")
+    print(f"Opening the dictionary:  {open_time * 1000:10.2f} ms")
+    print(f"Offline lookup:          {offline_time / len(words) * 1e6:10.2f} us/word")
+    print(f"Jisho lookup (stub):     {network_time / args.network_lookups * 1e6:10.2f} us/word")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+import argparse
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+root_dir = os.path.dirname(os.path.dirname(current_dir))
+if root_dir not in sys.path:
+    sys.path.append(root_dir)
+
+from Main.Benchmark.corpus import generate_corpus, jlpt_vocabulary
+
+"""
+    Two-word AND queries over a synthetic corpus, evaluated three ways:
+
+        by hand     both posting lists turned into Python sets and intersected, as done before there were queries
+        merge       both posting lists intersected with numpy, reading each of them in full
+        query       query.Query, which searches the rarer list's IDs in the other list (galloping)
+
+    Pairs are drawn from words of very different frequency (a rare and a common word) and of similar frequency (two
+    common words), where merging is used instead.
+
+    Usage: python Main/Benchmark/bench_query.py [--sentences N] [--pairs N] [--repeats N]
+"""
+
+
+def median_microseconds(function, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Boolean query evaluation benchmark")
+    parser.add_argument("--sentences", type=int, default=100000)
+    parser.add_argument("--pairs", type=int, default=50, help="word pairs per kind")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    from Main.Model.book_management import BookManagement
+    from Main.Model.list_management import list_management
+    from Main.Model.query import Query
+    jlpt_lists = list_management()
+    jlpt_lists.initialise()
+
+    work_directory = tempfile.mkdtemp()
+    try:
+        books_directory = os.path.join(work_directory, "books")
+        generate_corpus(books_directory, args.sentences, seed=args.seed)
+        book_management = BookManagement(jlpt_lists, workers=os.cpu_count() or 1, books_directory=books_directory,
+                                         index_directory=os.path.join(work_directory, "index", "book_index"))
+        book_management.wait_for_compaction()
+        index = book_management.index
+
+        # Postings are read once here, so the timings only cover the intersections
+        postings = {}
+        for word in jlpt_vocabulary():
+            sentence_ids = index.search(word)
+            if sentence_ids is not None:
+                postings[word] = np.frombuffer(sentence_ids, dtype=np.uint32)
+        by_frequency = sorted(postings, key=lambda word: len(postings[word]), reverse=True)
+        common, rare = by_frequency[:50], [word for word in by_frequency if 5 <= len(postings[word]) <= 50]
+
+        rng = random.Random(args.seed)
+        kinds = {
+            "rare AND common": [(rng.choice(rare), rng.choice(common)) for _ in range(args.pairs)],
+            "common AND common": [tuple(rng.sample(common, 2)) for _ in range(args.pairs)],
+        }
+        print(f"{len(index)} sentences, {len(postings)} words")
+        print(f"{'':20}{'mean sizes':>18}{'by hand us':>12}{'merge us':>10}{'query us':>10}")
+        for kind, pairs in kinds.items():
+            timings = {"by hand": [], "merge": [], "query": []}
+            for first, second in pairs:
+                a, b = postings[first], postings[second]
+                query = Query(f"{first} {second}")
+                expected = sorted(set(a.tolist()) & set(b.tolist()))
+                assert query.evaluate(postings.get).tolist() == expected
+                timings["by hand"].append(median_microseconds(lambda: set(a.tolist()) & set(b.tolist()), args.repeats))
+                timings["merge"].append(median_microseconds(
+                    lambda: np.intersect1d(a, b, assume_unique=True), args.repeats))
+                timings["query"].append(median_microseconds(lambda: query.evaluate(postings.get), args.repeats))
+            sizes = (f"{statistics.mean(len(postings[first]) for first, _ in pairs):.0f} x "
+                     f"{statistics.mean(len(postings[second]) for _, second in pairs):.0f}")
+            print(f"{kind:20}{sizes:>18}" + "".join(f"{statistics.median(values):{width}.1f}" for values, width
+                                                   in zip(timings.values(), (12, 10, 10))))
+        index.close()
+    finally:
+        shutil.rmtree(work_directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+import argparse
+import json
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+root_dir = os.path.dirname(os.path.dirname(current_dir))
+
+"""
+    Startup time of the server, cold and warm. It reports how long after launch the server accepts connections, when
+    /ready first reports that requests can be answered, and when the background scan for new books has finished.
+
+    The cold start runs in a scratch copy of the project with none of the derived state (compiled JLPT table, book index,
+    definition cache, bytecode). The warm starts run in the same copy afterwards. Book files and an imported offline
+    dictionary are linked into the copy, not copied.
+
+    Usage: python Main/Benchmark/bench_startup.py [--warm-runs N]
+"""
+
+
+def free_port():
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+def make_scratch_copy():
+    scratch = tempfile.mkdtemp()
+    shutil.copytree(os.path.join(root_dir, "Main"), os.path.join(scratch, "Main"),
+                    ignore=shutil.ignore_patterns("__pycache__"))
+    shutil.copytree(os.path.join(root_dir, "JLPT_lists"), os.path.join(scratch, "JLPT_lists"))
+    os.makedirs(os.path.join(scratch, "dictionary_files"))
+    books = os.path.join(root_dir, "book_files")
+    if os.path.isdir(books):
+        os.symlink(books, os.path.join(scratch, "book_files"))
+    dictionary = os.path.join(root_dir, "dictionary_files", "jmdict.bin")
+    if os.path.exists(dictionary):
+        os.symlink(dictionary, os.path.join(scratch, "dictionary_files", "jmdict.bin"))
+    return scratch
+
+
+def ready_status(port):
+    """
+    :return: the /ready status, None if the server does not accept connections yet
+    """
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/ready", timeout=5) as response:
+            return json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return json.loads(e.read())
+    except (urllib.error.URLError, ConnectionError):
+        return None
+
+
+def measure_start(scratch, timeout):
+    """
+    :return: seconds from launch until the server accepted a connection, reported ready and finished scanning
+    """
+    port = free_port()
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, os.path.join(scratch, "Main", "server.py"), "--port", str(port)],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    bound = ready = None
+    try:
+        while time.perf_counter() - start < timeout:
+            status = ready_status(port)
+            now = time.perf_counter() - start
+            if status is not None:
+                bound = bound or now
+                if status['ready']:
+                    ready = ready or now
+                if status['stage'] in ('done', 'failed'):
+                    return bound, ready, now
+            time.sleep(0.005)
+        raise RuntimeError(f"The server did not finish starting within {timeout} s")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Server startup benchmark")
+    parser.add_argument("--warm-runs", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=600.0, help="seconds a start may take")
+    args = parser.parse_args()
+
+    scratch = make_scratch_copy()
+    try:
+        cold = measure_start(scratch, args.timeout)
+        warm = [measure_start(scratch, args.timeout) for _ in range(args.warm_runs)]
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    print(f"{'':22}{'accepting':>10}{'ready':>10}{'scanned':>10}")
+    print(f"{'Cold start':22}" + "".join(f"{value:9.2f}s" for value in cold))
+    print(f"{f'Warm start (median of {len(warm)})':22}"
+          + "".join(f"{statistics.median(run[i] for run in warm):9.2f}s" for i in range(3)))
+
+
+if __name__ == "__main__":
+    main()
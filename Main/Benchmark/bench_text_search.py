@@ -0,0 +1,90 @@
+import argparse
+import os
+import re
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+root_dir = os.path.dirname(os.path.dirname(current_dir))
+if root_dir not in sys.path:
+    sys.path.append(root_dir)
+
+from Main.Benchmark.corpus import generate_corpus
+
+"""
+    Surface-form search latency with the character bigram index against the full scan SearchFiles used to do, which
+    read every book, split it into sentences and ran the pattern over each one. Both run over synthetic corpora of
+    several sizes, to show how the cost of each grows with the library.
+
+    Usage: python Main/Benchmark/bench_text_search.py [--sizes 10000,40000] [--repeats N] [pattern ...]
+"""
+
+PATTERNS = ["てしまう", "～わけにはいかない", "ない*ない", "猫", "?は", "を"]
+
+
+def scan_books(directory, pattern):
+    """
+    The search as SearchFiles did it before the bigram index.
+    :return: the number of matching sentences
+    """
+    matches = 0
+    for filename in os.listdir(directory):
+        if filename.endswith(".txt"):
+            with open(os.path.join(directory, filename), "r", encoding="utf-8") as file:
+                content = file.read()
+            for sentence in re.split(r'(?<=[。！？])|\n', content):
+                if pattern.matches(sentence):
+                    matches += 1
+    return matches
+
+
+def median_seconds(function, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bigram index against full scan text search benchmark")
+    parser.add_argument("patterns", nargs="*", default=PATTERNS)
+    parser.add_argument("--sizes", default="10000,40000", help="comma separated sentence counts of the corpora")
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    from Main.Model import text_search
+    from Main.Model.book_management import BookManagement
+    from Main.Model.list_management import list_management
+    jlpt_lists = list_management()
+    jlpt_lists.initialise()
+
+    print(f"{'sentences':>10}  {'pattern':18}{'matches':>8}{'scan ms':>10}{'index ms':>10}{'speed-up':>10}")
+    for size in (int(size) for size in args.sizes.split(",")):
+        work_directory = tempfile.mkdtemp()
+        try:
+            books_directory = os.path.join(work_directory, "books")
+            generate_corpus(books_directory, size, include_sample=True)
+            start = time.perf_counter()
+            book_management = BookManagement(jlpt_lists, books_directory=books_directory,
+                                             index_directory=os.path.join(work_directory, "index", "book_index"))
+            book_management.wait_for_compaction()
+            print(f"{size:10d}  indexed in {time.perf_counter() - start:.1f} s")
+            index = book_management.index
+            for pattern in args.patterns:
+                scan_seconds, _ = median_seconds(
+                    lambda: scan_books(books_directory, text_search.Pattern(pattern)), args.repeats)
+                index_seconds, matches = median_seconds(lambda: index.search_text(pattern), args.repeats)
+                print(f"{size:10d}  {pattern:18}{len(matches):8d}{scan_seconds * 1000:10.2f}"
+                      f"{index_seconds * 1000:10.2f}{scan_seconds / index_seconds:9.0f}x")
+            index.close()
+        finally:
+            shutil.rmtree(work_directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import argparse
+import os
+import re
+import sys
+import time
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+root_dir = os.path.dirname(os.path.dirname(current_dir))
+if root_dir not in sys.path:
+    sys.path.append(root_dir)
+
+from sudachipy.dictionary import Dictionary
+from Main.Model import sudachipi, tokenizer_pool
+
+"""
+    Micro-benchmark comparing the old per-sentence dictionary load against the shared tokenizer pool.
+
+    Usage: python Main/Benchmark/bench_tokenizer.py [path/to/book.txt] [--limit N]
+"""
+
+SAMPLE_TEXT = (
+    "吾輩は猫である。名前はまだ無い。どこで生れたかとんと見当がつかぬ。"
+    "何でも薄暗いじめじめした所でニャーニャー泣いていた事だけは記憶している。"
+    "吾輩はここで始めて人間というものを見た。しかもあとで聞くとそれは書生という人間中で一番獰悪な種族であったそうだ。"
+    "この書生というのは時々我々を捕えて煮て食うという話である。"
+)
+
+
+def load_sentences(path, limit):
+    if path:
+        with open(path, 'r', encoding='utf-8') as file:
+            text = file.read()
+    else:
+        text = SAMPLE_TEXT * 50
+    sentences = [s.replace("　", "").strip() for s in re.split(r'(?<=[。！？])|\n', text)]
+    sentences = [s for s in sentences if s]
+    return sentences[:limit]
+
+
+def bench_per_sentence_dictionary(sentences):
+    """The behaviour before the pool: every sentence_breakdown loaded its own dictionary."""
+    start = time.perf_counter()
+    for sentence in sentences:
+        tokenizer_obj = Dictionary().create()
+        tokens = tokenizer_obj.tokenize(sentence, tokenizer_pool.get_pool().mode)
+        [token.dictionary_form() for token in tokens]
+    return time.perf_counter() - start
+
+
+def bench_pooled(sentences):
+    start = time.perf_counter()
+    breakdown = sudachipi.sentence_breakdown()
+    for sentence in sentences:
+        breakdown.set_sentence(sentence)
+        breakdown.get_all_dict_forms()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tokenizer pool micro-benchmark")
+    parser.add_argument("book", nargs="?", help="text file to tokenize (defaults to a built-in sample)")
+    parser.add_argument("--limit", type=int, default=200, help="maximum number of sentences to tokenize")
+    args = parser.parse_args()
+
+    sentences = load_sentences(args.book, args.limit)
+    # Warm up the shared dictionary so its one-off load is not counted against the pooled run
+    tokenizer_pool.tokenize("準備")
+
+    before = bench_per_sentence_dictionary(sentences)
+    after = bench_pooled(sentences)
+
+    print(f"Sentences: {len(sentences)}")
+    print(f"Dictionary per sentence: {len(sentences) / before:10.1f} sentences/s ({before:.3f}s)")
+    print(f"Shared tokenizer pool:   {len(sentences) / after:10.1f} sentences/s ({after:.3f}s)")
+    print(f"Speed-up: {before / after:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+import argparse
+import os
+import random
+import shutil
+import sys
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+root_dir = os.path.dirname(os.path.dirname(current_dir))
+if root_dir not in sys.path:
+    sys.path.append(root_dir)
+
+"""
+    Reproducible synthetic Japanese corpora for the benchmarks. Sentences join JLPT words with particles. The words are
+    drawn with a Zipf distribution, so a few words appear in a large share of the sentences and most in very few, as in
+    real text. A few made-up katakana words outside the JLPT lists make definition lookups happen. The same seed and
+    sizes always give the same books.
+
+    SAMPLE_PATH is a short real text, the opening of Natsume Soseki's 吾輩は猫である (public domain), that can be added
+    alongside the synthetic books.
+
+    Usage: python Main/Benchmark/corpus.py output_directory [--sentences N] [--books N] [--seed N]
+"""
+
+SAMPLE_PATH = os.path.join(current_dir, "sample_corpus.txt")
+
+TEMPLATES = [
+    "{0}は{1}を{2}。",
+    "{0}の{1}が{2}。",
+    "{0}と{1}で{2}に{3}。",
+    "{0}から{1}まで{2}。",
+    "「{0}」と{1}は{2}の{3}を{4}。",
+    "{0}も{1}も{2}。",
+]
+# Exponent of the Zipf distribution the words are drawn from
+ZIPF_EXPONENT = 1.1
+# Share of the words that are made-up katakana words outside the JLPT lists
+OUTSIDE_JLPT_SHARE = 0.05
+KATAKANA = "アイウエオカキクケコサシスセソタチツテトナニヌネノハヒフヘホマミムメモラリルレロ"
+
+
+def jlpt_vocabulary():
+    """
+    :return: every word of the JLPT lists, sorted so the corpus does not depend on the order they were read in
+    """
+    from Main.Model import jlpt_table
+    return sorted(jlpt_table.build_table().get_level_table())
+
+
+def generate_sentences(count, vocabulary, seed=0):
+    """
+    :param count: number of sentences
+    :param vocabulary: the words to draw from
+    :param seed: seed of the random choices
+    :return: iterator of sentences
+    """
+    rng = random.Random(seed)
+    words = list(vocabulary)
+    # Which words are frequent depends on the seed, not on the alphabetical order
+    rng.shuffle(words)
+    cumulative = []
+    total = 0.0
+    for rank in range(1, len(words) + 1):
+        total += 1.0 / rank ** ZIPF_EXPONENT
+        cumulative.append(total)
+    outside = ["".join(rng.choice(KATAKANA) for _ in range(rng.randint(3, 5))) for _ in range(200)]
+
+    for _ in range(count):
+        template = rng.choice(TEMPLATES)
+        slots = template.count("{")
+        chosen = rng.choices(words, cum_weights=cumulative, k=slots)
+        for slot in range(slots):
+            if rng.random() < OUTSIDE_JLPT_SHARE:
+                chosen[slot] = rng.choice(outside)
+        yield template.format(*chosen)
+
+
+def generate_corpus(directory, sentences, books=10, seed=0, vocabulary=None, include_sample=False):
+    """
+    Writes a synthetic corpus as book files, replacing any books already in the directory.
+    :param directory: directory to write the books to
+    :param sentences: total number of sentences
+    :param books: number of books the sentences are split over
+    :param seed: seed of the random choices
+    :param vocabulary: the words to draw from, the JLPT lists if None
+    :param include_sample: also copy the real text sample in as sample.txt
+    :return: the paths of the books written
+    """
+    if vocabulary is None:
+        vocabulary = jlpt_vocabulary()
+    os.makedirs(directory, exist_ok=True)
+    for name in os.listdir(directory):
+        if name.endswith(".txt") or name.endswith(".tsv"):
+            os.remove(os.path.join(directory, name))
+
+    rng = random.Random(seed)
+    generated = generate_sentences(sentences, vocabulary, seed)
+    paths = []
+    for book in range(books):
+        path = os.path.join(directory, f"synthetic-{book + 1:03d}.txt")
+        book_sentences = sentences // books + (1 if book < sentences % books else 0)
+        with open(path, 'w', encoding='utf-8') as file:
+            line = []
+            for _ in range(book_sentences):
+                line.append(next(generated))
+                # Paragraphs of one to five sentences
+                if rng.random() < 0.3:
+                    file.write("".join(line) + "\n")
+                    line = []
+            if line:
+                file.write("".join(line) + "\n")
+        paths.append(path)
+
+    if include_sample:
+        path = os.path.join(directory, "sample.txt")
+        shutil.copyfile(SAMPLE_PATH, path)
+        paths.append(path)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Synthetic Japanese corpus generator")
+    parser.add_argument("directory")
+    parser.add_argument("--sentences", type=int, default=10000)
+    parser.add_argument("--books", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--sample", action="store_true", help="also add the real text sample")
+    args = parser.parse_args()
+    paths = generate_corpus(args.directory, args.sentences, args.books, args.seed, include_sample=args.sample)
+    print(f"Wrote {args.sentences} sentences to {len(paths)} books in {args.directory}")
+
+
+if __name__ == "__main__":
+    main()
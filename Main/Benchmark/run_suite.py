@@ -0,0 +1,268 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+root_dir = os.path.dirname(os.path.dirname(current_dir))
+if root_dir not in sys.path:
+    sys.path.append(root_dir)
+
+from Main.Benchmark.corpus import generate_corpus, jlpt_vocabulary
+from Main.Benchmark.stub_jisho import isolated_definitions, start_stub_server
+
+"""
+    Offline benchmark suite of the backend. The suite generates a reproducible synthetic corpus plus the real text
+    sample, then measures:
+
+        ingestion   sentences/s and MB/s of indexing the corpus from scratch
+        index_load  time to open the saved index
+        search      WordSearch latency percentiles per bucket of how many sentences contain the word
+        hover       /hover_analyze latency percentiles, with the response cache disabled
+        peak_rss    peak resident set size, including ingestion workers
+
+    jisho.org is replaced by the local stub and definitions are cached in a temporary database. The corpus and its
+    index live in a temporary directory, and the hover measurements serve the corpus' user, so the real book index is
+    neither opened nor updated.
+
+    --output writes the results as JSON, and --compare prints the change of every metric from an earlier output.
+
+    Usage: python Main/Benchmark/run_suite.py [--sentences N] [--books N] [--seed N] [--workers N]
+                                              [--output results.json] [--compare baseline.json]
+"""
+
+# Buckets of the number of sentences containing a word, the last one is open-ended
+FREQUENCY_BUCKETS = [(1, 9), (10, 99), (100, 999), (1000, 9999), (10000, None)]
+LEVELS = ["N5", "N4", "N3", "N2", "N1"]
+
+
+def bucket_name(low, high):
+    return f"{low}+" if high is None else f"{low}-{high}"
+
+
+def percentiles(seconds):
+    """
+    :return: the 50th, 95th and 99th percentile of the samples in milliseconds
+    """
+    values = np.asarray(seconds) * 1000
+    return {f"p{q}_ms": round(float(np.percentile(values, q)), 3) for q in (50, 95, 99)}
+
+
+def peak_rss():
+    from Main.Model import ingestion
+    return ingestion.peak_memory()
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=root_dir, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def measure_ingestion(user, books_directory, workers):
+    book_management = user.sentence_dictionary
+    book_management.workers = workers
+    byte_count = sum(os.path.getsize(os.path.join(books_directory, name)) for name in os.listdir(books_directory))
+    start = time.perf_counter()
+    book_management.scan_for_new_books()
+    book_management.wait_for_compaction()
+    seconds = time.perf_counter() - start
+    sentences = len(book_management.index)
+    return {
+        "sentences": sentences,
+        "seconds": round(seconds, 3),
+        "sentences_per_second": round(sentences / seconds, 1),
+        "mb_per_second": round(byte_count / seconds / 1024 / 1024, 3),
+        "peak_rss_bytes": peak_rss(),
+    }
+
+
+def measure_index_load(jlpt_lists, books_directory, index_directory, runs):
+    from Main.Model.book_management import BookManagement
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        book_management = BookManagement(jlpt_lists, scan=False, books_directory=books_directory,
+                                         index_directory=index_directory)
+        timings.append(time.perf_counter() - start)
+        book_management.index.close()
+    return {"runs": runs, "median_ms": round(statistics.median(timings) * 1000, 3),
+            "min_ms": round(min(timings) * 1000, 3)}
+
+
+def measure_search(user, words_per_bucket, repeats, seed):
+    """
+    Searches for words from every frequency bucket, once to warm the definition caches and then repeats times.
+    """
+    index = user.sentence_dictionary.index
+    frequencies = {}
+    for word in jlpt_vocabulary():
+        sentence_ids = index.search(word)
+        if sentence_ids is not None:
+            frequencies[word] = len(sentence_ids)
+
+    rng = random.Random(seed)
+    results = {}
+    for low, high in FREQUENCY_BUCKETS:
+        words = sorted(word for word, count in frequencies.items() if count >= low and (high is None or count <= high))
+        if not words:
+            continue
+        words = rng.sample(words, min(words_per_bucket, len(words)))
+        timings = []
+        for word in words:
+            user.search_for_word(word)
+            for _ in range(repeats):
+                start = time.perf_counter()
+                user.search_for_word(word)
+                timings.append(time.perf_counter() - start)
+        results[bucket_name(low, high)] = {
+            "words": len(words),
+            "mean_sentences": round(statistics.mean(frequencies[word] for word in words), 1),
+            **percentiles(timings),
+        }
+    return results
+
+
+def measure_hover(user, hovers, seed):
+    """
+    Hovers over words of random corpus sentences at random levels, once to warm the caches and then timed.
+    """
+    from Main import server
+    from Main.Model import sudachipi
+    server.start(lambda loader: user).wait()
+    user.response_cache.resize(0)
+    client = server.app.test_client()
+
+    rng = random.Random(seed)
+    index = user.sentence_dictionary.index
+    requests = []
+    while len(requests) < hovers:
+        sentence_id = rng.randrange(len(index))
+        if not user.sentence_dictionary.has_sentence(sentence_id):
+            continue
+        text = index.get_sentence(sentence_id).strip()
+        offsets = [start for start, _, _, content in sudachipi.tokenize_chunk(text).tokens() if content]
+        if offsets:
+            requests.append({'text': text, 'offset': rng.choice(offsets), 'level': rng.choice(LEVELS)})
+
+    for request in requests:
+        client.post('/hover_analyze', json=request)
+    timings = []
+    for request in requests:
+        start = time.perf_counter()
+        client.post('/hover_analyze', json=request)
+        timings.append(time.perf_counter() - start)
+    return {"requests": len(requests), **percentiles(timings)}
+
+
+def flatten(results, prefix=""):
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[prefix + key] = value
+    return flat
+
+
+def print_results(results):
+    ingestion = results["ingestion"]
+    print(f"\nIngestion:  {ingestion['sentences']} sentences in {ingestion['seconds']:.2f} s, "
+          f"{ingestion['sentences_per_second']:.0f} sentences/s, {ingestion['mb_per_second']:.2f} MB/s")
+    print(f"Index load: {results['index_load']['median_ms']:.2f} ms (median of {results['index_load']['runs']})")
+    print(f"{'Search':24}{'words':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for bucket, search in results["search"].items():
+        print(f"  {bucket + ' sentences':22}{search['words']:6d}{search['p50_ms']:10.2f}{search['p95_ms']:10.2f}"
+              f"{search['p99_ms']:10.2f}")
+    hover = results["hover"]
+    print(f"{'/hover_analyze':24}{hover['requests']:6d}{hover['p50_ms']:10.2f}{hover['p95_ms']:10.2f}"
+          f"{hover['p99_ms']:10.2f}")
+    if results["peak_rss_bytes"] is not None:
+        print(f"Peak RSS:   {results['peak_rss_bytes'] / 1024 / 1024:.0f} MB")
+
+
+def print_comparison(baseline, results):
+    """
+    Prints every metric present in both runs with its relative change.
+    """
+    old, new = flatten(baseline), flatten(results)
+    print(f"\n{'metric':44}{'baseline':>14}{'current':>14}{'change':>10}")
+    for key in old:
+        if key in new and not key.startswith("meta."):
+            change = f"{(new[key] - old[key]) / old[key] * 100:+9.1f}%" if old[key] else f"{'':>10}"
+            print(f"{key:44}{old[key]:14.3f}{new[key]:14.3f}{change}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark suite")
+    parser.add_argument("--sentences", type=int, default=20000, help="sentences in the synthetic corpus")
+    parser.add_argument("--books", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=1, help="ingestion worker processes")
+    parser.add_argument("--words-per-bucket", type=int, default=20)
+    parser.add_argument("--repeats", type=int, default=5, help="timed searches per word")
+    parser.add_argument("--hovers", type=int, default=200)
+    parser.add_argument("--load-runs", type=int, default=5)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="JSON file of an earlier run to compare with")
+    args = parser.parse_args()
+
+    stub, api_url = start_stub_server()
+    os.environ["JISHO_API_URL"] = api_url
+    from Main.Model.user import User
+
+    work_directory = tempfile.mkdtemp()
+    books_directory = os.path.join(work_directory, "books")
+    index_directory = os.path.join(work_directory, "index", "book_index")
+    try:
+        generate_corpus(books_directory, args.sentences, args.books, args.seed, include_sample=True)
+        user = User("N5", scan_books=False, books_directory=books_directory, index_directory=index_directory)
+        cache_directory = isolated_definitions(user.JLPT_lists, api_url)
+
+        results = {
+            "meta": {
+                "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+                "commit": git_commit(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "corpus": {"sentences": args.sentences, "books": args.books, "seed": args.seed},
+                "workers": args.workers,
+                "offline_dictionary": user.JLPT_lists.offline_dictionary is not None,
+            },
+        }
+        results["ingestion"] = measure_ingestion(user, books_directory, args.workers)
+        results["index_load"] = measure_index_load(user.JLPT_lists, books_directory, index_directory, args.load_runs)
+        results["search"] = measure_search(user, args.words_per_bucket, args.repeats, args.seed)
+        results["hover"] = measure_hover(user, args.hovers, args.seed)
+        results["peak_rss_bytes"] = peak_rss()
+
+        user.JLPT_lists.definitions.cache.close()
+        shutil.rmtree(cache_directory, ignore_errors=True)
+    finally:
+        stub.shutdown()
+        shutil.rmtree(work_directory, ignore_errors=True)
+
+    print_results(results)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=1)
+        print(f"Results written to {args.output}")
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as file:
+            print_comparison(json.load(file), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+"""
+    A local stand-in for the jisho.org word search API, so definition lookups can be exercised without the network.
+    Every word gets a deterministic made-up definition, except words starting with "無", which have no entry.
+
+    Usage: python Main/Benchmark/stub_jisho.py [--port 8765] [--latency 0.05]
+    then start the server with JISHO_API_URL=http://127.0.0.1:8765/api/v1/search/words
+"""
+
+
+class StubJishoHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+    requests_served = 0
+    counter_lock = threading.Lock()
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path != "/api/v1/search/words":
+            self.send_error(404)
+            return
+        word = parse_qs(url.query).get("keyword", [""])[0]
+        with StubJishoHandler.counter_lock:
+            StubJishoHandler.requests_served += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+        data = []
+        if word and not word.startswith("無"):
+            data = [{"senses": [{"english_definitions": [f"meaning of {word}", f"{word} (stub)"]},
+                                {"english_definitions": ["another sense"]}]}]
+        body = json.dumps({"meta": {"status": 200}, "data": data}).encode('utf-8')
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server(port=0, latency=0.0):
+    """
+    Starts the stub server on a background thread.
+    :param port: port to listen on, 0 picks a free one
+    :param latency: seconds each response is delayed by, to imitate the real round-trip
+    :return: the server and the URL to use as JISHO_API_URL
+    """
+    handler = type("ConfiguredStubJishoHandler", (StubJishoHandler,), {"latency": latency})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/api/v1/search/words"
+
+
+def isolated_definitions(jlpt_lists, api_url):
+    """
+    Makes a list_management define words from its offline dictionary and the stub, caching them in a temporary database
+    so the real definition cache is left untouched.
+    :return: the temporary directory of the cache, to remove after closing jlpt_lists.definitions.cache
+    """
+    from Main.Model.definition_cache import DefinitionCache
+    from Main.Model.definition_provider import DefinitionProvider
+    from Main.Model.jisho_client import JishoClient
+
+    cache_directory = tempfile.mkdtemp()
+    jlpt_lists.definitions = DefinitionProvider(DefinitionCache(os.path.join(cache_directory, "definitions.sqlite3")),
+                                                JishoClient(api_url=api_url), dictionary=jlpt_lists.offline_dictionary)
+    return cache_directory
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stub jisho.org word search API")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.05)
+    args = parser.parse_args()
+    stub_server, api_url = start_stub_server(args.port, args.latency)
+    print(f"Serving stub Jisho API at {api_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        stub_server.shutdown()
@@ -1,162 +1,450 @@
+import logging
 import os
-import re
-import csv  # Added to handle TSV files properly
+import shutil
+import threading
+import time
+from array import array
 
-from Main.Model import sudachipi
+from Main.Model import index_format, ingestion, metrics
+from Main.Model.query import Query
+from Main.Model.segmented_index import Manifest, SegmentedIndex, file_digest, file_fingerprint
+from Main.Model.sentence_store import SentenceStore
+
+# Default memory budget of an ingestion run, see BookManagement
+MEMORY_BUDGET = 256 * 1024 * 1024
+
+logger = logging.getLogger(__name__)
+
+BOOKS_INDEXED = metrics.counter("books_indexed_total", "Books indexed or reindexed by scans for new books")
+BOOKS_RETRACTED = metrics.counter("books_retracted_total",
+                                  "Books whose sentences were retracted as they changed or were removed")
+COMPACTIONS = metrics.counter("index_compactions_total", "Merges of index segments")
 
 
 class BookManagement:
-    def __init__(self):
+    def __init__(self, jlpt_lists, workers=1, memory_budget=MEMORY_BUDGET, scan=True, books_directory=None,
+                 index_directory=None):
+        """
+        :param jlpt_lists: the initialised list_management, used to record the JLPT level of each indexed word
+        :param workers: number of processes used to tokenize new books, 1 processes them serially
+        :param memory_budget: bytes of newly indexed sentences held in memory before they are written to a segment
+        :param scan: scan for new books straight away. Otherwise only the index as last saved is opened, and books are
+                     scanned for by a later call to scan_for_new_books
+        :param books_directory: directory of the books to index, book_files if None
+        :param index_directory: directory of the segments and manifest, dictionary_files/book_index if None. The files
+                                of older versions are looked for next to it
+        """
+        self.jlpt_lists = jlpt_lists
+        self.workers = workers
+        self.memory_budget = memory_budget
+        self.chunk_size = ingestion.CHUNK_SIZE
         self.script_dir = os.path.dirname(os.path.abspath(__file__))
-        self.directory_path = os.path.join(self.script_dir, '../../book_files')
-        self.book_dictionary_path = os.path.join(self.script_dir, '../../dictionary_files/book_dictionary.txt')
-        self.dictionary = {}
-        # Initialize by scanning for books immediately
-        self.scan_for_new_books()
+        self.directory_path = books_directory or os.path.join(self.script_dir, '../../book_files')
+        # Segments of the book index and the manifest of the books they hold, see segmented_index
+        self.book_index_directory = index_directory or os.path.join(self.script_dir, '../../dictionary_files/book_index')
+        # Single-file index and list of added books written by older versions, only read to convert them
+        files_directory = os.path.dirname(os.path.normpath(self.book_index_directory))
+        self.book_index_path = os.path.join(files_directory, 'book_index.bin')
+        self.book_dictionary_path = os.path.join(files_directory, 'book_dictionary.txt')
+        self.books_added_path = os.path.join(files_directory, 'books_added.txt')
+        self.manifest = None
+        self.index = SentenceStore()
+        # Incremented whenever books are added or retracted, i.e. whenever search results may have changed
+        self.generation = 0
+        # Held while the index is being changed. Searches never take it, they use whichever index is current
+        self._write_lock = threading.RLock()
+        self._compaction = None
+        if scan:
+            # Initialize by scanning for books immediately
+            self.scan_for_new_books()
+        else:
+            self.load_index()
 
     def _get_dictionary(self):
-        return self.dictionary
+        return self.index
 
-    def _save_dic_to_file(self):
-        # Ensure directory exists before saving
-        os.makedirs(os.path.dirname(self.book_dictionary_path), exist_ok=True)
+    def _save_segment(self, store, book_sentences):
+        """
+        Writes newly ingested sentences as a new segment of the index. Sentences that an existing segment already
+        holds are not added again: their books point at the existing copy, and the new copy is left unlisted.
+        :param store: the SentenceStore the new books were ingested into
+        :param book_sentences: book name -> IDs in the store of the book's sentences
+        """
+        store.finalise()
+        base = self.manifest.sentence_count
+        global_ids = array('I', range(base, base + len(store)))
+        if len(self.index):
+            for sentence_id, sentence in enumerate(store.sentences):
+                existing_id = self.index.find_sentence(sentence)
+                if existing_id is not None:
+                    global_ids[sentence_id] = existing_id
+
+        books = []
+        for name, sentence_ids in book_sentences.items():
+            books.append((name, array('I', sorted({global_ids[sentence_id] for sentence_id in sentence_ids}))))
+
+        name = self.manifest.new_segment_name()
+        index_format.write_index(self.manifest.segment_path(name), store, base, books)
+        self.manifest.segments.append({"file": name, "base": base, "sentences": len(store)})
+        for book_name, _ in books:
+            self.manifest.books[book_name]["segments"].append(name)
 
-        with open(self.book_dictionary_path, 'w', encoding='utf-8') as file:
-            for word in self.dictionary:
-                # Clean sentences to remove newlines that might break the format
-                sentences = [s.replace('\n', '') for s in self.dictionary[word]]
-                file.write(f"{word}|{str(sentences)}\n")
+    def _save_dic_to_file(self):
+        """
+        Saves the manifest and maps the segments it lists back in.
+        """
+        self.manifest.save()
+        self.index = SegmentedIndex(self.manifest)
+        self.manifest.remove_stray_segments()
 
     def _load_dic_from_file(self):
-        if not os.path.exists(self.book_dictionary_path):
-            return
+        """
+        Memory-maps the segments of the book index, converting an index written by an older version the first time it
+        is seen.
+        """
+        try:
+            self.manifest = Manifest.load(self.book_index_directory)
+            if not os.path.exists(self.manifest.path):
+                self._convert_legacy_index()
+            self.index = SegmentedIndex(self.manifest)
+            self.manifest.remove_stray_segments()
+        except index_format.IndexFormatError as e:
+            # The index cannot be read, so every book has to be processed again
+            logger.warning(f"Could not load the book index ({e}), rebuilding it.")
+            self._reset_index()
+
+    def _reset_index(self):
+        """
+        Deletes the whole index, so that every book is indexed again on the next scan. The old segments are not closed
+        but left to be released once no search is using them.
+        """
+        shutil.rmtree(self.book_index_directory, ignore_errors=True)
+        self.manifest = Manifest(self.book_index_directory)
+        self.index = SegmentedIndex(self.manifest)
 
-        with open(self.book_dictionary_path, 'r', encoding='utf-8') as file:
-            for line in file:
-                parts = line.strip().split("|")
-                if len(parts) < 2:
-                    continue
-                # Basic cleaning of the string representation of list
-                cleaned_part = parts[1].replace("[", "").replace("]", "").replace("'", "").replace('"', '')
-                if not cleaned_part:
-                    continue
-
-                # Split by comma, but be careful with commas in sentences
-                # This simple split might be fragile for complex sentences,
-                # but fits the current logic.
-                # A more robust way would be using ast.literal_eval if we saved as proper python lists
-                sentence_array = [s.strip() for s in cleaned_part.split(", ")]
-                self.dictionary[parts[0]] = sentence_array
-
-    def _process_sentence(self, sentence):
-        """
-        Helper function to process a single sentence and add it to the dictionary
-        """
-        sentence = sentence.replace("\u3000", "").strip()
-        if not sentence:
+    def _convert_legacy_index(self):
+        """
+        Turns book_dictionary.txt or book_index.bin, with books_added.txt, into the first segment of the index. Which
+        sentences came from which book was never recorded, so these sentences stay live until the index is rebuilt.
+        """
+        if not os.path.exists(self.book_index_path) and os.path.exists(self.book_dictionary_path):
+            logger.info("Converting book_dictionary.txt to the binary index format...")
+            sentence_count, word_count = index_format.convert_text_index(self.book_dictionary_path,
+                                                                         self.book_index_path,
+                                                                         self.jlpt_lists.get_level_table())
+            logger.info(f"Converted {sentence_count} sentences and {word_count} words.")
+
+        if not os.path.exists(self.book_index_path):
             return
 
-        # uses sudachipi to break down the sentence into its component words
-        sentence_composition = sudachipi.sentence_breakdown()
-        sentence_composition.set_sentence(sentence)
-
-        if sentence_composition.get_all_dict_forms():
-            for word in sentence_composition.get_all_dict_forms():
-                if word in self.dictionary:
-                    # Avoid duplicate sentences for the same word
-                    if sentence not in self.dictionary[word]:
-                        self.dictionary[word].append(sentence)
-                else:
-                    self.dictionary[word] = [sentence]
-
-    def _add_book(self, filename):
+        try:
+            legacy_index = index_format.MappedIndex(self.book_index_path)
+        except index_format.IndexFormatError as e:
+            logger.warning(f"Could not load the book index ({e}), rebuilding it.")
+            legacy_index = None
+        if legacy_index is not None:
+            store = SentenceStore.from_index(legacy_index)
+            legacy_index.close()
+            name = self.manifest.new_segment_name()
+            index_format.write_index(self.manifest.segment_path(name), store)
+            self.manifest.segments.append({"file": name, "base": 0, "sentences": len(store)})
+            self.manifest.legacy_sentences = len(store)
+            for book in self._read_books_added():
+                book_path = os.path.join(self.directory_path, book)
+                size, mtime_ns = file_fingerprint(book_path) if os.path.exists(book_path) else (None, None)
+                self.manifest.books[book] = {"size": size, "mtime_ns": mtime_ns, "sha256": None, "segments": None,
+                                             "checkpoint": None}
+            logger.info(f"Moved {len(store)} sentences from book_index.bin into the segmented index.")
+
+        self.manifest.save()
+        os.remove(self.book_index_path)
+        if os.path.exists(self.books_added_path):
+            os.replace(self.books_added_path, self.books_added_path + ".migrated")
+
+    def _flush(self, store, book_sentences, progress):
         """
-        Adds a book (txt) or corpus (tsv) to the dictionary.
+        Writes what has been ingested so far as a segment and records how far into each book ingestion has got, so an
+        interrupted run can resume from there.
+        :param progress: book name -> byte offset up to which the book has been read
         """
-        self._books_added_to_dic(filename)
-        file_path = os.path.join(self.directory_path, filename)
-
-        print(f"Processing {filename}...")
-
-        if filename.endswith('.tsv'):
-            # Handle TSV files (Tatoeba format)
-            # Tatoeba format ID \t Language \t Sentence
-            with open(file_path, 'r', encoding='utf-8') as file:
-                # TSV reader
-                reader = csv.reader(file, delimiter='\t')
-                for row in reader:
-                    if not row: continue
-
-
-                    text = ""
-                    if len(row) == 3 and row[1] == 'jpn':
-                        text = row[2]
-                    elif len(row) >= 2:
-                        text = row[-1]
-
-                    if text:
-                        self._process_sentence(text)
-
-        else:
-            # Handle standard Text files
-            with open(file_path, 'r', encoding='utf-8') as file:
-                for line in file:
-                    # Split by sentence delimiters
-                    sentences = re.split(r'(?<=[。！？])|\n', line)
-                    for sentence in sentences:
-                        self._process_sentence(sentence)
-
-    def _books_added_to_dic(self, book):
+        if len(store):
+            self._save_segment(store, book_sentences)
+        for name, offset in progress.items():
+            book = self.manifest.books[name]
+            book["checkpoint"] = None if offset >= book["size"] else offset
+        self._save_dic_to_file()
+
+    def _ingest_books(self, filenames, resume_offsets):
         """
-        Once a book is added to the dictionary, make a note of it
+        Streams books into the index chunk by chunk. Whenever the sentences held in memory exceed the memory budget
+        they are flushed to a new segment along with a checkpoint.
+        :param filenames: the books to add, in order
+        :param resume_offsets: book name -> byte offset to resume an interrupted book from
         """
-        file_path = os.path.join(self.script_dir, '../../dictionary_files/books_added.txt')
-        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        if self.workers > 1:
+            logger.info(f"Processing {len(filenames)} books with {self.workers} workers...")
+        names = {}
+        tasks = []
+        for filename in filenames:
+            file_path = os.path.join(self.directory_path, filename)
+            names[file_path] = filename
+            start = resume_offsets.get(filename, 0)
+            if start:
+                logger.info(f"Resuming {filename} at byte {start}...")
+            elif self.workers == 1:
+                logger.info(f"Processing {filename}...")
+            tasks.extend((file_path, chunk_start, end) for chunk_start, end in
+                         ingestion.plan_chunks(file_path, self.chunk_size, start))
+
+        report = ingestion.IngestReport()
+        began = time.perf_counter()
+        store = SentenceStore()
+        book_sentences = {}
+        progress = {}
+        for (file_path, start, end), (partial, sentence_count, seconds, pid) in ingestion.iter_ingested_chunks(
+                tasks, self.workers, self.jlpt_lists.get_level_table()):
+            name = names[file_path]
+            book_sentences.setdefault(name, array('I')).extend(store.merge(partial))
+            progress[name] = end
+            report.add(pid, sentence_count, seconds, end - start)
+            if store.estimated_size() >= self.memory_budget:
+                self._flush(store, book_sentences, progress)
+                logger.info(f"  flushed {len(store)} sentences, {report.sentences} so far")
+                store = SentenceStore()
+                book_sentences = {}
+
+        progress.update((filename, self.manifest.books[filename]["size"]) for filename in filenames)
+        self._flush(store, book_sentences, progress)
+        report.elapsed = time.perf_counter() - began
+        report.log_report()
+
+    def _books_added_to_dic(self, book, fingerprint, digest):
+        """
+        Once a book is added to the dictionary, make a note of it in the manifest
+        """
+        size, mtime_ns = fingerprint
+        self.manifest.books[book] = {"size": size, "mtime_ns": mtime_ns, "sha256": digest, "segments": [],
+                                     "checkpoint": 0}
 
-        with open(file_path, 'a', encoding='utf-8') as file:
-            file.write(f"{book}\n")
+    def _read_books_added(self):
+        if not os.path.exists(self.books_added_path):
+            return []
+        with open(self.books_added_path, 'r', encoding='utf-8') as file:
+            return list(dict.fromkeys(line.strip() for line in file if line.strip()))
 
-    def _check_if_book_added(self, book):
+    def _check_if_book_added(self, book, fingerprint):
         """
-        checks if a book has already been added to the dictionary
+        Checks if a book has already been added to the dictionary and has not changed since. Only books whose size or
+        modification time differ from the manifest are hashed.
+        :return: (whether the book is indexed, or partly indexed, and unchanged, SHA-256 of the book if it had to be
+                 hashed)
         """
-        file_path = os.path.join(self.script_dir, '../../dictionary_files/books_added.txt')
-        if not os.path.exists(file_path):
-            return False
-
-        with open(file_path, 'r', encoding='utf-8') as file:
-            for line in file:
-                if book in line.strip():
-                    return True
-        return False
+        entry = self.manifest.books.get(book)
+        if entry is None:
+            return False, None
+        if (entry["size"], entry["mtime_ns"]) == tuple(fingerprint):
+            return True, None
+
+        digest = file_digest(os.path.join(self.directory_path, book))
+        if entry["sha256"] is None or entry["sha256"] != digest:
+            return False, digest
+        # Touched but not changed
+        entry["size"], entry["mtime_ns"] = fingerprint
+        return True, digest
+
+    def load_index(self):
+        """
+        Opens the index as it was last saved, without looking for new or changed books.
+        """
+        with self._write_lock:
+            if self.manifest is None:
+                self._load_dic_from_file()
 
     def scan_for_new_books(self):
         """
-        Scans the book_files directory for .txt and .tsv files.
+        Scans the book_files directory for .txt and .tsv files. New and changed books are tokenized into a new
+        segment of the index, and the sentences of changed and removed books are retracted.
+        :return: the books that were (re)indexed
         """
-        added_books = []
-
-        # loads the existing dictionary
-        self._load_dic_from_file()
+        with self._write_lock:
+            # loads the existing dictionary, which afterwards is kept up to date in memory
+            if self.manifest is None:
+                self._load_dic_from_file()
+
+            if not os.path.exists(self.directory_path):
+                os.makedirs(self.directory_path)
+
+            books = {}
+            for filename in sorted(os.listdir(self.directory_path)):
+                if filename.endswith(".txt") or filename.endswith(".tsv"):
+                    books[filename] = file_fingerprint(os.path.join(self.directory_path, filename))
+
+            added_books = []
+            digests = {}
+            resume_offsets = {}
+            for filename, fingerprint in books.items():
+                unchanged, digest = self._check_if_book_added(filename, fingerprint)
+                if not unchanged:
+                    added_books.append(filename)
+                    digests[filename] = digest
+                elif self.manifest.books[filename]["checkpoint"] is not None:
+                    # The last run was interrupted while reading this book
+                    added_books.append(filename)
+                    resume_offsets[filename] = self.manifest.books[filename]["checkpoint"]
+            removed_books = [book for book in self.manifest.books if book not in books]
+            retracted_books = removed_books + [book for book in added_books
+                                               if book in self.manifest.books and book not in resume_offsets]
+
+            if any(self.manifest.books[book]["segments"] is None for book in retracted_books):
+                # Sentences indexed before the manifest existed cannot be told apart by book
+                logger.warning("A book indexed by an older version was changed or removed, rebuilding the index.")
+                self._reset_index()
+                added_books = list(books)
+                retracted_books = []
+                resume_offsets = {}
+
+            for book in retracted_books:
+                del self.manifest.books[book]
+            if removed_books:
+                logger.info(f"Removed {len(removed_books)} books from the index: {', '.join(removed_books)}")
+
+            if added_books:
+                for filename in added_books:
+                    if filename not in resume_offsets:
+                        digest = digests.get(filename) or file_digest(os.path.join(self.directory_path, filename))
+                        self._books_added_to_dic(filename, books[filename], digest)
+                # Recorded before anything is read, so that a crash leaves every book marked as unfinished
+                self.manifest.save()
+                self._ingest_books(added_books, resume_offsets)
+            else:
+                self._save_dic_to_file()
+            if retracted_books:
+                logger.info(f"{self.index.dead_count} of {len(self.index)} sentences are retracted.")
+            if added_books or retracted_books:
+                self.generation += 1
+                BOOKS_INDEXED.inc(len(added_books))
+                BOOKS_RETRACTED.inc(len(retracted_books))
+            if self.index.needs_compaction():
+                self.compact()
+
+            return added_books
+
+    def compact(self, wait=False):
+        """
+        Merges adjacent segments in a background thread, dropping retracted sentences. Searches keep using the current
+        segments until the merged ones are ready; scans wait for the merge to finish.
+        :param wait: block until the merge has finished
+        """
+        with self._write_lock:
+            if self._compaction is None or not self._compaction.is_alive():
+                self._compaction = threading.Thread(target=self._compact, name="index-compaction", daemon=True)
+                self._compaction.start()
+        if wait:
+            self.wait_for_compaction()
+
+    def wait_for_compaction(self):
+        compaction = self._compaction
+        if compaction is not None:
+            compaction.join()
+
+    def _compaction_groups(self, index):
+        """
+        Picks runs of adjacent segments to merge. A run is only as large as the memory budget allows, as merging loads
+        its segments into memory, where they take up several times their file size.
+        :return: list of runs of (manifest entry, MappedIndex)
+        """
+        limit = self.memory_budget // 4
+        groups = [[]]
+        size = 0
+        for entry, segment in zip(self.manifest.segments, index.segments):
+            file_size = os.path.getsize(self.manifest.segment_path(entry["file"]))
+            if groups[-1] and size + file_size > limit:
+                groups.append([])
+                size = 0
+            groups[-1].append((entry, segment))
+            size += file_size
+        return [group for group in groups if len(group) > 1 or (group and index.dead_in(group[0][1]))]
+
+    def _compact(self):
+        with self._write_lock:
+            index = self.index
+            groups = self._compaction_groups(index)
+            if not groups:
+                return
+            logger.info(f"Merging {sum(len(group) for group in groups)} index segments into {len(groups)}...")
+            for group in groups:
+                files = [entry["file"] for entry, _ in group]
+                store = SentenceStore()
+                for _, segment in group:
+                    live = None
+                    if index.live is not None:
+                        live = index.live[segment.base:segment.base + len(segment)]
+                    store.append_index(segment, live)
+
+                books = []
+                for book_name, book in self.manifest.books.items():
+                    parts = [segment.get_book_sentences(book_name) for _, segment in group
+                             if book["segments"] and segment.books.get(book_name) is not None]
+                    if parts:
+                        books.append((book_name, array('I', sorted(set().union(*parts)))))
+
+                base = group[0][1].base
+                name = self.manifest.new_segment_name()
+                index_format.write_index(self.manifest.segment_path(name), store, base, books)
+                position = self.manifest.segments.index(group[0][0])
+                self.manifest.segments[position:position + len(group)] = [
+                    {"file": name, "base": base, "sentences": len(store)}]
+                for book in self.manifest.books.values():
+                    if book["segments"] and any(file in files for file in book["segments"]):
+                        book["segments"] = [file for file in book["segments"] if file not in files] + [name]
+                        book["segments"].sort()
+            # The old segments are not closed, as searches running on other threads may still be reading them
+            self._save_dic_to_file()
+            COMPACTIONS.inc()
+            logger.info(f"The index now has {len(self.manifest.segments)} segments.")
 
-        if not os.path.exists(self.directory_path):
-            os.makedirs(self.directory_path)
+    def search_dic(self, word):
+        """
+        :param word: dictionary form to look up
+        :return: sorted array of the IDs of the sentences containing the word, None if it is not indexed
+        """
+        return self.index.search(word)
 
-        for filename in os.listdir(self.directory_path):
-            if filename.endswith(".txt") or filename.endswith(".tsv"):
-                if not self._check_if_book_added(filename):
-                    self._add_book(filename)
-                    added_books.append(filename)
+    def search_query(self, query):
+        """
+        :param query: a query.Query or the text of one, e.g. "彼女 結婚する"
+        :return: sorted array of the IDs of the sentences matching the query
+        :raises ValueError: if the query cannot be parsed
+        """
+        if not isinstance(query, Query):
+            query = Query(query)
+        return query.evaluate(self.index.search)
 
-        if added_books:
-            self._save_dic_to_file()
+    def get_sentence(self, sentence_id):
+        return self.index.get_sentence(sentence_id)
 
-        return added_books
+    def has_sentence(self, sentence_id):
+        """
+        :return: whether the ID is of a sentence searches can return, i.e. one that exists and is not tombstoned
+        """
+        index = self.index
+        if not 0 <= sentence_id < len(index) or not index.get_word_count(sentence_id):
+            return False
+        return not isinstance(index, SegmentedIndex) or index.is_live(sentence_id)
 
-    def search_dic(self, word):
-        return self.dictionary.get(word)
+    def get_sentence_scores(self, sentence_id):
+        """
+        :return: the level counts (N5..N1, non-JLPT), the non-JLPT words and the word count stored for a sentence
+        """
+        return (self.index.get_level_counts(sentence_id), self.index.get_non_jlpt_words(sentence_id),
+                self.index.get_word_count(sentence_id))
 
 
 if __name__ == "__main__":
-    book_management = BookManagement()
-    book_management.scan_for_new_books()
\ No newline at end of file
+    from Main.Model.list_management import list_management
+
+    jlpt_lists = list_management()
+    jlpt_lists.initialise()
+    book_management = BookManagement(jlpt_lists)
+    book_management.scan_for_new_books()
+    book_management.wait_for_compaction()
@@ -0,0 +1,138 @@
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import time
+
+"""
+    Persistent cache of Jisho definitions backed by SQLite in WAL mode. Writes are buffered and flushed in batches, so
+    caching a definition costs the same however large the cache is, and words Jisho has no entry for are cached with a
+    time-to-live so they are looked up again eventually.
+"""
+
+# Words without an entry are retried after this many seconds
+NEGATIVE_TTL = 30 * 24 * 60 * 60
+
+
+class DefinitionCache:
+    def __init__(self, db_path, negative_ttl=NEGATIVE_TTL, flush_size=32, flush_interval=2.0):
+        """
+        :param db_path: the SQLite database file
+        :param negative_ttl: seconds a NOT_FOUND entry stays valid
+        :param flush_size: number of buffered writes that triggers a flush
+        :param flush_interval: seconds after which buffered writes are flushed on the next write
+        """
+        self.db_path = db_path
+        self.negative_ttl = negative_ttl
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self._pending = {}
+        self._last_flush = time.monotonic()
+        self._lock = threading.RLock()
+
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._connection = sqlite3.connect(db_path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS definitions ("
+            "word TEXT PRIMARY KEY, definitions TEXT, found INTEGER NOT NULL, updated REAL NOT NULL)")
+        self._connection.commit()
+        atexit.register(self.close)
+
+    def __len__(self):
+        with self._lock:
+            self.flush()
+            return self._connection.execute("SELECT COUNT(*) FROM definitions").fetchone()[0]
+
+    def get(self, word):
+        """
+        :return: (True, list of definitions) for a cached word, (True, None) for a cached word Jisho has no entry for,
+                 (False, None) if the word is not cached or its NOT_FOUND entry has expired
+        """
+        with self._lock:
+            if word in self._pending:
+                return True, self._pending[word][0]
+            row = self._connection.execute(
+                "SELECT definitions, found, updated FROM definitions WHERE word = ?", (word,)).fetchone()
+        if row is None:
+            return False, None
+        definitions, found, updated = row
+        if not found:
+            if time.time() - updated > self.negative_ttl:
+                return False, None
+            return True, None
+        return True, json.loads(definitions)
+
+    def put(self, word, definitions):
+        """
+        Buffers a lookup result. Buffered entries are visible to get() straight away.
+        :param definitions: list of definitions, None or empty if Jisho has no entry for the word
+        """
+        with self._lock:
+            self._pending[word] = (definitions or None, time.time())
+            if len(self._pending) >= self.flush_size or time.monotonic() - self._last_flush >= self.flush_interval:
+                self.flush()
+
+    def flush(self):
+        """
+        Writes all buffered entries in one transaction.
+        """
+        with self._lock:
+            self._last_flush = time.monotonic()
+            if not self._pending or self._connection is None:
+                return
+            rows = [(word, json.dumps(definitions, ensure_ascii=False) if definitions else None,
+                     1 if definitions else 0, updated)
+                    for word, (definitions, updated) in self._pending.items()]
+            with self._connection:
+                self._connection.executemany(
+                    "INSERT OR REPLACE INTO definitions (word, definitions, found, updated) VALUES (?, ?, ?, ?)", rows)
+            self._pending.clear()
+
+    def prune(self):
+        """
+        Deletes expired NOT_FOUND entries.
+        :return: the number of entries removed
+        """
+        with self._lock:
+            self.flush()
+            with self._connection:
+                cursor = self._connection.execute("DELETE FROM definitions WHERE found = 0 AND updated < ?",
+                                                  (time.time() - self.negative_ttl,))
+            return cursor.rowcount
+
+    def migrate_json(self, json_path):
+        """
+        Imports the old jisho_cache.json (word to "definition" or "NOT_FOUND") and renames it so it is only imported
+        once. Entries already in the database are kept.
+        :return: the number of entries imported
+        """
+        if not os.path.exists(json_path):
+            return 0
+        with open(json_path, 'r', encoding='utf-8') as f:
+            old_cache = json.load(f)
+
+        now = time.time()
+        rows = []
+        for word, definition in old_cache.items():
+            if definition == "NOT_FOUND":
+                rows.append((word, None, 0, now))
+            else:
+                # The old cache kept the first two definitions joined into one string
+                rows.append((word, json.dumps([definition], ensure_ascii=False), 1, now))
+        with self._lock:
+            with self._connection:
+                cursor = self._connection.executemany(
+                    "INSERT OR IGNORE INTO definitions (word, definitions, found, updated) VALUES (?, ?, ?, ?)", rows)
+        os.replace(json_path, json_path + ".migrated")
+        return cursor.rowcount
+
+    def close(self):
+        with self._lock:
+            if self._connection is None:
+                return
+            self.flush()
+            self._connection.close()
+            self._connection = None
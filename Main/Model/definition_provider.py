@@ -0,0 +1,154 @@
+import threading
+import time
+from concurrent.futures import wait
+
+from Main.Model.lru_cache import LRUCache
+
+"""
+    The single source of word definitions for the whole backend. Lookups go to the offline dictionary if one has been
+    imported, then through an in-memory LRU hot tier and the persistent DefinitionCache, and only then to Jisho.
+    Concurrent lookups of the same uncached word share a single upstream request (single-flight), so two server threads
+    hovering the same word trigger at most one fetch.
+
+    Words Jisho has no entry for expire from the hot tier after at most MISS_TTL seconds, so a running server looks
+    them up again once the persistent cache lets their NOT_FOUND entry expire.
+"""
+
+_NOT_CACHED = object()
+
+# Longest time in seconds a word Jisho has no entry for stays in the hot tier
+MISS_TTL = 60 * 60
+
+
+class DefinitionProvider:
+    # Seconds a caller waits for definitions that are not cached yet
+    DEFAULT_BUDGET = 1.5
+
+    def __init__(self, cache, client, hot_size=4096, dictionary=None, network_fallback=True):
+        """
+        :param cache: the persistent DefinitionCache
+        :param client: the JishoClient used for cache misses
+        :param hot_size: number of words kept in memory
+        :param dictionary: optional OfflineDictionary asked before anything else
+        :param network_fallback: whether words missing from the dictionary and the caches are looked up on Jisho
+        """
+        self.cache = cache
+        self.client = client
+        self.dictionary = dictionary
+        self.network_fallback = network_fallback
+        self.offline_hits = 0
+        self.hot = LRUCache(hot_size)
+        # Never longer than the persistent cache keeps them
+        self.miss_ttl = min(MISS_TTL, cache.negative_ttl)
+        self.upstream_fetches = 0
+        self.coalesced = 0
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def _cached(self, word):
+        """
+        :return: the cached definitions (None for a word Jisho has no entry for) or _NOT_CACHED
+        """
+        definitions = self.hot.get(word, _NOT_CACHED)
+        if definitions is not _NOT_CACHED:
+            return definitions
+        cached, definitions = self.cache.get(word)
+        if not cached:
+            return _NOT_CACHED
+        self._remember(word, definitions)
+        return definitions
+
+    def _remember(self, word, definitions):
+        self.hot.put(word, definitions, None if definitions is not None else self.miss_ttl)
+
+    def _fetch(self, word, deadline):
+        try:
+            definitions = self.client.fetch(word, deadline) or None
+            self._remember(word, definitions)
+            self.cache.put(word, definitions)
+            return definitions
+        finally:
+            with self._lock:
+                self._in_flight.pop(word, None)
+
+    def _start_fetch(self, word, deadline):
+        """
+        :return: the future of the upstream request for the word, joining one that is already in flight
+        """
+        with self._lock:
+            future = self._in_flight.get(word)
+            if future is not None:
+                self.coalesced += 1
+                return future
+            # The fetch may have completed between the cache check and taking the lock
+            definitions = self.hot.get(word, _NOT_CACHED)
+            if definitions is not _NOT_CACHED:
+                return None
+            self.upstream_fetches += 1
+            future = self.client.submit(self._fetch, word, deadline)
+            self._in_flight[word] = future
+            return future
+
+    def get_definitions(self, word, budget=None):
+        """
+        :param word: the word to define
+        :param budget: seconds to wait if the word has to be fetched, DEFAULT_BUDGET if None
+        :return: list of definitions, None if there are none or they could not be fetched in time
+        """
+        return self.get_many([word], budget).get(word)
+
+    def get_many(self, words, budget=None):
+        """
+        Defines several words, fetching all cache misses concurrently.
+        :param words: the words to define
+        :param budget: seconds to wait for cache misses, DEFAULT_BUDGET if None. Fetches still running afterwards are
+                       cached when they complete
+        :return: mapping of word to list of definitions (None if Jisho has no entry) for every word resolved in time
+        """
+        budget = self.DEFAULT_BUDGET if budget is None else budget
+        deadline = time.monotonic() + budget
+        results = {}
+        futures = {}
+        for word in dict.fromkeys(words):
+            if self.dictionary is not None:
+                definitions = self.dictionary.lookup(word)
+                if definitions is not None:
+                    self.offline_hits += 1
+                    results[word] = definitions
+                    continue
+            definitions = self._cached(word)
+            if definitions is not _NOT_CACHED:
+                results[word] = definitions
+                continue
+            if not self.network_fallback:
+                results[word] = None
+                continue
+            future = self._start_fetch(word, deadline)
+            if future is None:
+                results[word] = self.hot.get(word)
+            else:
+                futures[future] = word
+
+        if futures:
+            done, _ = wait(futures, timeout=max(0.0, deadline - time.monotonic()))
+            for future in done:
+                try:
+                    results[futures[future]] = future.result()
+                except Exception:
+                    # Failed lookups are not cached, so the word is tried again next time
+                    pass
+        return results
+
+    def flush(self):
+        self.cache.flush()
+
+    def stats(self):
+        """
+        :return: hot tier counters plus the number of offline dictionary hits, upstream fetches and lookups that joined
+                 a fetch in flight
+        """
+        stats = {"hot_" + key: value for key, value in self.hot.stats().items()}
+        stats["offline_hits"] = self.offline_hits
+        stats["upstream_fetches"] = self.upstream_fetches
+        stats["coalesced"] = self.coalesced
+        return stats
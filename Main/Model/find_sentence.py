@@ -1,27 +1,38 @@
 import os
-import re
+
+from Main.Model.segmented_index import Manifest, SegmentedIndex
+
+"""
+    Search of the indexed books by surface form rather than by dictionary form, e.g. for grammar patterns such as
+    ～てしまう or ～わけにはいかない. The search goes through the character bigram index stored with the book index (see
+    text_search), so it no longer reads and splits every book for each query.
+"""
+
 
 class SearchFiles:
 
-    def __init__(self, search_term):
+    def __init__(self, search_term, index=None):
+        """
+        :param search_term: literal text, with * (or ～) for any run of characters and ? for any one character
+        :param index: the SegmentedIndex to search, the book index as last saved if None
+        """
         self.script_dir = os.path.dirname(os.path.abspath(__file__))
-        self.directory_path = self.user_db_path = os.path.join(self.script_dir, "../book_files")
+        self.book_index_directory = os.path.join(self.script_dir, '../../dictionary_files/book_index')
         self.search_term = search_term
-        self.pattern = re.compile(re.escape(search_term), re.UNICODE)
+        self.index = index if index is not None else SegmentedIndex(Manifest.load(self.book_index_directory))
+
+    def find_sentence_ids(self, limit=None):
+        """
+        :return: the IDs of the matching sentences, in ID order
+        :raises ValueError: if the search term has no text outside its wildcards
+        """
+        return self.index.search_text(self.search_term, limit)
 
-    def return_sentence(self):
+    def return_sentence(self, limit=None):
         matches = []
-        # Iterate through files in the directory
-        for filename in os.listdir(self.directory_path):
-            if filename.endswith(".txt"):
-                file_path = os.path.join(self.directory_path, filename)
-                with open(file_path, "r", encoding="utf-8") as file:
-                    content = file.read()
-                    # Split content into sentences
-                    sentences = re.split(r'(?<=[。！？])|\n', content)                    # Check for matches in each sentence
-                    for sentence in sentences:
-                        if self.pattern.search(sentence):
-                            matches.append(f"Found in {filename}: {sentence.strip()}")
+        for sentence_id in self.find_sentence_ids(limit):
+            books = ", ".join(self.index.get_books_of(sentence_id)) or "the book index"
+            matches.append(f"Found in {books}: {self.index.get_sentence(sentence_id).strip()}")
         return matches
 
     def score_sentence(self):
@@ -0,0 +1,501 @@
+import ast
+import bisect
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+import numpy as np
+
+from Main.Model import ingestion, sudachipi, text_search
+from Main.Model.sentence_store import LEVEL_BUCKETS, SentenceStore
+
+"""
+    Versioned binary on-disk format for the book index, which is made of one or more of these files (segments, see
+    segmented_index).
+
+    The file starts with a header (magic, version, section count) followed by a table of sections, each given as a
+    4 byte tag with its offset and length. Sections are 8 byte aligned so they can be viewed in place once the file
+    is memory-mapped:
+
+        META  JSON with the sentence and word counts, the byte order the arrays were written in, the global ID of the
+              segment's first sentence and the names of the books whose sentences are listed in BREF
+        VOFF  uint64 offsets of each word in VBLB (word count + 1 entries)
+        VBLB  UTF-8 dictionary forms, sorted, so a word's ID is its position in the vocabulary
+        POFF  uint64 offsets of each word's posting block in POST (word count + 1 entries)
+        POST  uint32 sentence IDs, one sorted block per word
+        SOFF  uint64 offsets of each sentence in SBLB (sentence count + 1 entries)
+        SBLB  UTF-8 sentence text
+        WCNT  uint16 number of words in each sentence
+        LVLS  uint16 per sentence: number of N5, N4, N3, N2, N1 and non-JLPT words
+        XOFF  uint32 offsets of each sentence's non-JLPT word IDs in XWRD (sentence count + 1 entries)
+        XWRD  uint32 word IDs of the words in each sentence that are not in a JLPT list
+        HASH  uint64 hashes of the sentences (see sentence_hash), sorted, to find a sentence by its text
+        HSID  uint32 ID of the sentence of each hash in HASH
+        BOFF  uint64 offsets of each book's sentences in BREF (book count + 1 entries)
+        BREF  uint32 global IDs of the sentences read from each book, sorted per book. A sentence found in several
+              books is listed under each of them
+        GKEY  uint64 keys of the character bigrams of the sentences, sorted (see text_search)
+        GOFF  uint64 offsets of each bigram's posting block in GPST (bigram count + 1 entries)
+        GPST  uint32 sentence IDs, one sorted block per bigram
+        WOFF  uint64 offsets of each sentence's word IDs in WIDS (sentence count + 1 entries)
+        WIDS  uint32 IDs of the distinct words of each sentence, sorted per sentence
+
+    Looking up a word is a binary search over the vocabulary, so only the pages holding the probed words, the
+    matching posting block and the returned sentences are ever read from disk.
+"""
+
+MAGIC = b"JTPINDEX"
+VERSION = 5
+# Version 2 files lack the HASH, HSID, BOFF and BREF sections but can still be read, to convert them. Version 3 files
+# lack the bigram sections, so text searches check every sentence of them. Files before version 5 lack the WOFF and
+# WIDS sections, which are then rebuilt from the postings when they are needed
+READABLE_VERSIONS = (2, 3, 4, 5)
+HEADER = struct.Struct("<8sHH4x")
+SECTION = struct.Struct("<4sQQ")
+
+
+class IndexFormatError(Exception):
+    pass
+
+
+def _offsets(chunks):
+    offsets = array('Q', [0])
+    total = 0
+    for chunk in chunks:
+        total += len(chunk)
+        offsets.append(total)
+    return offsets
+
+
+def write_sections(path, magic, version, sections):
+    """
+    Writes a file in the sectioned layout described above. The file is written next to the target and then moved
+    into place.
+    :param magic: 8 byte file type marker
+    :param sections: list of (4 byte tag, bytes)
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = path + ".tmp"
+    with open(temp_path, 'wb') as file:
+        position = HEADER.size + SECTION.size * len(sections)
+        table = []
+        for tag, data in sections:
+            position += -position % 8
+            table.append((tag, position, len(data)))
+            position += len(data)
+
+        file.write(HEADER.pack(magic, version, len(sections)))
+        for entry in table:
+            file.write(SECTION.pack(*entry))
+        for (tag, data), (_, offset, _) in zip(sections, table):
+            file.write(b"\0" * (offset - file.tell()))
+            file.write(data)
+    os.replace(temp_path, path)
+
+
+def sentence_hash(sentence):
+    """
+    :return: 64 bit hash of a sentence's text, the same in every process
+    """
+    return int.from_bytes(hashlib.blake2b(sentence.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def invert_postings(posting_offsets, postings, sentence_count):
+    """
+    Turns the sentences of each word into the words of each sentence.
+    :param posting_offsets: offsets of each word's block in postings (word count + 1 entries)
+    :param postings: sentence IDs, one sorted block per word
+    :return: (uint64 offsets of each sentence's block in the word IDs (sentence count + 1 entries), uint32 word IDs, one
+             sorted block per sentence)
+    """
+    word_ids = np.repeat(np.arange(len(posting_offsets) - 1, dtype=np.uint32),
+                         np.diff(posting_offsets.astype(np.int64)))
+    # Stable, so the word IDs stay sorted within each sentence
+    order = np.argsort(postings, kind='stable')
+    offsets = np.zeros(sentence_count + 1, dtype=np.uint64)
+    np.cumsum(np.bincount(postings, minlength=sentence_count), out=offsets[1:])
+    return offsets, word_ids[order]
+
+
+def write_index(path, store, base=0, books=()):
+    """
+    Writes a book index to disk. The file is written next to the target and then moved into place.
+    Word IDs are renumbered so that they follow the sorted order of the vocabulary.
+    :param path: destination file
+    :param store: the SentenceStore to write
+    :param base: global sentence ID of the store's first sentence when it is written as a segment
+    :param books: list of (book name, sorted global IDs of the book's sentences)
+    """
+    order = sorted(range(store.word_count), key=store.get_word)
+    rank = array('I', bytes(4 * store.word_count))
+    for new_id, old_id in enumerate(order):
+        rank[old_id] = new_id
+
+    encoded_words = [store.get_word(word_id).encode('utf-8') for word_id in order]
+    encoded_sentences = [sentence.encode('utf-8') for sentence in store.sentences]
+
+    posting_offsets = array('Q', [0])
+    posting_data = array('I')
+    for word_id in order:
+        posting_data.extend(store.get_posting(word_id))
+        posting_offsets.append(len(posting_data))
+
+    non_jlpt_words = array('I', (rank[word_id] for word_id in store.non_jlpt_words))
+    sentence_word_offsets, sentence_words = invert_postings(np.frombuffer(posting_offsets, dtype=np.uint64),
+                                                            np.frombuffer(posting_data, dtype=np.uint32), len(store))
+
+    # Empty sentences are the slots of removed sentences, which cannot be found again
+    hashed = sorted((sentence_hash(sentence), sentence_id) for sentence_id, sentence in enumerate(store.sentences)
+                    if sentence)
+    book_offsets = array('Q', [0])
+    book_sentences = array('I')
+    for _, sentence_ids in books:
+        book_sentences.extend(sentence_ids)
+        book_offsets.append(len(book_sentences))
+
+    gram_keys, gram_offsets, gram_postings = text_search.build_bigrams(store.sentences)
+
+    meta = {"sentences": len(store), "words": store.word_count, "byteorder": sys.byteorder, "base": base,
+            "books": [name for name, _ in books]}
+    sections = [
+        (b"META", json.dumps(meta).encode('utf-8')),
+        (b"VOFF", _offsets(encoded_words).tobytes()),
+        (b"VBLB", b"".join(encoded_words)),
+        (b"POFF", posting_offsets.tobytes()),
+        (b"POST", posting_data.tobytes()),
+        (b"SOFF", _offsets(encoded_sentences).tobytes()),
+        (b"SBLB", b"".join(encoded_sentences)),
+        (b"WCNT", store.word_counts.tobytes()),
+        (b"LVLS", store.level_counts.tobytes()),
+        (b"XOFF", store.non_jlpt_offsets.tobytes()),
+        (b"XWRD", non_jlpt_words.tobytes()),
+        (b"HASH", array('Q', (hash_value for hash_value, _ in hashed)).tobytes()),
+        (b"HSID", array('I', (sentence_id for _, sentence_id in hashed)).tobytes()),
+        (b"BOFF", book_offsets.tobytes()),
+        (b"BREF", book_sentences.tobytes()),
+        (b"GKEY", gram_keys.tobytes()),
+        (b"GOFF", gram_offsets.tobytes()),
+        (b"GPST", gram_postings.tobytes()),
+        (b"WOFF", sentence_word_offsets.tobytes()),
+        (b"WIDS", sentence_words.tobytes()),
+    ]
+
+    write_sections(path, MAGIC, VERSION, sections)
+
+
+class SectionFile:
+    """
+    Read-only, memory-mapped view of a file written by write_sections(). Subclasses set MAGIC, VERSION and KIND and
+    pick their sections out in _read_sections().
+    """
+    MAGIC = MAGIC
+    VERSION = VERSION
+    READABLE_VERSIONS = None
+    KIND = "book index"
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise IndexFormatError(f"{path} is empty")
+        self._views = []
+        try:
+            self._read_header()
+            self._read_sections()
+        except Exception:
+            self.close()
+            raise
+
+    def _read_header(self):
+        if len(self._map) < HEADER.size:
+            raise IndexFormatError(f"{self.path} is not a valid {self.KIND}")
+        magic, version, section_count = HEADER.unpack_from(self._map, 0)
+        if magic != self.MAGIC:
+            raise IndexFormatError(f"{self.path} is not a valid {self.KIND}")
+        if version not in (self.READABLE_VERSIONS or (self.VERSION,)):
+            raise IndexFormatError(f"{self.path} has {self.KIND} version {version}, expected {self.VERSION}")
+        self.version = version
+
+        self.sections = {}
+        for i in range(section_count):
+            tag, offset, length = SECTION.unpack_from(self._map, HEADER.size + i * SECTION.size)
+            self.sections[tag] = (offset, length)
+
+        self.meta = json.loads(self._section(b"META").tobytes())
+        if self.meta["byteorder"] != sys.byteorder:
+            raise IndexFormatError(f"{self.path} was written on a {self.meta['byteorder']}-endian machine")
+
+    def _read_sections(self):
+        pass
+
+    def _section(self, tag):
+        if tag not in self.sections:
+            raise IndexFormatError(f"{self.path} is missing the {tag.decode()} section")
+        offset, length = self.sections[tag]
+        view = memoryview(self._map)[offset:offset + length]
+        self._views.append(view)
+        return view
+
+    def _cast(self, tag, typecode, default=None):
+        """
+        :param default: returned if the section is missing, instead of raising IndexFormatError
+        """
+        if default is not None and tag not in self.sections:
+            return default
+        view = self._section(tag).cast(typecode)
+        self._views.append(view)
+        return view
+
+    def close(self):
+        """
+        Releases the mapping. Arrays returned by lookups are copies and stay valid afterwards.
+        """
+        for view in reversed(self._views):
+            view.release()
+        self._views = []
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+
+def find_key(keys, offsets, count, key):
+    """
+    Binary search over sorted UTF-8 keys stored back to back in a blob.
+    :param keys: the key blob
+    :param offsets: offsets of each key in the blob (count + 1 entries)
+    :param key: the encoded key to look for
+    :return: the position of the key, None if it is not there
+    """
+    low, high = 0, count
+    while low < high:
+        middle = (low + high) // 2
+        if keys[offsets[middle]:offsets[middle + 1]].tobytes() < key:
+            low = middle + 1
+        else:
+            high = middle
+    if low < count and keys[offsets[low]:offsets[low + 1]].tobytes() == key:
+        return low
+    return None
+
+
+class MappedIndex(SectionFile):
+    """
+    Read-only view of a book index file. The file is memory-mapped rather than read, so opening it is cheap regardless
+    of the size of the library.
+    """
+    READABLE_VERSIONS = READABLE_VERSIONS
+
+    def _read_sections(self):
+        self.base = self.meta.get("base", 0)
+        self.books = {name: position for position, name in enumerate(self.meta.get("books", []))}
+        self.sentence_count = self.meta["sentences"]
+        self.word_count = self.meta["words"]
+        self._word_offsets = self._cast(b"VOFF", 'Q')
+        self._word_blob = self._section(b"VBLB")
+        self._posting_offsets = self._cast(b"POFF", 'Q')
+        self._postings = self._section(b"POST")
+        self._sentence_offsets = self._cast(b"SOFF", 'Q')
+        self._sentence_blob = self._section(b"SBLB")
+        self.word_counts = self._cast(b"WCNT", 'H')
+        self.level_counts = self._cast(b"LVLS", 'H')
+        self.non_jlpt_offsets = self._cast(b"XOFF", 'I')
+        self.non_jlpt_words = self._cast(b"XWRD", 'I')
+        self.sentence_hashes = self._cast(b"HASH", 'Q', array('Q'))
+        self._hash_sentence_ids = self._cast(b"HSID", 'I', array('I'))
+        self._book_offsets = self._cast(b"BOFF", 'Q', array('Q', [0]))
+        self._book_sentences = self._cast(b"BREF", 'I', array('I'))
+        self.has_bigrams = b"GKEY" in self.sections
+        self._derived_sentence_words = None
+        if b"WIDS" in self.sections:
+            self._sentence_word_offsets = self._cast(b"WOFF", 'Q')
+            self._sentence_words = self._cast(b"WIDS", 'I')
+        if self.has_bigrams:
+            self._gram_keys = self._cast(b"GKEY", 'Q')
+            self._gram_offsets = self._cast(b"GOFF", 'Q')
+            self._gram_postings = self._cast(b"GPST", 'I')
+
+    def __len__(self):
+        return self.sentence_count
+
+    def _word_bytes(self, word_id):
+        return self._word_blob[self._word_offsets[word_id]:self._word_offsets[word_id + 1]].tobytes()
+
+    def get_word(self, word_id):
+        return self._word_bytes(word_id).decode('utf-8')
+
+    def word_id(self, word):
+        """
+        Binary search over the sorted vocabulary.
+        :return: the ID of the word, None if it is not indexed
+        """
+        return find_key(self._word_blob, self._word_offsets, self.word_count, word.encode('utf-8'))
+
+    def get_posting(self, word_id):
+        start, end = self._posting_offsets[word_id], self._posting_offsets[word_id + 1]
+        posting = array('I')
+        posting.frombytes(self._postings[start * 4:end * 4])
+        return posting
+
+    def search(self, word):
+        """
+        :param word: dictionary form to look up
+        :return: sorted array of sentence IDs, None if the word is not indexed
+        """
+        word_id = self.word_id(word)
+        if word_id is None:
+            return None
+        return self.get_posting(word_id)
+
+    def get_sentence(self, sentence_id):
+        start, end = self._sentence_offsets[sentence_id], self._sentence_offsets[sentence_id + 1]
+        return self._sentence_blob[start:end].tobytes().decode('utf-8')
+
+    def get_sentences(self, sentence_ids):
+        return [self.get_sentence(sentence_id) for sentence_id in sentence_ids]
+
+    def get_word_count(self, sentence_id):
+        return self.word_counts[sentence_id]
+
+    def get_level_counts(self, sentence_id):
+        """
+        :return: the number of words in the sentence for N5, N4, N3, N2, N1 and outside the JLPT lists
+        """
+        base = sentence_id * LEVEL_BUCKETS
+        return self.level_counts[base:base + LEVEL_BUCKETS].tolist()
+
+    def get_non_jlpt_words(self, sentence_id):
+        start, end = self.non_jlpt_offsets[sentence_id], self.non_jlpt_offsets[sentence_id + 1]
+        return [self.get_word(word_id) for word_id in self.non_jlpt_words[start:end].tolist()]
+
+    def find_sentence(self, sentence, hash_value=None):
+        """
+        :param hash_value: sentence_hash(sentence), if it is already known
+        :return: the ID of the sentence in this file, None if it is not stored here
+        """
+        if hash_value is None:
+            hash_value = sentence_hash(sentence)
+        position = bisect.bisect_left(self.sentence_hashes, hash_value)
+        while position < len(self.sentence_hashes) and self.sentence_hashes[position] == hash_value:
+            sentence_id = self._hash_sentence_ids[position]
+            if self.get_sentence(sentence_id) == sentence:
+                return sentence_id
+            position += 1
+        return None
+
+    def sentence_words(self):
+        """
+        :return: (offsets of each sentence's block in the word IDs (sentence count + 1 entries), IDs of the distinct
+                 words of each sentence, one sorted block per sentence) as numpy arrays. Views of the file are only
+                 valid until it is closed
+        """
+        if b"WIDS" in self.sections:
+            return (np.frombuffer(self._sentence_word_offsets, dtype=np.uint64),
+                    np.frombuffer(self._sentence_words, dtype=np.uint32))
+        if self._derived_sentence_words is None:
+            # Written by an older version, so the words of each sentence are gathered from the postings once
+            self._derived_sentence_words = invert_postings(
+                np.frombuffer(self._posting_offsets, dtype=np.uint64).copy(),
+                np.frombuffer(self._postings, dtype=np.uint32).copy(), self.sentence_count)
+        return self._derived_sentence_words
+
+    def _gram_block(self, low, high):
+        """
+        :return: a copy of the postings of the bigrams with keys in [low, high), as one array sorted per bigram
+        """
+        start, end = bisect.bisect_left(self._gram_keys, low), bisect.bisect_left(self._gram_keys, high)
+        return np.frombuffer(self._gram_postings[self._gram_offsets[start]:self._gram_offsets[end]],
+                             dtype=np.uint32).copy()
+
+    def text_candidates(self, pattern):
+        """
+        Narrows a text search down with the bigram index, see text_search.
+        :param pattern: a text_search.Pattern
+        :return: sorted array of the IDs in this file of the sentences that may match, None if the file has no bigram
+                 index and every sentence has to be checked
+        """
+        if not self.has_bigrams:
+            return None
+        candidates = None
+        keys = pattern.bigram_keys()
+        for key in keys:
+            candidates = text_search.intersect(candidates, self._gram_block(key, key + 1))
+            if not len(candidates):
+                return candidates
+        if not keys:
+            # Every part of the pattern is a single character, found as the first character of any bigram
+            for character in pattern.single_characters():
+                block = self._gram_block(*text_search.key_range(character))
+                candidates = text_search.intersect(candidates, np.unique(block))
+                if not len(candidates):
+                    return candidates
+        return candidates
+
+    def get_book_sentences(self, name):
+        """
+        :return: sorted array of the global IDs of the book's sentences, None if the book is not listed in this file
+        """
+        position = self.books.get(name)
+        if position is None:
+            return None
+        start, end = self._book_offsets[position], self._book_offsets[position + 1]
+        sentences = array('I')
+        sentences.frombytes(self._book_sentences[start:end].tobytes())
+        return sentences
+
+    def lists_sentence(self, name, sentence_id):
+        """
+        :param sentence_id: global ID of a sentence
+        :return: whether this file lists the sentence as one of the book's
+        """
+        position = self.books.get(name)
+        if position is None:
+            return False
+        start, end = self._book_offsets[position], self._book_offsets[position + 1]
+        found = bisect.bisect_left(self._book_sentences, sentence_id, start, end)
+        return found < end and self._book_sentences[found] == sentence_id
+
+
+def read_text_index(path):
+    """
+    Parses the old book_dictionary.txt format, where each line is "word|" followed by the str() of a list of sentences.
+    :return: mapping of word to its list of sentences
+    """
+    dictionary = {}
+    with open(path, 'r', encoding='utf-8') as file:
+        for line in file:
+            word, separator, sentences = line.rstrip("\n").partition("|")
+            if not separator:
+                continue
+            try:
+                sentence_array = ast.literal_eval(sentences)
+            except (ValueError, SyntaxError):
+                # Fall back to the old best-effort split for lines that are not valid list literals
+                cleaned_part = sentences.replace("[", "").replace("]", "").replace("'", "").replace('"', '')
+                sentence_array = [s.strip() for s in cleaned_part.split(", ")] if cleaned_part else []
+            dictionary[word] = [s.strip() for s in sentence_array if s.strip()]
+    return dictionary
+
+
+def convert_text_index(text_path, index_path, level_table):
+    """
+    Converts an old book_dictionary.txt into the binary index format. The old format has no level counts, so each
+    sentence is tokenized again while it is converted.
+    :param level_table: mapping of dictionary form to JLPT level code, see list_management.get_level_table()
+    :return: the number of sentences and words written
+    """
+    store = SentenceStore()
+    breakdown = sudachipi.sentence_breakdown()
+    for sentences in read_text_index(text_path).values():
+        for sentence in sentences:
+            ingestion.index_sentence(store, breakdown, level_table, sentence)
+    store.finalise()
+    write_index(index_path, store)
+    return len(store), store.word_count
@@ -0,0 +1,228 @@
+import csv  # Added to handle TSV files properly
+import itertools
+import logging
+import os
+import re
+import sys
+import time
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, where peak memory is not reported
+    resource = None
+
+from Main.Model import metrics, sudachipi
+from Main.Model.sentence_store import NON_JLPT, SentenceStore
+
+"""
+    Reading and tokenizing books for the book index, either serially or split into chunks across a process pool.
+    Books are read in line-aligned chunks and only a few chunks are in flight at a time, so a corpus of any size can
+    be streamed into the index with bounded memory.
+"""
+
+logger = logging.getLogger(__name__)
+
+SENTENCES_INGESTED = metrics.counter("ingested_sentences_total", "Sentences read from books")
+BYTES_INGESTED = metrics.counter("ingested_bytes_total", "Bytes of books read")
+CHUNK_SECONDS = metrics.histogram("ingest_chunk_seconds", "Seconds spent tokenizing each chunk of a book")
+
+# Large files are split into chunks of roughly this many bytes so they can be shared between workers
+CHUNK_SIZE = 4 * 1024 * 1024
+
+
+def _iter_lines(file_path, start, end):
+    """
+    Yields decoded lines from a byte range of a file, with universal newlines like a file opened in text mode.
+    """
+    with open(file_path, 'rb') as file:
+        file.seek(start)
+        position = start
+        for raw_line in file:
+            if end is not None and position >= end:
+                break
+            position += len(raw_line)
+            line = raw_line.decode('utf-8')
+            if line.endswith('\r\n'):
+                line = line[:-2] + '\n'
+            yield line
+
+
+def iter_sentences(file_path, start=0, end=None):
+    """
+    Yields the raw sentences of a book (txt) or corpus (tsv), optionally restricted to a byte range.
+    :param file_path: the book to read
+    :param start: byte offset to start at, must be the start of a line
+    :param end: byte offset to stop at, must be the start of a line. None reads to the end of the file
+    """
+    lines = _iter_lines(file_path, start, end)
+
+    if file_path.endswith('.tsv'):
+        # Handle TSV files (Tatoeba format)
+        # Tatoeba format ID \t Language \t Sentence
+        reader = csv.reader(lines, delimiter='\t')
+        for row in reader:
+            if not row: continue
+
+            text = ""
+            if len(row) == 3 and row[1] == 'jpn':
+                text = row[2]
+            elif len(row) >= 2:
+                text = row[-1]
+
+            if text:
+                yield text
+    else:
+        # Handle standard Text files
+        for line in lines:
+            # Split by sentence delimiters
+            yield from re.split(r'(?<=[。！？])|\n', line)
+
+
+def index_sentence(store, breakdown, level_table, sentence):
+    """
+    Tokenizes a sentence and adds it to the store under each of its dictionary forms, along with the JLPT level of
+    each word so that searches can score the sentence without tokenizing it again.
+    :param store: the SentenceStore to add to
+    :param breakdown: the sentence_breakdown used to tokenize
+    :param level_table: mapping of dictionary form to JLPT level code, see list_management.get_level_table()
+    :return: the ID of the sentence in the store, None if it contained no words
+    """
+    sentence = sentence.replace("　", "").strip()
+    if not sentence:
+        return None
+
+    # uses sudachipi to break down the sentence into its component words
+    breakdown.set_sentence(sentence)
+    words = breakdown.get_all_dict_forms()
+    if not words:
+        return None
+    # The sentence is stored once; each word only records its ID
+    return store.add_sentence(sentence, words, [level_table.get(word, NON_JLPT) for word in words])
+
+
+def plan_chunks(file_path, chunk_size=CHUNK_SIZE, start=0):
+    """
+    Splits a file into byte ranges of roughly chunk_size that start and end on line boundaries.
+    :param start: byte offset to start at, must be the start of a line
+    :return: list of (start, end) offsets
+    """
+    size = os.path.getsize(file_path)
+    chunks = []
+    with open(file_path, 'rb') as file:
+        while start < size:
+            file.seek(min(start + chunk_size, size))
+            file.readline()
+            end = min(file.tell(), size)
+            chunks.append((start, end))
+            start = end
+    return chunks
+
+
+def _tokenize_chunk(file_path, start, end, level_table):
+    began = time.perf_counter()
+    store = SentenceStore()
+    breakdown = sudachipi.sentence_breakdown()
+    sentence_count = 0
+    for sentence in iter_sentences(file_path, start, end):
+        if index_sentence(store, breakdown, level_table, sentence) is not None:
+            sentence_count += 1
+    store.finalise()
+    return store, sentence_count, time.perf_counter() - began, os.getpid()
+
+
+def ingest_chunk(task):
+    """
+    Worker entry point. Tokenizes one chunk of a book into its own partial index, using the worker process's tokenizer.
+    :param task: (file_path, start, end)
+    :return: (partial SentenceStore, number of sentences read, seconds spent, worker pid)
+    """
+    file_path, start, end = task
+    return _tokenize_chunk(file_path, start, end, _worker_level_table)
+
+
+_worker_level_table = None
+
+
+def _initialise_worker(level_table):
+    global _worker_level_table
+    _worker_level_table = level_table
+    # Load the dictionary up front so the first chunk of each worker is not charged for it
+    sudachipi.sentence_breakdown().set_sentence("準備")
+
+
+def peak_memory():
+    """
+    :return: the peak resident set size of this process and of its finished worker processes in bytes, None where
+             it cannot be measured
+    """
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    unit = 1 if sys.platform == "darwin" else 1024
+    return max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss) * unit
+
+
+def iter_ingested_chunks(tasks, workers, level_table):
+    """
+    Tokenizes chunks into partial indexes, serially or across a process pool. At most two chunks per worker are in
+    flight, so partial indexes never pile up faster than the caller consumes them.
+    :param tasks: iterable of (file_path, start, end)
+    :param workers: number of worker processes, 1 tokenizes in this process
+    :param level_table: mapping of dictionary form to JLPT level code
+    :return: iterator of (task, (partial SentenceStore, sentences read, seconds spent, pid)) in task order
+    """
+    if workers <= 1:
+        for task in tasks:
+            yield task, _tokenize_chunk(*task, level_table)
+        return
+
+    tasks = iter(tasks)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_initialise_worker,
+                             initargs=(level_table,)) as executor:
+        pending = deque((task, executor.submit(ingest_chunk, task)) for task in itertools.islice(tasks, workers * 2))
+        while pending:
+            # Taking results in submission order keeps the merge deterministic
+            task, future = pending.popleft()
+            result = future.result()
+            for next_task in itertools.islice(tasks, 1):
+                pending.append((next_task, executor.submit(ingest_chunk, next_task)))
+            yield task, result
+
+
+class IngestReport:
+    """
+    Throughput of an ingestion run, per worker and overall.
+    """
+
+    def __init__(self):
+        self.workers = {}
+        self.sentences = 0
+        self.bytes = 0
+        self.elapsed = 0.0
+
+    def add(self, pid, sentence_count, seconds, byte_count=0):
+        sentences, busy = self.workers.get(pid, (0, 0.0))
+        self.workers[pid] = (sentences + sentence_count, busy + seconds)
+        self.sentences += sentence_count
+        self.bytes += byte_count
+        SENTENCES_INGESTED.inc(sentence_count)
+        BYTES_INGESTED.inc(byte_count)
+        CHUNK_SECONDS.observe(seconds)
+
+    def log_report(self):
+        for number, (pid, (sentences, busy)) in enumerate(sorted(self.workers.items()), start=1):
+            rate = sentences / busy if busy else 0.0
+            logger.info(f"  worker {number} (pid {pid}): {sentences} sentences in {busy:.1f}s, {rate:.1f} sentences/s")
+        rate = self.sentences / self.elapsed if self.elapsed else 0.0
+        byte_rate = self.bytes / self.elapsed / 1024 / 1024 if self.elapsed else 0.0
+        logger.info(f"  total: {self.sentences} sentences in {self.elapsed:.1f}s, {rate:.1f} sentences/s, "
+                    f"{byte_rate:.2f} MB/s")
+        peak = peak_memory()
+        if peak is not None:
+            logger.info(f"  peak memory: {peak / 1024 / 1024:.0f} MB")
+
@@ -0,0 +1,118 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+"""
+    Client for the Jisho.org word search API. Requests share one pooled session, are spread over a small thread pool
+    and pass through a token bucket so that a batch of lookups never exceeds the configured request rate.
+"""
+
+# Can be pointed at a local stand-in for jisho.org, e.g. Main/Benchmark/stub_jisho.py
+JISHO_API_URL = os.environ.get("JISHO_API_URL", "https://jisho.org/api/v1/search/words")
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+
+
+class JishoError(Exception):
+    pass
+
+
+class TokenBucket:
+    """
+    Allows bursts of up to `capacity` requests and `rate` requests per second on average.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, deadline=None):
+        """
+        Waits for a token.
+        :param deadline: time.monotonic() value after which to give up, None to wait as long as needed
+        :return: True if a token was taken, False if the deadline passed first
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait_time = (1 - self.tokens) / self.rate
+            if deadline is not None and now + wait_time > deadline:
+                return False
+            time.sleep(wait_time)
+
+
+def parse_definitions(data):
+    """
+    :param data: decoded JSON response of the word search API
+    :return: the English definitions of every sense of the first result, empty if there was no result
+    """
+    if not data.get("data"):
+        return []
+    senses = data["data"][0]["senses"]
+    definitions = [sense["english_definitions"] for sense in senses]
+    return [definition for sublist in definitions for definition in sublist]
+
+
+class JishoClient:
+    def __init__(self, api_url=None, rate=10.0, burst=5, max_workers=4, timeout=5.0):
+        """
+        :param api_url: word search endpoint, defaults to JISHO_API_URL
+        :param rate: maximum average number of requests per second
+        :param burst: number of requests that may be sent at once before the rate applies
+        :param max_workers: number of concurrent requests, also the size of the connection pool
+        :param timeout: timeout in seconds of a single request
+        """
+        self.api_url = api_url or JISHO_API_URL
+        self.timeout = timeout
+        self.bucket = TokenBucket(rate, burst)
+        self.session = requests.Session()
+        self.session.headers.update(HEADERS)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="jisho")
+
+    def fetch(self, word, deadline=None):
+        """
+        Looks up one word.
+        :param deadline: time.monotonic() value after which the request is not worth sending any more. A request that
+                         was sent in time is allowed to finish so its result can still be cached
+        :return: the word's flattened definitions, an empty list if Jisho has no entry for it
+        :raises JishoError: if the request failed or could not be sent before the deadline
+        """
+        if not self.bucket.acquire(deadline):
+            raise JishoError(f"rate limit budget exhausted for {word}")
+        try:
+            response = self.session.get(self.api_url, params={"keyword": word}, timeout=self.timeout)
+        except requests.RequestException as e:
+            raise JishoError(f"error fetching {word}: {e}") from e
+        if response.status_code != 200:
+            raise JishoError(f"Jisho API status {response.status_code} for: {word}")
+        try:
+            return parse_definitions(response.json())
+        except (ValueError, KeyError, IndexError, TypeError) as e:
+            raise JishoError(f"unexpected response for {word}: {e}") from e
+
+    def submit(self, function, *args):
+        """
+        Runs function(*args) on the client's thread pool, e.g. a lookup through fetch together with caching its result.
+        :return: the Future of the call
+        """
+        return self._executor.submit(function, *args)
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self.session.close()
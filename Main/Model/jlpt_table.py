@@ -0,0 +1,119 @@
+import logging
+import os
+import pickle
+from Main.Model.JLPT_N1 import JLPT_N1
+from Main.Model.JLPT_N2 import JLPT_N2
+from Main.Model.JLPT_N3 import JLPT_N3
+from Main.Model.JLPT_N4 import JLPT_N4
+from Main.Model.JLPT_N5 import JLPT_N5
+
+"""
+    A single compiled lookup of every JLPT word, replacing one probe per level list. Each word maps to its level code
+    (0 for N5 .. 4 for N1) and the index of its meaning. The compiled table can be saved as a prebuilt artifact so that
+    startup does not have to parse the JLPT_lists text files again.
+"""
+
+logger = logging.getLogger(__name__)
+
+LEVELS = ["N5", "N4", "N3", "N2", "N1"]
+ARTIFACT_VERSION = 1
+
+
+class JLPTTable:
+    def __init__(self, entries, meanings):
+        """
+        :param entries: mapping of word to (level code, meaning index)
+        :param meanings: list of meanings, addressed by meaning index
+        """
+        self.entries = entries
+        self.meanings = meanings
+        self.level_table = None
+
+    @classmethod
+    def from_lists(cls, level_lists):
+        """
+        Merges the parsed JLPT lists, easiest level first. A word on several lists keeps its easiest level and meaning.
+        :param level_lists: JLPT objects for N5, N4, N3, N2 and N1 with create_dic() already called
+        """
+        entries = {}
+        meanings = []
+        for level_code, level_list in enumerate(level_lists):
+            for word, meaning in level_list.word_list.items():
+                if word not in entries:
+                    entries[word] = (level_code, len(meanings))
+                    meanings.append(meaning)
+        return cls(entries, meanings)
+
+    def search(self, word):
+        """
+        :param word: the word to get the level of
+        :return: the word's meaning and level, None if it was not in a JLPT list
+        """
+        entry = self.entries.get(word)
+        if entry is None:
+            return None
+        return self.meanings[entry[1]], LEVELS[entry[0]]
+
+    def get_level_table(self):
+        """
+        :return: mapping of word to level code only, as used when indexing sentences
+        """
+        if self.level_table is None:
+            self.level_table = {word: entry[0] for word, entry in self.entries.items()}
+        return self.level_table
+
+
+def _create_level_lists():
+    return [JLPT_N5(), JLPT_N4(), JLPT_N3(), JLPT_N2(), JLPT_N1()]
+
+
+def _source_fingerprint(level_lists):
+    """
+    :return: the size and modification time of each source list, used to tell whether an artifact is stale
+    """
+    fingerprint = []
+    for level_list in level_lists:
+        stat = os.stat(level_list.directory)
+        fingerprint.append((os.path.basename(level_list.directory), stat.st_size, stat.st_mtime_ns))
+    return fingerprint
+
+
+def build_table():
+    """
+    Parses the JLPT_lists text files and compiles them into one table.
+    """
+    level_lists = _create_level_lists()
+    for level_list in level_lists:
+        level_list.create_dic()
+    return JLPTTable.from_lists(level_lists)
+
+
+def load_or_build(artifact_path):
+    """
+    Loads the prebuilt table if it is up to date with the JLPT_lists files, otherwise compiles and saves it.
+    :param artifact_path: where the prebuilt table is stored, None to always compile
+    """
+    if artifact_path is None:
+        return build_table()
+
+    fingerprint = _source_fingerprint(_create_level_lists())
+    if os.path.exists(artifact_path):
+        try:
+            with open(artifact_path, 'rb') as file:
+                artifact = pickle.load(file)
+            if artifact.get("version") == ARTIFACT_VERSION and artifact.get("sources") == fingerprint:
+                return JLPTTable(artifact["entries"], artifact["meanings"])
+        except Exception as e:
+            logger.warning(f"Error loading prebuilt JLPT table: {e}")
+
+    table = build_table()
+    try:
+        os.makedirs(os.path.dirname(artifact_path), exist_ok=True)
+        temp_path = artifact_path + ".tmp"
+        with open(temp_path, 'wb') as file:
+            pickle.dump({"version": ARTIFACT_VERSION, "sources": fingerprint, "entries": table.entries,
+                         "meanings": table.meanings}, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, artifact_path)
+    except OSError as e:
+        logger.warning(f"Error saving prebuilt JLPT table: {e}")
+    return table
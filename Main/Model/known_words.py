@@ -0,0 +1,166 @@
+import os
+import threading
+
+import numpy as np
+
+"""
+    The words a user already knows, used to find sentences with only one or a few unknown words ("i+1" sentences).
+
+    The words are saved as a text file with one dictionary form per line. For each segment of the book index they are
+    also held as a bitset over the segment's word IDs. The number of unknown words in every sentence of a segment is
+    then counted with a few vectorised operations over the word IDs stored per sentence (the WOFF and WIDS sections, see
+    index_format). Bitsets are updated in place as words are added or removed, and the counts are recounted when they
+    are next needed.
+"""
+
+
+def read_word_list(path):
+    """
+    Reads a word list: one word per line, or the first column of a tab-separated file such as a flashcard export.
+    Blank lines and lines starting with # are skipped.
+    :return: list of the words
+    """
+    words = []
+    with open(path, 'r', encoding='utf-8-sig') as file:
+        for line in file:
+            word = line.split("\t", 1)[0].strip()
+            if word and not word.startswith("#"):
+                words.append(word)
+    return words
+
+
+def _masks(word_ids):
+    """
+    :return: the byte of each word's bit in a bitset, and the bit within it
+    """
+    return word_ids >> 3, (np.uint8(0x80) >> (word_ids & 7).astype(np.uint8)).astype(np.uint8)
+
+
+class _SegmentState:
+    def __init__(self, segment, bits):
+        self.segment = segment
+        # One bit per word ID of the segment, set for the known words
+        self.bits = bits
+        # Number of unknown words of each sentence, None until they are counted
+        self.counts = None
+
+
+class KnownWords:
+    def __init__(self, path):
+        """
+        :param path: the word list the known words are loaded from and saved to
+        """
+        self.path = path
+        self.words = set(read_word_list(path)) if os.path.exists(path) else set()
+        # Incremented whenever the known words change, e.g. to cache results by
+        self.version = 0
+        self._lock = threading.RLock()
+        # Segment file path -> _SegmentState
+        self._segments = {}
+
+    def __len__(self):
+        return len(self.words)
+
+    def __contains__(self, word):
+        return word in self.words
+
+    def save(self):
+        """
+        Writes the word list next to the target and moves it into place.
+        """
+        with self._lock:
+            words = sorted(self.words)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temp_path = self.path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            file.writelines(word + "\n" for word in words)
+        os.replace(temp_path, self.path)
+
+    def add(self, words):
+        """
+        :return: the number of words that were not known yet
+        """
+        with self._lock:
+            new_words = {word.strip() for word in words if word.strip()} - self.words
+            if new_words:
+                self.words |= new_words
+                self._update(new_words, True)
+                self.save()
+            return len(new_words)
+
+    def remove(self, words):
+        """
+        :return: the number of words that were known
+        """
+        with self._lock:
+            removed = {word.strip() for word in words} & self.words
+            if removed:
+                self.words -= removed
+                self._update(removed, False)
+                self.save()
+            return len(removed)
+
+    def import_file(self, path):
+        """
+        Adds every word of a word list, see read_word_list.
+        :return: the number of words that were not known yet
+        """
+        return self.add(read_word_list(path))
+
+    def _word_ids(self, segment, words):
+        word_ids = [segment.word_id(word) for word in words]
+        return np.array([word_id for word_id in word_ids if word_id is not None], dtype=np.uint32)
+
+    def _update(self, words, known):
+        self.version += 1
+        for state in self._segments.values():
+            positions, masks = _masks(self._word_ids(state.segment, words))
+            if known:
+                np.bitwise_or.at(state.bits, positions, masks)
+            else:
+                np.bitwise_and.at(state.bits, positions, ~masks)
+            state.counts = None
+
+    def _state(self, segment):
+        state = self._segments.get(segment.path)
+        if state is None or state.segment is not segment:
+            bits = np.zeros((segment.word_count + 7) // 8, dtype=np.uint8)
+            positions, masks = _masks(self._word_ids(segment, self.words))
+            np.bitwise_or.at(bits, positions, masks)
+            state = self._segments[segment.path] = _SegmentState(segment, bits)
+        return state
+
+    def _is_known(self, state, word_ids):
+        positions, masks = _masks(word_ids)
+        return (state.bits[positions] & masks) != 0
+
+    def unknown_counts(self, index):
+        """
+        :param index: a SegmentedIndex
+        :return: for each segment of the index, an array of the number of unknown words in each of its sentences
+        """
+        with self._lock:
+            # Segments merged away by a compaction are let go
+            paths = {segment.path for segment in index.segments}
+            self._segments = {path: state for path, state in self._segments.items() if path in paths}
+            counts = []
+            for segment in index.segments:
+                state = self._state(segment)
+                if state.counts is None:
+                    offsets, word_ids = segment.sentence_words()
+                    unknown = np.zeros(len(word_ids) + 1, dtype=np.int64)
+                    np.cumsum(~self._is_known(state, word_ids), out=unknown[1:])
+                    state.counts = (unknown[offsets[1:]] - unknown[offsets[:-1]]).astype(np.uint16)
+                counts.append(state.counts)
+            return counts
+
+    def unknown_words(self, index, sentence_id):
+        """
+        :return: the words of a sentence that are not known, in the order of their IDs
+        """
+        segment, local_id = index.locate(sentence_id)
+        offsets, word_ids = segment.sentence_words()
+        sentence_words = word_ids[offsets[local_id]:offsets[local_id + 1]].copy()
+        with self._lock:
+            known = self._is_known(self._state(segment), sentence_words)
+        return [segment.get_word(int(word_id)) for word_id in sentence_words[~known]]
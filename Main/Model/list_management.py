@@ -1,91 +1,96 @@
-import time
-import requests
-import json
+import logging
 import os
-from Main.Model.JLPT_N1 import JLPT_N1
-from Main.Model.JLPT_N2 import JLPT_N2
-from Main.Model.JLPT_N3 import JLPT_N3
-from Main.Model.JLPT_N4 import JLPT_N4
-from Main.Model.JLPT_N5 import JLPT_N5
-from Main.Model.sudachipi import sentence_breakdown
+from Main.Model import jlpt_table, metrics, offline_dictionary, ranking
+from Main.Model import sudachipi
+from Main.Model.definition_cache import DefinitionCache
+from Main.Model.definition_provider import DefinitionProvider
+from Main.Model.jisho_client import JishoClient
 
 """
-    This class is used to manage the lists of words for each JLPT level. It is used to search for words in the lists and to calculate the JLPT score of a sentence.
+    This class is used to manage the lists of words for each JLPT level. It is used to search for words in the lists and to find the words of a sentence above a level.
 """
 
+logger = logging.getLogger(__name__)
+
 
 class list_management:
-    def __init__(self):
-        self.N5 = None
-        self.N4 = None
-        self.N3 = None
-        self.N2 = None
-        self.N1 = None
+    def __init__(self, use_prebuilt_table=True, jisho_client=None, jisho_fallback=True, dictionary_directory=None):
+        """
+        :param use_prebuilt_table: load the compiled JLPT table from dictionary_files instead of parsing JLPT_lists
+        :param jisho_client: client used for definitions of non-JLPT words, a default JishoClient if None
+        :param jisho_fallback: look words up on Jisho when they are not in the offline dictionary. Without an offline
+                               dictionary every uncached word is looked up on Jisho regardless
+        :param dictionary_directory: directory of the JLPT table, the definition caches and the offline dictionary,
+                                     dictionary_files if None
+        """
+        self.word_table = None
         self.user_level = None
-        self.sentence_breakdown = sentence_breakdown()
         self.score_distribution = None
         self.levels = ["N5", "N4", "N3", "N2", "N1"]
 
         # Define the path for the persistent cache file
         self.script_dir = os.path.dirname(os.path.abspath(__file__))
-        self.cache_file_path = os.path.join(self.script_dir, '../../dictionary_files/jisho_cache.json')
+        self.dictionary_directory = dictionary_directory or os.path.join(self.script_dir, '../../dictionary_files')
+        self.word_table_path = None
+        if use_prebuilt_table:
+            self.word_table_path = os.path.join(self.dictionary_directory, 'jlpt_table.pickle')
+        self.cache_file_path = os.path.join(self.dictionary_directory, 'jisho_cache.sqlite3')
+        # JSON cache written by older versions, imported into the database once
+        self.legacy_cache_file_path = os.path.join(self.dictionary_directory, 'jisho_cache.json')
+        # Created by Main/import_dictionary.py from a JMdict file
+        self.offline_dictionary_path = os.path.join(self.dictionary_directory, 'jmdict.bin')
 
         # Initialize cache from file
-        self.jisho_cache = {}
+        self.jisho_cache = None
         self.load_cache()
+        self.jisho_client = jisho_client or JishoClient()
+        self.offline_dictionary = offline_dictionary.open_dictionary(self.offline_dictionary_path)
+        if self.offline_dictionary is not None:
+            logger.info(f"Loaded {len(self.offline_dictionary)} headwords from the offline dictionary.")
+        # Shared with WordSearch so every definition lookup goes through the same caches
+        self.definitions = DefinitionProvider(self.jisho_cache, self.jisho_client, dictionary=self.offline_dictionary,
+                                              network_fallback=jisho_fallback or self.offline_dictionary is None)
 
     def set_user_level(self, level):
-        self.user_level = level
-        if self.user_level == "N5":
-            self.score_distribution = [5, -1, -2, -3, -4]
-        elif self.user_level == "N4":
-            self.score_distribution = [4, 5, -1, -2, -3]
-        elif self.user_level == "N3":
-            self.score_distribution = [3, 4, 5, -1, -2]
-        elif self.user_level == "N2":
-            self.score_distribution = [2, 3, 4, 5, -1]
-        elif self.user_level == "N1":
-            self.score_distribution = [1, 2, 3, 4, 5]
+        """
+        Records a default level. Searches take their level as an argument instead, see ranking.score_distribution, so
+        nothing shared changes while the server answers requests for different levels.
+        """
+        if level in ranking.SCORE_DISTRIBUTIONS:
+            self.user_level = level
+            self.score_distribution = list(ranking.score_distribution(level))
 
     def initialise(self):
-        self.N5 = JLPT_N5()
-        self.N5.create_dic()
-
-        self.N4 = JLPT_N4()
-        self.N4.create_dic()
-
-        self.N3 = JLPT_N3()
-        self.N3.create_dic()
-
-        self.N2 = JLPT_N2()
-        self.N2.create_dic()
-
-        self.N1 = JLPT_N1()
-        self.N1.create_dic()
+        """
+        Loads the merged word to level table, rebuilding it from the JLPT_lists files if they have changed.
+        """
+        self.word_table = jlpt_table.load_or_build(self.word_table_path)
         return
 
+    def get_level_table(self):
+        """
+        :return: mapping of every JLPT word to the index of its level in self.levels (0 for N5 .. 4 for N1)
+        """
+        return self.word_table.get_level_table()
+
     def load_cache(self):
-        """Loads the cache from the JSON file if it exists."""
-        if os.path.exists(self.cache_file_path):
-            try:
-                with open(self.cache_file_path, 'r', encoding='utf-8') as f:
-                    self.jisho_cache = json.load(f)
-                print(f"Loaded {len(self.jisho_cache)} words from Jisho cache.")
-            except Exception as e:
-                print(f"Error loading cache: {e}")
-                self.jisho_cache = {}
-        else:
-            print("No existing cache found. Creating a new one.")
-            self.jisho_cache = {}
+        """Opens the definition cache database, importing the old JSON cache if there is one."""
+        self.jisho_cache = DefinitionCache(self.cache_file_path)
+        try:
+            migrated = self.jisho_cache.migrate_json(self.legacy_cache_file_path)
+            if migrated:
+                logger.info(f"Imported {migrated} words from jisho_cache.json.")
+        except Exception as e:
+            logger.warning(f"Error importing JSON cache: {e}")
+        self.jisho_cache.prune()
+        logger.info(f"Loaded {len(self.jisho_cache)} words from Jisho cache.")
 
     def save_cache(self):
-        """Saves the current cache to the JSON file."""
+        """Writes any buffered cache entries to the database."""
         try:
-            os.makedirs(os.path.dirname(self.cache_file_path), exist_ok=True)
-            with open(self.cache_file_path, 'w', encoding='utf-8') as f:
-                json.dump(self.jisho_cache, f, ensure_ascii=False, indent=2)
+            self.jisho_cache.flush()
         except Exception as e:
-            print(f"Error saving cache: {e}")
+            logger.error(f"Error saving cache: {e}")
 
     def search_lists(self, word):
         """
@@ -93,107 +98,35 @@ class list_management:
         :param word: the word to get the level of
         :return: the word and its level. none if it was not in a JLPT list
         """
-        result = self.N5.search_dic(word)
-        if result != None: return result, "N5"
-
-        result = self.N4.search_dic(word)
-        if result != None: return result, "N4"
-
-        result = self.N3.search_dic(word)
-        if result != None: return result, "N3"
-
-        result = self.N2.search_dic(word)
-        if result != None: return result, "N2"
-
-        result = self.N1.search_dic(word)
-        if result != None: return result, "N1"
-
-        return None
+        # One probe of the merged table, which already resolves words on several lists to their easiest level
+        return self.word_table.search(word)
 
     def get_jisho_definition(self, word):
         """
-        Fetches definition from Jisho for non-JLPT words.
-        Checks persistent cache first, then fetches and saves if not found.
+        Defines a non-JLPT word from the offline dictionary, falling back to the cache and then Jisho.
         """
-        print(f"looking for: {word}")
-
-        if word in self.jisho_cache:
-            print(f"Hit cache for: {word}")
-            if self.jisho_cache[word] == "NOT_FOUND":
-                return None
-            return self.jisho_cache[word]
-
-        url = f"https://jisho.org/api/v1/search/words?keyword={word}"
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-
-        try:
-            time.sleep(0.1)
-            response = requests.get(url, headers=headers, timeout=5)
-
-            if response.status_code != 200:
-                print(f"Jisho API status {response.status_code} for: {word}")
-                return None
-
-            data = response.json()
+        definitions = self.definitions.get_definitions(word)
+        return "; ".join(definitions[:2]) if definitions else None
 
-            if data.get("data"):
-                senses = data["data"][0]["senses"]
-                definitions = [sense["english_definitions"] for sense in senses]
-                flat_definitions = [definition for sublist in definitions for definition in sublist]
-
-                if flat_definitions:
-                    final_def = "; ".join(flat_definitions[:2])
-                    self.jisho_cache[word] = final_def
-                    self.save_cache()
-                    print(final_def)
-                    return final_def
-
-        except Exception as e:
-            print(f"Error fetching {word}: {e}")
-
-        print(f"No definition found for '{word}', caching as NOT_FOUND.")
-        self.jisho_cache[word] = "NOT_FOUND"
-        self.save_cache()
-
-        return None
-
-    def calculate_JLPT_score(self, sentence):
+    def get_jisho_definitions(self, words, budget=None):
         """
-        Calculates the JLPT score of a sentence.
+        Batch version of get_jisho_definition. All cache misses are fetched concurrently and the call returns once they
+        have finished or the latency budget has run out. Lookups still running then are cached when they complete.
+        :param words: words to define
+        :param budget: seconds to wait for cache misses, DefinitionProvider.DEFAULT_BUDGET if None
+        :return: mapping of word to definition for every word defined in time. Words Jisho has no entry for map to None
         """
-        JLPT_distribution = [0, 0, 0, 0, 0]
-        non_JLPT_words = []
-        self.sentence_breakdown.set_sentence(sentence)
-        word_list = self.sentence_breakdown.get_all_dict_forms()
-        for word in word_list:
-            result = self.search_lists(word)
-            if result == None:
-                non_JLPT_words.append(word)
-            elif result[1] == "N5":
-                JLPT_distribution[0] += 1
-            elif result[1] == "N4":
-                JLPT_distribution[1] += 1
-            elif result[1] == "N3":
-                JLPT_distribution[2] += 1
-            elif result[1] == "N2":
-                JLPT_distribution[3] += 1
-            elif result[1] == "N1":
-                JLPT_distribution[4] += 1
-
-        if len(word_list) > 0:
-            for i in range(5):
-                JLPT_distribution[i] = JLPT_distribution[i] / len(word_list)
-
-        return JLPT_distribution, non_JLPT_words, len(word_list)
-
-    def get_difficult_words(self, sentence, user_level):
+        return {word: "; ".join(definitions[:2]) if definitions else None
+                for word, definitions in self.definitions.get_many(words, budget).items()}
+
+    def get_difficult_words(self, sentence, user_level, unresolved=None):
         """
         Identifies words in the sentence that are strictly above the user's JLPT level.
         Returns a list of tuples: (word, level, meaning)
+        :param unresolved: optional set the words outside the JLPT lists are added to whose definitions could not be
+                           looked up in time. They are left out of the list, though they may be difficult
         """
-        print(sentence)
+        logger.debug("Finding difficult words in %s", sentence)
         try:
             user_idx = self.levels.index(user_level)
         except ValueError:
@@ -202,14 +135,23 @@ class list_management:
         difficult_words = []
         seen_words = set()
 
-        self.sentence_breakdown.set_sentence(sentence)
-        word_list = self.sentence_breakdown.get_all_dict_forms()
+        with metrics.stage("enrichment"):
+            # Cached, so a sentence analysed before is not tokenized again
+            word_list = sudachipi.get_dict_forms(sentence)
+            jlpt_results = {word: self.search_lists(word) for word in word_list}
+
+        # Words NOT in local JLPT lists are defined offline, with any misses looked up on Jisho in one concurrent batch
+        with metrics.stage("definition_fetch"):
+            outside_words = [word for word, result in jlpt_results.items() if result is None]
+            outside_definitions = self.get_jisho_definitions(outside_words)
+        if unresolved is not None:
+            unresolved.update(word for word in outside_words if word not in outside_definitions)
 
         for word in word_list:
             if word in seen_words:
                 continue
 
-            result = self.search_lists(word)
+            result = jlpt_results[word]
 
             if result:
                 meaning, word_level = result
@@ -222,7 +164,7 @@ class list_management:
                     pass
             else:
                 # Word is NOT in local JLPT lists
-                definition = self.get_jisho_definition(word)
+                definition = outside_definitions.get(word)
                 if definition:
                     difficult_words.append((word, "Outside JLPT", definition))
                     seen_words.add(word)
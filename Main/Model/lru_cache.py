@@ -0,0 +1,165 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import CancelledError, Future
+
+"""
+    A small thread-safe LRU cache with a size bound, an optional time-to-live and hit, miss and eviction counters.
+    Concurrent misses of the same key are computed once (single-flight): the first caller computes the value and the
+    others wait for it.
+"""
+
+
+class Reservation:
+    """
+    The right to compute a missing value, see LRUCache.reserve. Finish it with complete() or abandon().
+    """
+
+    def __init__(self, cache, key, future):
+        self.cache = cache
+        self.key = key
+        self._future = future
+
+    def complete(self, value, ttl=None):
+        """
+        Caches the value and hands it to the callers waiting for it.
+        :param ttl: seconds the value stays cached, the ttl of the cache if None
+        """
+        self.cache.put(self.key, value, ttl)
+        if self._future is not None:
+            self.cache._release(self.key)
+            self._future.set_result(value)
+
+    def abandon(self):
+        """
+        Gives up computing the value, e.g. after an error. Waiting callers then compute it themselves.
+        """
+        if self._future is not None:
+            self.cache._release(self.key)
+            self._future.cancel()
+
+
+class LRUCache:
+    def __init__(self, max_size, ttl=None):
+        """
+        :param max_size: maximum number of entries kept, 0 disables caching
+        :param ttl: seconds an entry stays valid, None to keep entries until they are evicted
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._entries = OrderedDict()
+        # key -> Future of a value being computed, see reserve
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._entries:
+                value, expires = self._entries[key]
+                if expires is None or time.monotonic() < expires:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+                self.expirations += 1
+            self.misses += 1
+            return default
+
+    def put(self, key, value, ttl=None):
+        """
+        :param ttl: seconds this entry stays valid, the ttl of the cache if None
+        """
+        ttl = self.ttl if ttl is None else ttl
+        with self._lock:
+            if self.max_size <= 0:
+                return
+            self._entries[key] = (value, None if ttl is None else time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_compute(self, key, compute, ttl_of=None):
+        """
+        Returns the cached value for key, calling compute(key) and caching its result on a miss. A caller missing a key
+        that is already being computed waits for that value instead.
+        :param ttl_of: optional function of a computed value returning the seconds it stays cached, None for the ttl
+                       of the cache
+        """
+        missing = object()
+        while True:
+            value = self.get(key, missing)
+            if value is not missing:
+                return value
+            with self._lock:
+                future = self._in_flight.get(key)
+            if future is None:
+                reservation = self.reserve(key)
+                if reservation is None:
+                    # Another caller started computing it in the meantime
+                    continue
+                try:
+                    value = compute(key)
+                except BaseException:
+                    reservation.abandon()
+                    raise
+                reservation.complete(value, None if ttl_of is None else ttl_of(value))
+                return value
+            try:
+                return future.result()
+            except CancelledError:
+                # The computing caller gave up, so this one tries again
+                continue
+
+    def reserve(self, key):
+        """
+        Claims the computation of a missing value, for callers that build it step by step instead of through
+        get_or_compute, e.g. while streaming it. Other callers of get_or_compute wait for it meanwhile. With caching
+        disabled every caller computes the value itself.
+        :return: a Reservation, None if another caller is computing the value already
+        """
+        with self._lock:
+            if self.max_size <= 0:
+                return Reservation(self, key, None)
+            if key in self._in_flight:
+                return None
+            future = self._in_flight[key] = Future()
+        return Reservation(self, key, future)
+
+    def _release(self, key):
+        with self._lock:
+            self._in_flight.pop(key, None)
+
+    def resize(self, max_size):
+        with self._lock:
+            self.max_size = max_size
+            while len(self._entries) > max(max_size, 0):
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """
+        :return: the counters of the cache as a dictionary
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,201 @@
+import gzip
+import json
+import logging
+import sys
+import xml.etree.ElementTree as ElementTree
+from array import array
+
+from Main.Model.index_format import IndexFormatError, SectionFile, find_key, write_sections
+
+"""
+    Offline English definitions imported from a JMdict file, so that defining a word does not need jisho.org.
+
+    Both the JMdict XML release (JMdict_e.xml, optionally gzipped) and the JSON release of jmdict-simplified are
+    understood. The import is compiled into the sectioned format of index_format and memory-mapped, so opening the
+    dictionary costs nothing and a lookup is a binary search over the headwords:
+
+        META  JSON with the headword and entry counts and the byte order the arrays were written in
+        KOFF  uint64 offsets of each headword in KBLB (headword count + 1 entries)
+        KBLB  UTF-8 headwords, kanji and kana writings alike, sorted
+        HOFF  uint32 offsets of each headword's entries in HENT (headword count + 1 entries)
+        HENT  uint32 entry IDs, entries listing the headword as a kanji writing first, then in file order
+        EOFF  uint64 offsets of each entry's definitions in EBLB (entry count + 1 entries)
+        EBLB  UTF-8 definitions of each entry, separated by DEFINITION_SEPARATOR
+"""
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"JTPDICT\0"
+VERSION = 1
+DEFINITION_SEPARATOR = "\x1f"
+
+
+def _open(path):
+    if path.endswith(".gz"):
+        return gzip.open(path, 'rb')
+    return open(path, 'rb')
+
+
+def parse_jmdict_xml(path):
+    """
+    Streams the entries of a JMdict XML file.
+    :return: iterator of (kanji writings, kana writings, English glosses) per entry
+    """
+    with _open(path) as file:
+        for _, element in ElementTree.iterparse(file):
+            if element.tag != "entry":
+                continue
+            kanji = [keb.text for keb in element.iterfind("k_ele/keb") if keb.text]
+            kana = [reb.text for reb in element.iterfind("r_ele/reb") if reb.text]
+            glosses = []
+            for gloss in element.iterfind("sense/gloss"):
+                # Multilingual releases tag every non-English gloss with xml:lang
+                if gloss.text and gloss.get("{http://www.w3.org/XML/1998/namespace}lang", "eng") == "eng":
+                    glosses.append(gloss.text)
+            element.clear()
+            yield kanji, kana, glosses
+
+
+def parse_jmdict_json(path):
+    """
+    Reads the entries of a jmdict-simplified JSON file.
+    :return: iterator of (kanji writings, kana writings, English glosses) per entry
+    """
+    with _open(path) as file:
+        data = json.load(file)
+    for word in data["words"]:
+        kanji = [item["text"] for item in word.get("kanji", [])]
+        kana = [item["text"] for item in word.get("kana", [])]
+        glosses = [gloss["text"] for sense in word.get("sense", []) for gloss in sense.get("gloss", [])
+                   if gloss.get("lang", "eng") == "eng"]
+        yield kanji, kana, glosses
+
+
+def parse_jmdict(path):
+    """
+    :return: the entries of a JMdict file, see parse_jmdict_xml(). The format is picked from the file name
+    """
+    name = path[:-3] if path.endswith(".gz") else path
+    if name.endswith(".json"):
+        return parse_jmdict_json(path)
+    return parse_jmdict_xml(path)
+
+
+def build_dictionary(path, entries):
+    """
+    Compiles dictionary entries into an offline dictionary file.
+    :param path: destination file
+    :param entries: iterable of (kanji writings, kana writings, English glosses), see parse_jmdict()
+    :return: the number of headwords and entries written
+    """
+    headwords = {}
+    encoded_entries = []
+    for kanji, kana, glosses in entries:
+        if not glosses:
+            continue
+        entry_id = len(encoded_entries)
+        encoded_entries.append(DEFINITION_SEPARATOR.join(glosses).encode('utf-8'))
+        for priority, writings in enumerate((kanji, kana)):
+            for writing in writings:
+                headwords.setdefault(writing, []).append((priority, entry_id))
+
+    encoded_headwords = sorted(headword.encode('utf-8') for headword in headwords)
+    headword_offsets = array('Q', [0])
+    entry_lists = array('I', [0])
+    headword_entries = array('I')
+    for encoded in encoded_headwords:
+        headword_offsets.append(headword_offsets[-1] + len(encoded))
+        # Stable sort keeps the file order, which JMdict gives roughly by how common an entry is
+        headword_entries.extend(dict.fromkeys(entry_id for _, entry_id in
+                                              sorted(headwords[encoded.decode('utf-8')], key=lambda item: item[0])))
+        entry_lists.append(len(headword_entries))
+
+    entry_offsets = array('Q', [0])
+    for encoded in encoded_entries:
+        entry_offsets.append(entry_offsets[-1] + len(encoded))
+
+    meta = {"headwords": len(encoded_headwords), "entries": len(encoded_entries), "byteorder": sys.byteorder}
+    write_sections(path, MAGIC, VERSION, [
+        (b"META", json.dumps(meta).encode('utf-8')),
+        (b"KOFF", headword_offsets.tobytes()),
+        (b"KBLB", b"".join(encoded_headwords)),
+        (b"HOFF", entry_lists.tobytes()),
+        (b"HENT", headword_entries.tobytes()),
+        (b"EOFF", entry_offsets.tobytes()),
+        (b"EBLB", b"".join(encoded_entries)),
+    ])
+    return len(encoded_headwords), len(encoded_entries)
+
+
+def import_jmdict(source_path, path):
+    """
+    Imports a JMdict XML or JSON file as an offline dictionary.
+    :return: the number of headwords and entries written
+    """
+    return build_dictionary(path, parse_jmdict(source_path))
+
+
+class OfflineDictionary(SectionFile):
+    """
+    Read-only view of a dictionary written by build_dictionary().
+    """
+    MAGIC = MAGIC
+    VERSION = VERSION
+    KIND = "offline dictionary"
+
+    def _read_sections(self):
+        self.headword_count = self.meta["headwords"]
+        self.entry_count = self.meta["entries"]
+        self._headword_offsets = self._cast(b"KOFF", 'Q')
+        self._headword_blob = self._section(b"KBLB")
+        self._entry_lists = self._cast(b"HOFF", 'I')
+        self._headword_entries = self._cast(b"HENT", 'I')
+        self._entry_offsets = self._cast(b"EOFF", 'Q')
+        self._entry_blob = self._section(b"EBLB")
+
+    def __len__(self):
+        return self.headword_count
+
+    def get_headword(self, headword_id):
+        start, end = self._headword_offsets[headword_id], self._headword_offsets[headword_id + 1]
+        return self._headword_blob[start:end].tobytes().decode('utf-8')
+
+    def _entries(self, word):
+        headword_id = find_key(self._headword_blob, self._headword_offsets, self.headword_count, word.encode('utf-8'))
+        if headword_id is None:
+            return []
+        return self._headword_entries[self._entry_lists[headword_id]:self._entry_lists[headword_id + 1]].tolist()
+
+    def _definitions(self, entry_id):
+        start, end = self._entry_offsets[entry_id], self._entry_offsets[entry_id + 1]
+        return self._entry_blob[start:end].tobytes().decode('utf-8').split(DEFINITION_SEPARATOR)
+
+    def lookup(self, word):
+        """
+        Defines a word the way the Jisho API does, by the definitions of its best matching entry.
+        :param word: a kanji or kana writing
+        :return: list of definitions, None if the word is not in the dictionary
+        """
+        entries = self._entries(word)
+        if not entries:
+            return None
+        return self._definitions(entries[0])
+
+    def lookup_all(self, word):
+        """
+        :return: the definitions of every entry with the word as a headword, best match first
+        """
+        return [self._definitions(entry_id) for entry_id in self._entries(word)]
+
+
+def open_dictionary(path):
+    """
+    :return: the OfflineDictionary at path, None if there is none or it cannot be read
+    """
+    try:
+        return OfflineDictionary(path)
+    except FileNotFoundError:
+        return None
+    except IndexFormatError as e:
+        logger.warning(f"Error opening offline dictionary: {e}")
+        return None
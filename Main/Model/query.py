@@ -0,0 +1,202 @@
+import re
+
+import numpy as np
+
+"""
+    Boolean queries over the inverted index, e.g. "彼女 結婚する" for the sentences using both words.
+
+    Words are dictionary forms. Words next to each other must all be in a sentence (AND may be written out), OR between
+    them accepts any of them and NOT or a leading - excludes a word. OR binds more loosely than AND, and parentheses
+    group: "猫 (見る OR 聞く) -犬". Excluded words only narrow down the words they are combined with by AND, so a query
+    always needs a word to include.
+
+    Posting lists are sorted sentence IDs. AND intersects them rarest first, so the candidates only ever shrink: every
+    candidate is searched for in the next list, within the window of it between the first and last candidate (a
+    galloping search, done as one vectorised binary search). Lists of similar length are merged instead.
+"""
+
+OR = {"OR", "|"}
+AND = {"AND", "&"}
+NOT = {"NOT", "-"}
+# A list this many times longer than the candidates is searched rather than merged. Below it, the random accesses of
+# searching cost more than sorting both lists together
+GALLOP_RATIO = 12
+
+# Parentheses, a - directly before one, and runs of anything else up to whitespace
+_TOKEN = re.compile(r"-(?=\()|[()]|[^\s()]+")
+
+
+def _empty():
+    return np.empty(0, dtype=np.uint32)
+
+
+def intersect(candidates, posting):
+    """
+    :param candidates: sorted unique sentence IDs, usually the shorter list
+    :param posting: sorted unique sentence IDs
+    :return: the IDs in both, sorted
+    """
+    if not len(candidates) or not len(posting):
+        return _empty()
+    # Only the part of the posting list between the first and the last candidate can hold any of them
+    window = posting[posting.searchsorted(candidates[0]):posting.searchsorted(candidates[-1], 'right')]
+    if len(window) < GALLOP_RATIO * len(candidates):
+        return np.intersect1d(candidates, window, assume_unique=True)
+    return candidates[contains(window, candidates)]
+
+
+def contains(posting, sentence_ids):
+    """
+    :return: boolean array of whether each of the sentence IDs is in the sorted posting list
+    """
+    if not len(posting):
+        return np.zeros(len(sentence_ids), dtype=bool)
+    return posting.take(posting.searchsorted(sentence_ids), mode='clip') == sentence_ids
+
+
+class Query:
+    """
+    A parsed query. Nodes are ("word", word), ("and", [nodes]), ("or", [nodes]) and ("not", node).
+    """
+
+    def __init__(self, text):
+        """
+        :raises ValueError: if the query is empty, malformed or has no word to include
+        """
+        self.text = text
+        self._tokens = _TOKEN.findall(text)
+        self._position = 0
+        if not self._tokens:
+            raise ValueError("The query is empty")
+        self.root = self._parse_or()
+        if self._position < len(self._tokens):
+            raise ValueError(f"Unexpected {self._tokens[self._position]!r} in the query")
+        self._check(self.root)
+
+    def _peek(self):
+        return self._tokens[self._position] if self._position < len(self._tokens) else None
+
+    def _next(self):
+        token = self._peek()
+        if token is None:
+            raise ValueError("The query ends too early")
+        self._position += 1
+        return token
+
+    def _parse_or(self):
+        children = [self._parse_and()]
+        while self._peek() in OR:
+            self._next()
+            children.append(self._parse_and())
+        return children[0] if len(children) == 1 else ("or", children)
+
+    def _parse_and(self):
+        children = [self._parse_unary()]
+        while self._peek() is not None and self._peek() != ")" and self._peek() not in OR:
+            if self._peek() in AND:
+                self._next()
+            children.append(self._parse_unary())
+        return children[0] if len(children) == 1 else ("and", children)
+
+    def _parse_unary(self):
+        token = self._next()
+        if token in NOT:
+            return ("not", self._parse_unary())
+        if token == "(":
+            node = self._parse_or()
+            if self._peek() != ")":
+                raise ValueError("A parenthesis is not closed in the query")
+            self._next()
+            return node
+        if token == ")" or token in OR or token in AND:
+            raise ValueError(f"Unexpected {token!r} in the query")
+        if token.startswith("-") and len(token) > 1:
+            return ("not", ("word", token[1:]))
+        return ("word", token)
+
+    def _check(self, node):
+        """
+        Rejects excluded words that have nothing to be excluded from.
+        """
+        kind = node[0]
+        if kind == "not":
+            raise ValueError("The query only excludes words; add a word to include")
+        if kind == "and":
+            if all(child[0] == "not" for child in node[1]):
+                raise ValueError("The query only excludes words; add a word to include")
+            for child in node[1]:
+                if child[0] != "not":
+                    self._check(child)
+                elif child[1][0] != "word":
+                    self._check(child[1])
+        elif kind == "or":
+            for child in node[1]:
+                self._check(child)
+
+    @property
+    def words(self):
+        """
+        :return: the words the query includes (not the excluded ones), in the order they appear
+        """
+        words = []
+
+        def collect(node):
+            if node[0] == "word":
+                words.append(node[1])
+            elif node[0] in ("and", "or"):
+                for child in node[1]:
+                    collect(child)
+
+        collect(self.root)
+        return list(dict.fromkeys(words))
+
+    def __str__(self):
+        """
+        :return: the query in a canonical form, e.g. to cache results by
+        """
+        def format_node(node, parent=None):
+            kind = node[0]
+            if kind == "word":
+                return node[1]
+            if kind == "not":
+                return "NOT " + format_node(node[1], "not")
+            text = (" OR " if kind == "or" else " ").join(format_node(child, kind) for child in node[1])
+            return f"({text})" if parent is not None else text
+
+        return format_node(self.root)
+
+    def evaluate(self, search):
+        """
+        :param search: returns the sorted sentence IDs of a word, None if the word is not indexed. Each word is only
+                       searched for once
+        :return: sorted numpy array of the IDs of the sentences matching the query
+        """
+        postings = {}
+
+        def posting(word):
+            if word not in postings:
+                sentence_ids = search(word)
+                postings[word] = _empty() if sentence_ids is None else np.frombuffer(sentence_ids, dtype=np.uint32)
+            return postings[word]
+
+        def evaluate_node(node):
+            kind = node[0]
+            if kind == "word":
+                return posting(node[1])
+            if kind == "or":
+                parts = [evaluate_node(child) for child in node[1]]
+                return np.unique(np.concatenate(parts)).astype(np.uint32)
+            included = [evaluate_node(child) for child in node[1] if child[0] != "not"]
+            # Rarest first, so every intersection is as small as it can be
+            included.sort(key=len)
+            result = included[0]
+            for sentence_ids in included[1:]:
+                if not len(result):
+                    break
+                result = intersect(result, sentence_ids)
+            for child in node[1]:
+                if child[0] == "not" and len(result):
+                    result = result[~contains(evaluate_node(child[1]), result)]
+            return result
+
+        return evaluate_node(self.root)
@@ -0,0 +1,90 @@
+import numpy as np
+
+from Main.Model.sentence_store import LEVEL_BUCKETS
+
+"""
+    Vectorised ranking of candidate sentences by how well their JLPT level distribution suits a user level.
+
+    Sentences are ordered by their weighted score (the level distribution multiplied by the score distribution of the
+    user's level), with ties broken by the share of words from each level in order of closeness to the user's level,
+    and finally by sentence ID. Everything here is a pure function of its arguments, so searches for different levels
+    can run on several threads at once.
+"""
+
+# Weight of the share of words from each level (N5..N1) in a sentence's score, per user level
+SCORE_DISTRIBUTIONS = {
+    "N5": (5, -1, -2, -3, -4),
+    "N4": (4, 5, -1, -2, -3),
+    "N3": (3, 4, 5, -1, -2),
+    "N2": (2, 3, 4, 5, -1),
+    "N1": (1, 2, 3, 4, 5),
+}
+
+# Order in which the share of each level breaks ties, closest to the user's level first
+TIE_BREAK_ORDER = {
+    "N5": (0, 1, 2, 3, 4),
+    "N4": (1, 0, 2, 3, 4),
+    "N3": (2, 1, 0, 3, 4),
+    "N2": (3, 2, 1, 0, 4),
+    "N1": (4, 3, 2, 1, 0),
+}
+
+
+def score_distribution(user_level):
+    """
+    :param user_level: "N5" .. "N1"
+    :return: the weight of each level (N5..N1) when scoring sentences for the user level
+    :raises ValueError: if the level is unknown
+    """
+    try:
+        return SCORE_DISTRIBUTIONS[user_level]
+    except KeyError:
+        raise ValueError(f"Unknown JLPT level {user_level!r}")
+
+
+def level_distributions(index, sentence_ids):
+    """
+    Gathers the stored level counts of the candidate sentences into a matrix of per-level shares.
+    :param index: a SentenceStore or MappedIndex
+    :param sentence_ids: the candidate sentence IDs
+    :return: float matrix with one row per candidate and one column per level (N5..N1)
+    """
+    ids = np.asarray(sentence_ids, dtype=np.intp)
+    # Views are only held for the duration of the call, so the store can still grow and the mapping can be closed
+    level_counts = np.frombuffer(index.level_counts, dtype=np.uint16).reshape(-1, LEVEL_BUCKETS)
+    word_counts = np.frombuffer(index.word_counts, dtype=np.uint16)
+    counts = level_counts[ids, :5].astype(np.float64)
+    totals = word_counts[ids].astype(np.float64)
+    np.divide(counts, totals[:, None], out=counts, where=totals[:, None] > 0)
+    return counts
+
+
+def rank(distributions, user_level, offset=0, limit=None):
+    """
+    Ranks candidate sentences for a user level and returns only the requested page.
+    :param distributions: matrix from level_distributions()
+    :param user_level: "N5" .. "N1", selects the score distribution and the tie-break order
+    :param offset: number of top-ranked sentences to skip
+    :param limit: maximum number of sentences to return, None for all of them
+    :return: the row indices of the page, best first
+    """
+    count = len(distributions)
+    end = count if limit is None else min(count, offset + limit)
+    if offset >= end:
+        return np.empty(0, dtype=np.intp)
+
+    # Rounded so that sentences with the same distribution score exactly the same despite floating point error
+    weights = np.asarray(score_distribution(user_level), dtype=np.float64)
+    negative_scores = -np.round(distributions @ weights, 9)
+    if end < count:
+        # Only rows scoring at least as well as the end of the page can appear on it, ties included
+        threshold = negative_scores[np.argpartition(negative_scores, end - 1)[end - 1]]
+        candidates = np.flatnonzero(negative_scores <= threshold)
+    else:
+        candidates = np.arange(count)
+
+    # lexsort sorts by the last key first; it is stable, so equal rows keep their sentence ID order
+    keys = [-distributions[candidates, level] for level in reversed(TIE_BREAK_ORDER[user_level])]
+    keys.append(negative_scores[candidates])
+    order = candidates[np.lexsort(keys)]
+    return order[offset:end]
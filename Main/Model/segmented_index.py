@@ -0,0 +1,328 @@
+import bisect
+import hashlib
+import json
+import os
+from array import array
+
+import numpy as np
+
+from Main.Model import text_search
+from Main.Model.index_format import IndexFormatError, MappedIndex, sentence_hash
+
+"""
+    The book index as a list of immutable segments plus a manifest of the books they were built from.
+
+    Each ingestion run writes its sentences as a new segment (an index_format file) instead of rewriting the whole
+    index. Sentence IDs are global and never change: a segment's sentences are numbered on from the previous segment's.
+    Every segment lists the IDs of the sentences read from each of its books, and a sentence is live as long as a book
+    in the manifest lists it. Removing or changing a book therefore only means dropping it from the manifest; its
+    sentences disappear from searches (they are tombstoned) unless another book also contains them. Merging the
+    segments (compaction) rewrites them as one, keeping the IDs and leaving empty slots for the tombstoned sentences.
+"""
+
+MANIFEST_VERSION = 2
+# Compaction starts once there are more segments than this, or this share of the sentences is tombstoned
+MAX_SEGMENTS = 4
+MAX_DEAD_RATIO = 0.25
+
+
+def file_fingerprint(path):
+    """
+    :return: the size and modification time of a file, which decide whether it needs hashing
+    """
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def file_digest(path):
+    """
+    :return: SHA-256 of the file's contents, as hex
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class Manifest:
+    """
+    The books that are indexed and the segments holding their sentences, stored as manifest.json in the directory of
+    the segments:
+
+        segments          list of {"file", "base", "sentences"}, in sentence ID order
+        books             book file name -> {"size", "mtime_ns", "sha256", "segments", "checkpoint"}. "segments" are
+                          the files listing the book's sentences, None for books indexed before there was a manifest.
+                          "checkpoint" is the byte offset up to which a book whose ingestion was interrupted has been
+                          indexed, None once the whole book is
+        legacy_sentences  number of sentences, from ID 0, indexed before there was a manifest. They are not listed per
+                          book, so they are always live
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.path = os.path.join(directory, "manifest.json")
+        self.segments = []
+        self.books = {}
+        self.legacy_sentences = 0
+        self.next_segment = 1
+
+    @classmethod
+    def load(cls, directory):
+        """
+        :return: the manifest of the index in directory, an empty one if there is none
+        :raises IndexFormatError: if the manifest cannot be read
+        """
+        manifest = cls(directory)
+        if not os.path.exists(manifest.path):
+            return manifest
+        try:
+            with open(manifest.path, 'r', encoding='utf-8') as file:
+                data = json.load(file)
+        except (OSError, ValueError) as e:
+            raise IndexFormatError(f"{manifest.path} cannot be read: {e}")
+        if data.get("version") == 1:
+            # Version 1 listed each book in a single segment and had no checkpoints
+            for book in data["books"].values():
+                segment = book.pop("segment")
+                book["segments"] = None if segment is None else [segment]
+                book["checkpoint"] = None
+        elif data.get("version") != MANIFEST_VERSION:
+            raise IndexFormatError(f"{manifest.path} has manifest version {data.get('version')}, expected {MANIFEST_VERSION}")
+        manifest.segments = data["segments"]
+        manifest.books = data["books"]
+        manifest.legacy_sentences = data["legacy_sentences"]
+        manifest.next_segment = data["next_segment"]
+        return manifest
+
+    def save(self):
+        """
+        Writes the manifest next to the target and moves it into place, so a crash never leaves half a manifest.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        temp_path = self.path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump({"version": MANIFEST_VERSION, "segments": self.segments, "books": self.books,
+                       "legacy_sentences": self.legacy_sentences, "next_segment": self.next_segment},
+                      file, ensure_ascii=False, indent=1)
+        os.replace(temp_path, self.path)
+
+    @property
+    def sentence_count(self):
+        if not self.segments:
+            return 0
+        return self.segments[-1]["base"] + self.segments[-1]["sentences"]
+
+    def segment_path(self, name):
+        return os.path.join(self.directory, name)
+
+    def new_segment_name(self):
+        name = f"segment-{self.next_segment:06d}.bin"
+        self.next_segment += 1
+        return name
+
+    def remove_stray_segments(self):
+        """
+        Deletes segment files the manifest does not list, e.g. left behind by an interrupted run or a compaction.
+        """
+        if not os.path.isdir(self.directory):
+            return
+        listed = {segment["file"] for segment in self.segments}
+        for name in os.listdir(self.directory):
+            if name.startswith("segment-") and name not in listed:
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    # Still mapped by another process (or on Windows, this one); removed on a later start
+                    pass
+
+
+class SegmentedIndex:
+    """
+    Read-only view of every segment of the book index as one index with global sentence IDs. Offers the same lookups
+    as MappedIndex.
+    """
+
+    def __init__(self, manifest):
+        self.manifest = manifest
+        self.segments = []
+        try:
+            for segment in manifest.segments:
+                self.segments.append(MappedIndex(manifest.segment_path(segment["file"])))
+        except (OSError, IndexFormatError) as e:
+            self.close()
+            raise IndexFormatError(f"segment {segment['file']} cannot be read: {e}")
+        self.bases = [segment.base for segment in self.segments]
+        self._segments_by_file = {entry["file"]: segment for entry, segment in zip(manifest.segments, self.segments)}
+        self.sentence_count = manifest.sentence_count
+
+        if len(self.segments) == 1:
+            self.word_counts = self.segments[0].word_counts
+            self.level_counts = self.segments[0].level_counts
+        else:
+            # Ranking views these as one array each, so they are gathered once here
+            self.word_counts = np.concatenate([np.frombuffer(segment.word_counts, dtype=np.uint16)
+                                               for segment in self.segments] or [np.empty(0, dtype=np.uint16)])
+            self.level_counts = np.concatenate([np.frombuffer(segment.level_counts, dtype=np.uint16)
+                                                for segment in self.segments] or [np.empty(0, dtype=np.uint16)])
+        self.live = self._live_sentences()
+        # Tombstoned sentences that still take up space. Every stored sentence has words, so the empty slots left by a
+        # compaction are the ones without
+        self.dead_count = 0
+        if self.live is not None:
+            self.dead_count = int(np.count_nonzero(~self.live & (np.frombuffer(self.word_counts, dtype=np.uint16) > 0)))
+
+    def _live_sentences(self):
+        """
+        :return: boolean array of the sentences listed by a book in the manifest, None if every sentence is
+        """
+        live = np.zeros(self.sentence_count, dtype=bool)
+        live[:self.manifest.legacy_sentences] = True
+        for name, book in self.manifest.books.items():
+            for file in book["segments"] or ():
+                sentence_ids = self._segments_by_file[file].get_book_sentences(name)
+                if sentence_ids is None:
+                    raise IndexFormatError(f"{file} does not list the sentences of {name}")
+                live[np.frombuffer(sentence_ids, dtype=np.uint32)] = True
+        if live.all():
+            return None
+        return live
+
+    def __len__(self):
+        return self.sentence_count
+
+    def close(self):
+        for segment in self.segments:
+            segment.close()
+
+    def locate(self, sentence_id):
+        """
+        :return: the segment holding a sentence and the sentence's ID within it
+        """
+        segment = self.segments[bisect.bisect_right(self.bases, sentence_id) - 1]
+        return segment, sentence_id - segment.base
+
+    def is_live(self, sentence_id):
+        return self.live is None or bool(self.live[sentence_id])
+
+    def search(self, word):
+        """
+        :param word: dictionary form to look up
+        :return: sorted array of live sentence IDs, None if no live sentence contains the word
+        """
+        parts = []
+        for segment in self.segments:
+            posting = segment.search(word)
+            if posting:
+                parts.append(np.frombuffer(posting, dtype=np.uint32) + np.uint32(segment.base))
+        if not parts:
+            return None
+        sentence_ids = np.concatenate(parts)
+        if self.live is not None:
+            sentence_ids = sentence_ids[self.live[sentence_ids]]
+            if not len(sentence_ids):
+                return None
+        result = array('I')
+        result.frombytes(sentence_ids.astype(np.uint32).tobytes())
+        return result
+
+    def get_sentence(self, sentence_id):
+        segment, local_id = self.locate(sentence_id)
+        return segment.get_sentence(local_id)
+
+    def get_sentences(self, sentence_ids):
+        return [self.get_sentence(sentence_id) for sentence_id in sentence_ids]
+
+    def get_word_count(self, sentence_id):
+        segment, local_id = self.locate(sentence_id)
+        return segment.get_word_count(local_id)
+
+    def get_level_counts(self, sentence_id):
+        """
+        :return: the number of words in the sentence for N5, N4, N3, N2, N1 and outside the JLPT lists
+        """
+        segment, local_id = self.locate(sentence_id)
+        return segment.get_level_counts(local_id)
+
+    def get_non_jlpt_words(self, sentence_id):
+        segment, local_id = self.locate(sentence_id)
+        return segment.get_non_jlpt_words(local_id)
+
+    def get_book_sentences(self, name):
+        """
+        :return: the global IDs of the sentences of an indexed book, None for unknown and legacy books
+        """
+        book = self.manifest.books.get(name)
+        if book is None or book["segments"] is None:
+            return None
+        sentence_ids = array('I')
+        for file in book["segments"]:
+            sentence_ids.extend(self._segments_by_file[file].get_book_sentences(name))
+        if len(book["segments"]) > 1:
+            sentence_ids = array('I', sorted(set(sentence_ids)))
+        return sentence_ids
+
+    def search_text(self, pattern, limit=None):
+        """
+        Finds the live sentences whose text matches a pattern, see text_search. Only the sentences containing every
+        bigram of the pattern are read and checked, so the cost depends on how rare the pattern is rather than on the
+        size of the library.
+        :param pattern: literal text, with * (or ～) for any run of characters and ? for any one character
+        :param limit: maximum number of sentences to return, None for all of them
+        :return: the IDs of the matching sentences, in ID order
+        :raises ValueError: if the pattern has no literal text
+        """
+        pattern = text_search.Pattern(pattern)
+        matches = []
+        for segment in self.segments:
+            candidates = segment.text_candidates(pattern)
+            if candidates is None:
+                # Written by an older version without the bigram index
+                candidates = np.arange(len(segment), dtype=np.uint32)
+            sentence_ids = candidates.astype(np.uint32) + np.uint32(segment.base)
+            if self.live is not None:
+                sentence_ids = sentence_ids[self.live[sentence_ids]]
+            for local_id, sentence_id in zip((sentence_ids - np.uint32(segment.base)).tolist(), sentence_ids.tolist()):
+                if pattern.matches(segment.get_sentence(local_id)):
+                    matches.append(sentence_id)
+                    if limit is not None and len(matches) >= limit:
+                        return matches
+        return matches
+
+    def get_books_of(self, sentence_id):
+        """
+        :return: the names of the books a sentence was read from, empty for sentences indexed before books were listed
+        """
+        books = []
+        for name, book in self.manifest.books.items():
+            for file in book["segments"] or ():
+                if self._segments_by_file[file].lists_sentence(name, sentence_id):
+                    books.append(name)
+                    break
+        return books
+
+    def find_sentence(self, sentence):
+        """
+        :return: the global ID of a stored sentence (live or tombstoned), None if no segment holds it
+        """
+        hash_value = sentence_hash(sentence)
+        for segment in self.segments:
+            local_id = segment.find_sentence(sentence, hash_value)
+            if local_id is not None:
+                return segment.base + local_id
+        return None
+
+    def dead_in(self, segment):
+        """
+        :return: the number of tombstoned sentences that still take up space in one of the segments
+        """
+        if self.live is None:
+            return 0
+        live = self.live[segment.base:segment.base + len(segment)]
+        return int(np.count_nonzero(~live & (np.frombuffer(segment.word_counts, dtype=np.uint16) > 0)))
+
+    def needs_compaction(self):
+        if len(self.segments) > MAX_SEGMENTS:
+            return True
+        return self.sentence_count > 0 and self.dead_count / self.sentence_count > MAX_DEAD_RATIO
+
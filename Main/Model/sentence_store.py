@@ -0,0 +1,284 @@
+import sys
+from array import array
+
+"""
+    Compact storage for the book index. Every sentence is stored once and addressed by an integer ID, and each
+    dictionary form (addressed by a word ID) maps to a sorted array('I') of the IDs of the sentences that contain it.
+
+    Alongside each sentence the store keeps what scoring needs, so searches never have to re-tokenize: the number of
+    words in the sentence, how many of them belong to each JLPT level (N5..N1, then non-JLPT) and the IDs of the
+    words that are not in any JLPT list.
+"""
+
+# Number of level buckets stored per sentence: N5, N4, N3, N2, N1 and non-JLPT
+LEVEL_BUCKETS = 6
+NON_JLPT = LEVEL_BUCKETS - 1
+_MAX_COUNT = 0xFFFF
+
+# Rough sizes in bytes behind estimated_size: a list slot, an entry of the word or sentence lookup and an empty posting
+_SLOT_BYTES = 8
+_LOOKUP_BYTES = 100
+_POSTING_BYTES = 64
+_ID_BYTES = array('I').itemsize
+# The word count, level counts and non-JLPT offset of a sentence
+_SENTENCE_BYTES = _SLOT_BYTES + array('H').itemsize * (1 + LEVEL_BUCKETS) + _ID_BYTES
+
+
+class SentenceStore:
+    def __init__(self):
+        self.sentences = []
+        self.words = []
+        self.word_ids = {}
+        self.postings = []
+        self.word_counts = array('H')
+        self.level_counts = array('H')
+        self.non_jlpt_offsets = array('I', (0,))
+        self.non_jlpt_words = array('I')
+        # sentence -> ID, only built while sentences are being added
+        self._sentence_ids = None
+        # Kept up to date as the store grows, see estimated_size
+        self._size = _ID_BYTES
+
+    @classmethod
+    def from_index(cls, index):
+        """
+        Loads a read-only index (see index_format.MappedIndex) fully into memory so more sentences can be added.
+        """
+        store = cls()
+        store.sentences = index.get_sentences(range(len(index)))
+        store.words = [index.get_word(word_id) for word_id in range(index.word_count)]
+        store.word_ids = {word: word_id for word_id, word in enumerate(store.words)}
+        store.postings = [index.get_posting(word_id) for word_id in range(index.word_count)]
+        store.word_counts = array('H', index.word_counts)
+        store.level_counts = array('H', index.level_counts)
+        store.non_jlpt_offsets = array('I', index.non_jlpt_offsets)
+        store.non_jlpt_words = array('I', index.non_jlpt_words)
+        store._size = store._measure()
+        return store
+
+    def __len__(self):
+        return len(self.sentences)
+
+    @property
+    def word_count(self):
+        return len(self.words)
+
+    def _get_sentence_ids(self):
+        if self._sentence_ids is None:
+            self._sentence_ids = {sentence: sentence_id for sentence_id, sentence in enumerate(self.sentences)}
+            self._size += _LOOKUP_BYTES * len(self._sentence_ids)
+        return self._sentence_ids
+
+    def _drop_sentence_ids(self):
+        if self._sentence_ids is not None:
+            self._size -= _LOOKUP_BYTES * len(self._sentence_ids)
+            self._sentence_ids = None
+
+    def _append_sentence(self, sentence):
+        """
+        Stores the text of a new sentence. Its word count, level counts and non-JLPT offset are appended by the caller.
+        :return: the ID of the sentence
+        """
+        sentence_id = len(self.sentences)
+        self.sentences.append(sentence)
+        self._size += sys.getsizeof(sentence) + _SENTENCE_BYTES
+        if self._sentence_ids is not None:
+            self._sentence_ids[sentence] = sentence_id
+            self._size += _LOOKUP_BYTES
+        return sentence_id
+
+    def _get_word_id(self, word):
+        word_id = self.word_ids.get(word)
+        if word_id is None:
+            word_id = len(self.words)
+            self.words.append(word)
+            self.word_ids[word] = word_id
+            self.postings.append(array('I'))
+            self._size += sys.getsizeof(word) + _SLOT_BYTES + _LOOKUP_BYTES + _POSTING_BYTES
+        return word_id
+
+    def add_sentence(self, sentence, words, level_codes):
+        """
+        Adds a sentence and indexes it under each of its words. A sentence that is already stored is not re-indexed.
+        New IDs are always the largest so far, so appending keeps every posting list sorted.
+        :param sentence: the sentence text
+        :param words: the dictionary forms found in the sentence
+        :param level_codes: for each word, the index of its JLPT level (0 for N5 .. 4 for N1) or NON_JLPT
+        :return: the ID of the sentence
+        """
+        sentence_ids = self._get_sentence_ids()
+        sentence_id = sentence_ids.get(sentence)
+        if sentence_id is not None:
+            return sentence_id
+
+        sentence_id = self._append_sentence(sentence)
+
+        counts = [0] * LEVEL_BUCKETS
+        added_ids = 0
+        for word, level_code in zip(words, level_codes):
+            word_id = self._get_word_id(word)
+            posting = self.postings[word_id]
+            if not posting or posting[-1] != sentence_id:
+                posting.append(sentence_id)
+                added_ids += 1
+            counts[level_code] += 1
+            if level_code == NON_JLPT:
+                self.non_jlpt_words.append(word_id)
+                added_ids += 1
+        self._size += _ID_BYTES * added_ids
+
+        self.word_counts.append(min(len(words), _MAX_COUNT))
+        self.level_counts.extend(min(count, _MAX_COUNT) for count in counts)
+        self.non_jlpt_offsets.append(len(self.non_jlpt_words))
+        return sentence_id
+
+    def merge(self, other):
+        """
+        Adds the sentences of another store, as if they had been added one by one in the other store's ID order.
+        Sentences already present are not re-indexed, matching add_sentence().
+        :param other: a SentenceStore, e.g. a partial index built by an ingestion worker
+        :return: array mapping each of the other store's sentence IDs to its ID in this store
+        """
+        word_map = {}
+
+        def map_word(other_word_id):
+            word_id = word_map.get(other_word_id)
+            if word_id is None:
+                word_id = word_map[other_word_id] = self._get_word_id(other.words[other_word_id])
+            return word_id
+
+        sentence_ids = self._get_sentence_ids()
+        id_map = array('I')
+        is_new = bytearray()
+        for other_id, sentence in enumerate(other.sentences):
+            sentence_id = sentence_ids.get(sentence)
+            if sentence_id is not None:
+                id_map.append(sentence_id)
+                is_new.append(False)
+                continue
+
+            sentence_id = self._append_sentence(sentence)
+            id_map.append(sentence_id)
+            is_new.append(True)
+
+            self.word_counts.append(other.word_counts[other_id])
+            base = other_id * LEVEL_BUCKETS
+            self.level_counts.extend(other.level_counts[base:base + LEVEL_BUCKETS])
+            start, end = other.non_jlpt_offsets[other_id], other.non_jlpt_offsets[other_id + 1]
+            self.non_jlpt_words.extend(map_word(word_id) for word_id in other.non_jlpt_words[start:end])
+            self.non_jlpt_offsets.append(len(self.non_jlpt_words))
+            self._size += _ID_BYTES * (end - start)
+
+        for other_word_id, other_posting in enumerate(other.postings):
+            new_ids = [id_map[other_id] for other_id in other_posting if is_new[other_id]]
+            if new_ids:
+                self.postings[map_word(other_word_id)].extend(new_ids)
+                self._size += _ID_BYTES * len(new_ids)
+        return id_map
+
+    def append_index(self, index, live=None):
+        """
+        Appends every sentence of an index without looking for duplicates, so sentence i of the index gets the ID
+        len(self) + i. Used to merge index segments while keeping their sentence IDs.
+        :param index: a SentenceStore or MappedIndex
+        :param live: optional sequence of booleans, one per sentence of the index. Sentences that are not live keep
+                     their ID but are stored empty, without words
+        """
+        base = len(self)
+        # IDs are not looked up while segments are merged
+        self._drop_sentence_ids()
+        word_map = {}
+
+        def map_word(index_word_id):
+            word_id = word_map.get(index_word_id)
+            if word_id is None:
+                word_id = word_map[index_word_id] = self._get_word_id(index.get_word(index_word_id))
+            return word_id
+
+        for sentence_id in range(len(index)):
+            if live is not None and not live[sentence_id]:
+                self._append_sentence("")
+                self.word_counts.append(0)
+                self.level_counts.extend([0] * LEVEL_BUCKETS)
+                self.non_jlpt_offsets.append(len(self.non_jlpt_words))
+                continue
+            self._append_sentence(index.get_sentence(sentence_id))
+            self.word_counts.append(index.word_counts[sentence_id])
+            start = sentence_id * LEVEL_BUCKETS
+            self.level_counts.extend(index.level_counts[start:start + LEVEL_BUCKETS])
+            start, end = index.non_jlpt_offsets[sentence_id], index.non_jlpt_offsets[sentence_id + 1]
+            self.non_jlpt_words.extend(map_word(word_id) for word_id in index.non_jlpt_words[start:end])
+            self.non_jlpt_offsets.append(len(self.non_jlpt_words))
+            self._size += _ID_BYTES * (end - start)
+
+        for index_word_id in range(index.word_count):
+            ids = [base + sentence_id for sentence_id in index.get_posting(index_word_id)
+                   if live is None or live[sentence_id]]
+            if ids:
+                self.postings[map_word(index_word_id)].extend(ids)
+                self._size += _ID_BYTES * len(ids)
+
+    def estimated_size(self):
+        """
+        :return: rough number of bytes the store takes up in memory, used to decide when to flush it to disk. Kept up
+                 to date as sentences are added, so it is cheap to ask for after every chunk
+        """
+        return self._size
+
+    def _measure(self):
+        """
+        :return: the estimate of estimated_size, computed from every sentence, word and posting
+        """
+        size = sum(map(sys.getsizeof, self.sentences)) + sum(map(sys.getsizeof, self.words))
+        size += sum(posting.itemsize * len(posting) + _POSTING_BYTES for posting in self.postings)
+        size += _SLOT_BYTES * len(self.sentences) + _SLOT_BYTES * len(self.words) + _LOOKUP_BYTES * len(self.word_ids)
+        if self._sentence_ids is not None:
+            size += _LOOKUP_BYTES * len(self._sentence_ids)
+        for counts in (self.word_counts, self.level_counts, self.non_jlpt_offsets, self.non_jlpt_words):
+            size += counts.itemsize * len(counts)
+        return size
+
+    def finalise(self):
+        """
+        Drops the sentence lookup that is only needed while sentences are being added.
+        """
+        self._drop_sentence_ids()
+
+    def word_id(self, word):
+        return self.word_ids.get(word)
+
+    def get_word(self, word_id):
+        return self.words[word_id]
+
+    def get_posting(self, word_id):
+        return self.postings[word_id]
+
+    def search(self, word):
+        """
+        :param word: dictionary form to look up
+        :return: sorted array of sentence IDs, None if the word is not indexed
+        """
+        word_id = self.word_ids.get(word)
+        if word_id is None:
+            return None
+        return self.postings[word_id]
+
+    def get_sentence(self, sentence_id):
+        return self.sentences[sentence_id]
+
+    def get_sentences(self, sentence_ids):
+        return [self.sentences[sentence_id] for sentence_id in sentence_ids]
+
+    def get_word_count(self, sentence_id):
+        return self.word_counts[sentence_id]
+
+    def get_level_counts(self, sentence_id):
+        """
+        :return: the number of words in the sentence for N5, N4, N3, N2, N1 and outside the JLPT lists
+        """
+        base = sentence_id * LEVEL_BUCKETS
+        return self.level_counts[base:base + LEVEL_BUCKETS]
+
+    def get_non_jlpt_words(self, sentence_id):
+        start, end = self.non_jlpt_offsets[sentence_id], self.non_jlpt_offsets[sentence_id + 1]
+        return [self.words[word_id] for word_id in self.non_jlpt_words[start:end]]
@@ -0,0 +1,82 @@
+import logging
+import threading
+import time
+
+"""
+    Loading of the backend's state on a background thread, so the server can accept connections and the command line
+    tool can ask for the user's level while dictionaries and the book index are still being opened.
+"""
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundLoader:
+    def __init__(self, load, then=None, name="loader"):
+        """
+        Starts loading straight away.
+        :param load: called with this loader, returns the loaded value. May call set_stage to report progress
+        :param then: optional work called with the loaded value after it has been made available, e.g. scanning for
+                     new books, which should not delay answering requests
+        :param name: name of the thread
+        """
+        self.stage = "starting"
+        self.value = None
+        self.error = None
+        self.started = time.monotonic()
+        self.load_seconds = None
+        self._loaded = threading.Event()
+        self._finished = threading.Event()
+        threading.Thread(target=self._run, args=(load, then), name=name, daemon=True).start()
+
+    def _run(self, load, then):
+        try:
+            self.value = load(self)
+        except Exception as e:
+            logger.exception(f"Error while loading: {e}")
+            self.error = e
+        finally:
+            self.load_seconds = time.monotonic() - self.started
+            self._loaded.set()
+        try:
+            if then is not None and self.error is None:
+                then(self)
+        except Exception as e:
+            logger.exception(f"Error after loading: {e}")
+        finally:
+            self.set_stage("failed" if self.error is not None else "done")
+            self._finished.set()
+
+    def set_stage(self, stage):
+        self.stage = stage
+
+    @property
+    def ready(self):
+        return self._loaded.is_set() and self.error is None
+
+    def wait(self, timeout=None):
+        """
+        :param timeout: seconds to wait for the value, None to wait for as long as loading takes
+        :return: the loaded value, None if it is not loaded within the timeout or loading failed
+        """
+        self._loaded.wait(timeout)
+        return self.value if self.ready else None
+
+    def wait_until_finished(self, timeout=None):
+        """
+        Waits for the work after loading as well.
+        :return: whether it has finished
+        """
+        return self._finished.wait(timeout)
+
+    def status(self):
+        """
+        :return: whether the value is loaded, the current stage, the seconds it took to load (or have been spent on it
+                 so far) and the error if loading failed
+        """
+        seconds = self.load_seconds if self.load_seconds is not None else time.monotonic() - self.started
+        return {
+            'ready': self.ready,
+            'stage': self.stage,
+            'seconds': round(seconds, 3),
+            'error': str(self.error) if self.error is not None else None,
+        }
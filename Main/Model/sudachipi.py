@@ -1,31 +1,60 @@
-from sudachipy import tokenizer
-from sudachipy.dictionary import Dictionary
+import bisect
+import hashlib
+import logging
+import os
+from array import array
+
+from Main.Model import tokenizer_pool
+from Main.Model.lru_cache import LRUCache
 
 ## Given a word, returns the dictionary form of the word
 
+logger = logging.getLogger(__name__)
+
+# Entries of the dictionary form cache unless TOKENIZATION_CACHE_SIZE is set, see cache_size_setting
+DEFAULT_CACHE_SIZE = 10000
+
+
+def cache_size_setting(environ=os.environ):
+    """
+    :return: the number of sentences the dictionary form cache holds, TOKENIZATION_CACHE_SIZE in the environment if it
+             is a whole number of at least 0 (0 disables the cache), DEFAULT_CACHE_SIZE otherwise
+    """
+    value = environ.get("TOKENIZATION_CACHE_SIZE")
+    if value is None:
+        return DEFAULT_CACHE_SIZE
+    if not value.strip().isdigit():
+        logger.warning(f"Ignoring TOKENIZATION_CACHE_SIZE={value!r}, it has to be a whole number of at least 0")
+        return DEFAULT_CACHE_SIZE
+    return int(value)
+
+
+# Dictionary forms of recently analysed sentences, keyed by sentence text
+dict_form_cache = LRUCache(cache_size_setting())
+# Tokenizations of recently hovered text chunks, keyed by a hash of the text, see tokenize_chunk
+CHUNK_CACHE_SIZE = 256
+chunk_cache = LRUCache(CHUNK_CACHE_SIZE)
+
 class sentence_breakdown:
 
     def __init__(self):
         self.sentence = None
-        self.tokenizer_obj = Dictionary().create()
-        self.mode = tokenizer.Tokenizer.SplitMode.C
+        self.mode = tokenizer_pool.get_pool().mode
         self.tokens = None
         self.search_word = None
 
+    @property
+    def tokenizer_obj(self):
+        # Tokenizers come from the shared pool so the dictionary is only loaded once per process
+        return tokenizer_pool.get_tokenizer()
+
     def set_sentence(self, sentence):
         self.sentence = sentence
         self.tokens = self.tokenizer_obj.tokenize(self.sentence, self.mode)
 
     def get_all_dict_forms(self):
         # Filter tokens that are NOT particles and NOT punctuation and return their dictionary forms
-        dict_forms = [
-            token.dictionary_form()
-            for token in self.tokens
-            if token is not None  # Ensure token is not None
-               and token.part_of_speech() is not None  # Ensure part_of_speech is not None
-            if '助詞' not in token.part_of_speech() and '補助記号' not in token.part_of_speech()
-        ]
-        return dict_forms
+        return [token.dictionary_form() for token in self.tokens if is_content_token(token)]
 
     def set_search_word(self, word):
         self.search_word = word
@@ -42,6 +71,110 @@ class sentence_breakdown:
                 return token.dictionary_form()
         return "Word not found"
 
+def is_content_token(token):
+    """
+    :return: whether the token is a word that gets a level and a definition, i.e. not a particle or punctuation
+    """
+    if token is None or token.part_of_speech() is None:
+        return False
+    return '助詞' not in token.part_of_speech() and '補助記号' not in token.part_of_speech()
+
+
+def _analyse(sentence):
+    breakdown = sentence_breakdown()
+    breakdown.set_sentence(sentence)
+    return tuple(breakdown.get_all_dict_forms())
+
+
+def get_dict_forms(sentence):
+    """
+    Returns the dictionary forms of the sentence (particles and punctuation excluded), memoised in dict_form_cache
+    so a sentence that is scored and then analysed for difficult words is only tokenized once.
+    """
+    return dict_form_cache.get_or_compute(sentence, _analyse)
+
+
+class TokenizedChunk:
+    """
+    The token boundaries and dictionary forms of a text chunk, so the word at any character offset is found by
+    bisection instead of tokenizing the chunk again.
+    """
+
+    def __init__(self, text):
+        # Cumulative character offset of the end of each token
+        self.ends = array('I')
+        self.dict_forms = []
+        self.content = []
+        end = 0
+        for token in tokenizer_pool.tokenize(text):
+            end += len(token.surface())
+            self.ends.append(end)
+            self.dict_forms.append(token.dictionary_form())
+            self.content.append(is_content_token(token))
+
+    def __len__(self):
+        return len(self.ends)
+
+    def token_at(self, offset):
+        """
+        :return: the index of the token containing the character offset, None if the offset is outside the text
+        """
+        position = bisect.bisect_right(self.ends, offset)
+        if offset < 0 or position >= len(self.ends):
+            return None
+        return position
+
+    def word_at(self, offset):
+        """
+        :return: the dictionary form of the token containing the character offset, None if there is none
+        """
+        position = self.token_at(offset)
+        return None if position is None else self.dict_forms[position]
+
+    def tokens(self):
+        """
+        :return: iterator of (start, end, dictionary form, whether it is a content word) per token
+        """
+        start = 0
+        for end, dict_form, content in zip(self.ends, self.dict_forms, self.content):
+            yield start, end, dict_form, content
+            start = end
+
+
+def tokenize_chunk(text):
+    """
+    Tokenizes a text chunk, memoised in chunk_cache so hovering around the same paragraph only tokenizes it once.
+    :return: the TokenizedChunk of the text
+    """
+    key = hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+    return chunk_cache.get_or_compute(key, lambda _: TokenizedChunk(text))
+
+
+def set_cache_size(max_size):
+    """
+    Changes the number of sentences the dictionary form cache holds, evicting the least recently used ones if it
+    shrinks. 0 disables the cache.
+    :raises ValueError: if max_size is not a whole number of at least 0
+    """
+    if isinstance(max_size, bool) or not isinstance(max_size, int) or max_size < 0:
+        raise ValueError(f"The cache size has to be a whole number of at least 0, not {max_size!r}")
+    dict_form_cache.resize(max_size)
+
+
+def cache_stats():
+    """
+    :return: size, hit, miss and eviction counters of the dictionary form cache
+    """
+    return dict_form_cache.stats()
+
+
+def chunk_cache_stats():
+    """
+    :return: size, hit, miss and eviction counters of the text chunk cache
+    """
+    return chunk_cache.stats()
+
+
 if __name__ == "__main__":
     sentence = "私は猫が好きです。"
     breakdown = sentence_breakdown()
@@ -0,0 +1,104 @@
+import re
+
+import numpy as np
+
+"""
+    Surface-form search over the text of the indexed sentences, e.g. for grammar patterns such as ～てしまう.
+
+    Every segment of the book index stores a character bigram index (see index_format.write_index): for each pair of
+    adjacent characters, the sorted IDs of the sentences containing it. A bigram is a uint64 key, the code point of the
+    first character shifted left by 32 bits plus the code point of the second. Each sentence is followed by END before
+    its bigrams are taken, so every character of a sentence is the first character of one of its bigrams, and the
+    sentences containing a single character are the ones listed under any key in its key range.
+
+    A pattern is literal text with wildcards: * (or ～, 〜) stands for any run of characters and ? for any one
+    character, within a sentence. The candidates are the sentences containing every bigram of the pattern's literal
+    parts, and only they are checked against the pattern itself.
+"""
+
+END = "\0"
+# Wildcards standing for any run of characters, and for one character
+ANY_RUN = "*～〜"
+ANY_CHARACTER = "?"
+
+
+def gram_key(first, second):
+    return (ord(first) << 32) | ord(second)
+
+
+def key_range(character):
+    """
+    :return: the keys of every bigram starting with the character, as a half-open range
+    """
+    return ord(character) << 32, (ord(character) + 1) << 32
+
+
+def build_bigrams(sentences):
+    """
+    :param sentences: the sentences of a segment, in ID order
+    :return: (sorted unique uint64 bigram keys, uint64 offsets of each key's block in the postings (key count + 1
+             entries), uint32 sentence IDs, one sorted block per key)
+    """
+    text = END.join(sentences) + END
+    code_points = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32)
+    # Sentence i spans the code points after the i-th END
+    ends = code_points == ord(END)
+    sentence_ids = np.cumsum(ends, dtype=np.uint32) - ends
+    starts = np.flatnonzero(~ends[:-1])
+    keys = (code_points[starts].astype(np.uint64) << np.uint64(32)) | code_points[starts + 1].astype(np.uint64)
+    sentence_ids = sentence_ids[starts]
+
+    order = np.lexsort((sentence_ids, keys))
+    keys, sentence_ids = keys[order], sentence_ids[order]
+    # A bigram appearing several times in a sentence is listed once
+    first = np.ones(len(keys), dtype=bool)
+    first[1:] = (keys[1:] != keys[:-1]) | (sentence_ids[1:] != sentence_ids[:-1])
+    keys, sentence_ids = keys[first], sentence_ids[first]
+
+    new_key = np.ones(len(keys), dtype=bool)
+    new_key[1:] = keys[1:] != keys[:-1]
+    offsets = np.append(np.flatnonzero(new_key), len(keys)).astype(np.uint64)
+    return keys[new_key], offsets, sentence_ids
+
+
+class Pattern:
+    """
+    A parsed search pattern.
+    """
+
+    def __init__(self, pattern):
+        """
+        :raises ValueError: if the pattern has no literal text
+        """
+        self.pattern = pattern
+        self.literals = [part for part in re.split(f"[{re.escape(ANY_RUN + ANY_CHARACTER)}]+", pattern) if part]
+        if not self.literals:
+            raise ValueError(f"The pattern {pattern!r} has no text to search for")
+        expression = "".join(".*?" if character in ANY_RUN else "." if character == ANY_CHARACTER
+                             else re.escape(character) for character in pattern)
+        self.regex = re.compile(expression, re.DOTALL)
+
+    def bigram_keys(self):
+        """
+        :return: the keys of every bigram of the literal parts, sorted
+        """
+        return sorted({gram_key(part[i], part[i + 1]) for part in self.literals for i in range(len(part) - 1)})
+
+    def single_characters(self):
+        """
+        :return: the literal parts of one character, which have no bigram of their own
+        """
+        return sorted({part for part in self.literals if len(part) == 1})
+
+    def matches(self, sentence):
+        return self.regex.search(sentence) is not None
+
+
+def intersect(candidates, sentence_ids):
+    """
+    :param candidates: sorted unique array, None for every sentence
+    :param sentence_ids: sorted unique array
+    """
+    if candidates is None:
+        return sentence_ids
+    return np.intersect1d(candidates, sentence_ids, assume_unique=True)
@@ -0,0 +1,63 @@
+import os
+import threading
+from sudachipy import tokenizer
+from sudachipy.dictionary import Dictionary
+
+"""
+    Process-wide provider of Sudachi tokenizers. The system dictionary is loaded once per process and each thread is
+    handed its own tokenizer built from it, since a Sudachi tokenizer must not be shared between threads.
+"""
+
+
+class TokenizerPool:
+    def __init__(self):
+        self.mode = tokenizer.Tokenizer.SplitMode.C
+        self.dictionary = None
+        self.created = 0
+        self._pid = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _load_dictionary(self):
+        """
+        Loads the Sudachi dictionary the first time it is needed. A forked worker process reloads its own copy.
+        """
+        with self._lock:
+            if self.dictionary is None or self._pid != os.getpid():
+                self.dictionary = Dictionary()
+                self.created = 0
+                self._pid = os.getpid()
+                self._local = threading.local()
+        return self.dictionary
+
+    def get_tokenizer(self):
+        """
+        :return: the tokenizer owned by the calling thread, created from the shared dictionary on first use
+        """
+        if self.dictionary is None or self._pid != os.getpid():
+            self._load_dictionary()
+        tokenizer_obj = getattr(self._local, "tokenizer", None)
+        if tokenizer_obj is None:
+            tokenizer_obj = self.dictionary.create()
+            self._local.tokenizer = tokenizer_obj
+            with self._lock:
+                self.created += 1
+        return tokenizer_obj
+
+    def tokenize(self, text, mode=None):
+        return self.get_tokenizer().tokenize(text, mode if mode is not None else self.mode)
+
+
+_pool = TokenizerPool()
+
+
+def get_pool():
+    return _pool
+
+
+def get_tokenizer():
+    return _pool.get_tokenizer()
+
+
+def tokenize(text, mode=None):
+    return _pool.tokenize(text, mode)
@@ -1,36 +1,121 @@
 import os
+from concurrent.futures import ThreadPoolExecutor
 from Main.Model.book_management import BookManagement
+from Main.Model.known_words import KnownWords
 from Main.Model.list_management import list_management
+from Main.Model.lru_cache import LRUCache
 from Main.Model.wordsearch import WordSearch
 
 
+# Number of server responses kept, and for how many seconds, see response_cache
+RESPONSE_CACHE_SIZE = 2048
+RESPONSE_CACHE_TTL = 10 * 60
+# Seconds a response is cached that misses definitions which could not be looked up in time. They are usually cached
+# by the time it expires, so the next request gets the full response
+INCOMPLETE_RESPONSE_TTL = 5
+# Threads searching for the distinct words of a batch, see search_many
+SEARCH_WORKERS = 4
+
+
 class User:
-    def __init__(self, level):
+    def __init__(self, level, scan_books=True, books_directory=None, index_directory=None, known_words_path=None,
+                 dictionary_directory=None):
+        """
+        :param level: the default JLPT level of searches
+        :param scan_books: index new books before returning. Otherwise the index is opened as last saved and
+                           update_book_library() picks up new books later
+        :param books_directory: directory of the books, see BookManagement
+        :param index_directory: directory of the book index, see BookManagement
+        :param known_words_path: word list of the words the user knows, known_words.txt of the dictionary directory
+                                 if None
+        :param dictionary_directory: directory of the word lists and definition caches, see list_management
+        """
         self.user_level = level
         # Initialize the word lists and set the user level scoring
-        self.JLPT_lists = list_management()
+        self.JLPT_lists = list_management(dictionary_directory=dictionary_directory)
         self.JLPT_lists.set_user_level(self.user_level)
         self.JLPT_lists.initialise()
 
         # Initialize the dictionary of sentences from books
-        self.sentence_dictionary = BookManagement()
+        self.sentence_dictionary = BookManagement(self.JLPT_lists, scan=scan_books, books_directory=books_directory,
+                                                  index_directory=index_directory)
+
+        self.known_words = KnownWords(known_words_path
+                                      or os.path.join(self.JLPT_lists.dictionary_directory, 'known_words.txt'))
+
+        # Finished server responses, keyed by what the server computed them from. Cleared when the library changes
+        self.response_cache = LRUCache(RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL)
+        self._search_executor = ThreadPoolExecutor(SEARCH_WORKERS, thread_name_prefix="search")
 
-    def search_for_word(self, word):
+    def search_for_word(self, word, offset=0, limit=None, level=None, unresolved=None):
+        """
+        Ranks the sentences containing a word for a level, the user's level if None. The level is passed along rather
+        than stored, so requests for different levels can be served at the same time.
+        :param unresolved: optional set the word is added to if its definition could not be looked up in time
+        """
         # Initialize the search logic with the current user context
         word_searcher = WordSearch(self)
-        # Perform the search
-        return word_searcher.search(word)
+        # Perform the search, only building the requested page of ranked sentences
+        return word_searcher.search(word, offset, limit, level, unresolved)
+
+    def search_query(self, query, offset=0, limit=None, level=None):
+        """
+        Ranks the sentences matching a boolean query over dictionary forms, e.g. "彼女 結婚する", see query.Query.
+        :return: (number of matching sentences, the requested page of ranked sentences)
+        :raises ValueError: if the query cannot be parsed
+        """
+        return WordSearch(self).search_query(query, offset, limit, level)
+
+    def mine_sentences(self, word=None, max_unknown=1, offset=0, limit=None, level=None):
+        """
+        Ranks the sentences with at most max_unknown words the user does not know, containing the word if one is
+        given, see WordSearch.mine.
+        :return: (number of matching sentences, the requested page of ranked sentences)
+        """
+        return WordSearch(self).mine(word, max_unknown, offset, limit, level)
+
+    def get_unknown_words(self, sentence_id):
+        """
+        :return: the words of an indexed sentence the user does not know
+        """
+        return self.known_words.unknown_words(self.sentence_dictionary.index, sentence_id)
+
+    def search_many(self, words, limit, level=None):
+        """
+        Ranks the sentences of several words for a level, searching for the words in parallel. Results are kept in the
+        response cache, so they are dropped with it when the library changes.
+        :param words: dictionary forms to search for
+        :param limit: number of sentence IDs returned per word
+        :param level: the level to rank for, the user's level if None
+        :return: mapping of word to (number of sentences containing it, IDs of the best ranked of them), None for words
+                 that are not indexed
+        """
+        level = level or self.user_level
+        word_searcher = WordSearch(self)
+
+        def search(word):
+            return self.response_cache.get_or_compute(
+                ("sentence_ids", word, level, limit), lambda _: word_searcher.rank_sentence_ids(word, limit, level))
+
+        words = list(dict.fromkeys(words))
+        return dict(zip(words, self._search_executor.map(search, words)))
 
-    def get_difficult_words_in_sentence(self, sentence):
+    def get_difficult_words_in_sentence(self, sentence, level=None, unresolved=None):
         """
-        Returns a list of words in the sentence that are above the user's level.
+        Returns a list of words in the sentence that are above a level, the user's level if None.
         Each item is (word, level, meaning).
+        :param unresolved: optional set the words whose definitions could not be looked up in time are added to
         """
-        return self.JLPT_lists.get_difficult_words(sentence, self.user_level)
+        return self.JLPT_lists.get_difficult_words(sentence, level or self.user_level, unresolved)
 
     def update_book_library(self):
         """
         Triggers the scanning of the book directory for new files.
         Returns the list of newly added books.
         """
-        return self.sentence_dictionary.scan_for_new_books()
\ No newline at end of file
+        generation = self.sentence_dictionary.generation
+        added_books = self.sentence_dictionary.scan_for_new_books()
+        if self.sentence_dictionary.generation != generation:
+            # Cached responses may list retracted sentences or miss new ones
+            self.response_cache.clear()
+        return added_books
\ No newline at end of file
@@ -1,5 +1,12 @@
 
-import requests
+import logging
+
+import numpy as np
+
+from Main.Model import metrics, ranking
+from Main.Model.query import Query
+
+logger = logging.getLogger(__name__)
 
 
 class WordSearch:
@@ -7,66 +14,172 @@ class WordSearch:
         self.user = user
 
 
-    def search(self, search_word):
+    def search(self, search_word, offset=0, limit=None, level=None, unresolved=None):
+        """
+        Finds the sentences containing a word, ranked for a JLPT level.
+
+        Args:
+            search_word: the dictionary form to search for
+            offset: number of top-ranked sentences to skip
+            limit: maximum number of sentences to return, None for all of them
+            level: the level to rank for, the user's level if None
+            unresolved: optional set the word is added to if its definition could not be looked up in time
+
+        Returns:
+            (definitions of the word, the requested page of ranked sentences) or None if the word is not indexed
+        """
 
+        level = level or self.user.user_level
         while (search_word != "q"):
-            sentences = self.user.sentence_dictionary.search_dic(search_word)
-            if sentences is None:
-                print("Word not found")
+            # A scan or compaction on another thread may replace the index, so the whole search uses this one
+            index = self.user.sentence_dictionary.index
+            with metrics.stage("index_lookup"):
+                sentence_ids = index.search(search_word)
+            if sentence_ids is None:
+                logger.debug(f"Word not found: {search_word}")
                 break
-            scored_sentences = []
-            for sentence in sentences:
-                JLPT_score = self.user.JLPT_lists.calculate_JLPT_score(sentence)
-                temp = []
-                temp.append(sentence)
-                temp.append(JLPT_score[0])  # JLPT score
-                temp.append(JLPT_score[1])  # Extra non-JLPT words
-                temp.append(JLPT_score[2])  # Number of words
-                scored_sentences.append(temp)
 
-            sorted_sentences = self.sort_sentences(scored_sentences)
+            sorted_sentences = self.sort_sentences(sentence_ids, offset, limit, level, index)
 
 
-            return (self.get_jisho_definition(search_word), sorted_sentences)
+            return (self.get_jisho_definition(search_word, unresolved), sorted_sentences)
+
+
+
+    def search_query(self, query, offset=0, limit=None, level=None):
+        """
+        Finds the sentences matching a boolean query over dictionary forms, ranked for a JLPT level like search().
+
+        Args:
+            query: a Query or the text of one, e.g. "彼女 結婚する" or "猫 (見る OR 聞く) -犬"
+            offset: number of top-ranked sentences to skip
+            limit: maximum number of sentences to return, None for all of them
+            level: the level to rank for, the user's level if None
+
+        Returns:
+            (number of matching sentences, the requested page of ranked sentences)
 
+        Raises:
+            ValueError: if the query cannot be parsed
+        """
+        if not isinstance(query, Query):
+            query = Query(query)
+        level = level or self.user.user_level
+        index = self.user.sentence_dictionary.index
+        with metrics.stage("index_lookup"):
+            sentence_ids = query.evaluate(index.search)
+        if not len(sentence_ids):
+            return 0, []
+        return len(sentence_ids), self.sort_sentences(sentence_ids.tolist(), offset, limit, level, index)
+
+    def mine(self, word=None, max_unknown=1, offset=0, limit=None, level=None):
+        """
+        Finds sentences with few words the user does not know yet, see known_words, ranked for a JLPT level.
 
+        Args:
+            word: dictionary form the sentences have to contain, None for any sentence. The word counts as unknown
+                  unless it is known, so with max_unknown 1 it is the only new word of each sentence
+            max_unknown: the most unknown words a sentence may have. Without a word, sentences with no unknown word
+                         are left out, as they have nothing new to teach
+            offset: number of top-ranked sentences to skip
+            limit: maximum number of sentences to return, None for all of them
+            level: the level to rank for, the user's level if None
 
-    def sort_sentences(self, sentences):
+        Returns:
+            (number of matching sentences, the requested page of ranked sentences)
+        """
+        level = level or self.user.user_level
+        index = self.user.sentence_dictionary.index
+        parts = []
+        with metrics.stage("index_lookup"):
+            for segment, counts in zip(index.segments, self.user.known_words.unknown_counts(index)):
+                if word is None:
+                    candidates = np.flatnonzero(counts)
+                else:
+                    posting = segment.search(word)
+                    if not posting:
+                        continue
+                    candidates = np.frombuffer(posting, dtype=np.uint32)
+                candidates = candidates[counts[candidates] <= max_unknown]
+                parts.append(candidates.astype(np.uint32) + np.uint32(segment.base))
+            sentence_ids = np.concatenate(parts) if parts else np.empty(0, dtype=np.uint32)
+            if index.live is not None:
+                sentence_ids = sentence_ids[index.live[sentence_ids]]
+        if not len(sentence_ids):
+            return 0, []
+        return len(sentence_ids), self.sort_sentences(sentence_ids.tolist(), offset, limit, level, index)
+
+    def sort_sentences(self, sentence_ids, offset=0, limit=None, level=None, index=None):
         """
-        Sorts the sentences based on the number of words from each JLPT level, relative to the user's level.
+        Ranks the sentences by their weighted JLPT score for a level and builds only the requested page.
+        The level counts stored at index time are ranked in one vectorised call, see ranking.rank.
 
         Args:
-            sentences: the sentences to sort
+            sentence_ids: the IDs of the sentences to sort
+            offset: number of top-ranked sentences to skip
+            limit: maximum number of sentences to return, None for all of them
+            level: the level to rank for, the user's level if None
+            index: the index the sentence IDs were found in, the current book index if None
 
         Returns:
-            [[sentence,[scores],[words that aren't in a JLPT list], number of words in the sentence]
+            [[sentence,[scores],[words that aren't in a JLPT list], number of words in the sentence, sentence ID]
         """
-        match self.user.user_level:
-            case "N5":
-                sorted_sentences = sorted(sentences, key=lambda x: (x[1][0], x[1][1], x[1][2], x[1][3], x[1][4]), reverse = True)
-            case "N4":
-                sorted_sentences = sorted(sentences, key=lambda x: (x[1][1], x[1][0], x[1][2], x[1][3], x[1][4]), reverse = True)
-            case "N3":
-                sorted_sentences = sorted(sentences, key=lambda x: (x[1][2], x[1][1], x[1][0], x[1][3], x[1][4]), reverse = True)
-            case "N2":
-                sorted_sentences = sorted(sentences, key=lambda x: (x[1][3], x[1][2], x[1][1], x[1][0], x[1][4]), reverse = True)
-            case "N1":
-                sorted_sentences = sorted(sentences, key=lambda x: (x[1][4], x[1][3], x[1][2], x[1][1], x[1][0]), reverse = True)
+        level = level or self.user.user_level
+        if index is None:
+            index = self.user.sentence_dictionary.index
+        with metrics.stage("scoring"):
+            distributions = ranking.level_distributions(index, sentence_ids)
+        with metrics.stage("ranking"):
+            page = ranking.rank(distributions, level, offset, limit)
+
+        sorted_sentences = []
+        with metrics.stage("page"):
+            for row in page.tolist():
+                sentence_id = sentence_ids[row]
+                sorted_sentences.append([index.get_sentence(sentence_id), distributions[row].tolist(),
+                                         index.get_non_jlpt_words(sentence_id), index.get_word_count(sentence_id),
+                                         sentence_id])
         return sorted_sentences
 
-    def get_jisho_definition(self, word):
-        url = f"https://jisho.org/api/v1/search/words?keyword={word}"
-        response = requests.get(url)
-        data = response.json()
-        if data["data"]:
-            senses = data["data"][0]["senses"]
-            # Extract 'english_definitions' from each sense
-            definitions = [sense["english_definitions"] for sense in senses]
-            # Flatten the list if needed
-            flat_definitions = [definition for sublist in definitions for definition in sublist]
-            return flat_definitions
-        else:
-            return ["No definition found."]
+    def rank_sentence_ids(self, search_word, limit=None, level=None):
+        """
+        Ranks the sentences containing a word like search(), but only returns their IDs.
 
+        Args:
+            search_word: the dictionary form to search for
+            limit: maximum number of sentence IDs to return, None for all of them
+            level: the level to rank for, the user's level if None
 
+        Returns:
+            (number of sentences containing the word, IDs of the best ranked of them) or None if the word is not indexed
+        """
+        level = level or self.user.user_level
+        index = self.user.sentence_dictionary.index
+        sentence_ids = index.search(search_word)
+        if sentence_ids is None:
+            return None
+        with metrics.stage("scoring"):
+            distributions = ranking.level_distributions(index, sentence_ids)
+        with metrics.stage("ranking"):
+            page = ranking.rank(distributions, level, 0, limit)
+        return len(sentence_ids), [sentence_ids[row] for row in page.tolist()]
+
+    def get_jisho_definition(self, word, unresolved=None):
+        """
+        Args:
+            word: the word to define
+            unresolved: optional set the word is added to if the lookup failed or did not finish within its budget
 
+        Returns:
+            the definitions of the word, ["No definition found."] if there are none or they could not be looked up
+        """
+        # Shared, cached provider: concurrent searches for the same word make at most one request to Jisho
+        with metrics.stage("definition_fetch"):
+            results = self.user.JLPT_lists.definitions.get_many([word])
+        if word not in results and unresolved is not None:
+            unresolved.add(word)
+        definitions = results.get(word)
+        if definitions:
+            return definitions
+        else:
+            return ["No definition found."]
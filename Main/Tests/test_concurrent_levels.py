@@ -0,0 +1,127 @@
+import json
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+root_dir = os.path.dirname(os.path.dirname(current_dir))
+if root_dir not in sys.path:
+    sys.path.append(root_dir)
+
+from Main.Benchmark.corpus import generate_corpus, jlpt_vocabulary
+from Main.Model import ranking
+
+"""
+    Concurrent /hover_analyze requests for different JLPT levels against the threaded server. Every response has to be
+    ranked for the level of its own request, as if it had been the only request: the level travels with each request
+    and the shared User holds no per-request state.
+
+    The server answers from a User over a small synthetic corpus, with its word table, definition caches and book index
+    in a temporary directory, so the real library is neither loaded nor scanned. The response cache is disabled and
+    Jisho is never asked, so every request is searched and ranked again and the test needs no network.
+
+    Usage: python -m unittest discover -s Main/Tests
+"""
+
+LEVELS = ["N5", "N4", "N3", "N2", "N1"]
+PAGE_LIMIT = 20
+# Scores are rounded to 9 decimals when ranking
+TOLERANCE = 1e-9
+
+
+def post(url, payload):
+    data = json.dumps(payload).encode('utf-8')
+    http_request = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(http_request, timeout=60) as response:
+        return json.loads(response.read().decode('utf-8'))
+
+
+class ConcurrentLevelsTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        from werkzeug.serving import make_server
+        from Main import server
+        from Main.Model.user import User
+
+        cls.work_directory = tempfile.mkdtemp()
+        books_directory = os.path.join(cls.work_directory, "books")
+        generate_corpus(books_directory, 3000, books=3)
+        dictionary_directory = os.path.join(cls.work_directory, "dictionary_files")
+        cls.user = User("N5", books_directory=books_directory,
+                        index_directory=os.path.join(dictionary_directory, "book_index"),
+                        dictionary_directory=dictionary_directory)
+        cls.user.sentence_dictionary.wait_for_compaction()
+        cls.user.JLPT_lists.definitions.network_fallback = False
+        cls.user.response_cache.resize(0)
+        # The server answers from the test's user instead of loading the default one
+        server.start(lambda loader: cls.user).wait()
+
+        logging.getLogger("werkzeug").setLevel(logging.ERROR)
+        cls.http_server = make_server("127.0.0.1", 0, server.app, threaded=True)
+        threading.Thread(target=cls.http_server.serve_forever, daemon=True).start()
+        cls.url = f"http://127.0.0.1:{cls.http_server.server_port}/hover_analyze"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.http_server.shutdown()
+        cls.user.sentence_dictionary.index.close()
+        shutil.rmtree(cls.work_directory, ignore_errors=True)
+
+    def score(self, sentence_id, level):
+        """
+        :return: the score of a sentence for a level, from the level counts stored for it
+        """
+        level_counts, _, word_count = self.user.sentence_dictionary.get_sentence_scores(sentence_id)
+        weights = ranking.SCORE_DISTRIBUTIONS[level]
+        return sum(level_counts[i] / word_count * weights[i] for i in range(5)) if word_count else 0.0
+
+    def assert_ranked_for(self, word, level, response):
+        """
+        Checks that the page holds the best scoring sentences of the word for the level, best first.
+        """
+        self.assertTrue(response['found'], word)
+        page = [sentence['id'] for sentence in response['sentences']]
+        scores = [self.score(sentence_id, level) for sentence_id in page]
+        for better, worse in zip(scores, scores[1:]):
+            self.assertGreaterEqual(better, worse - TOLERANCE, f"{word} is not ranked for {level}")
+        others = set(self.user.sentence_dictionary.index.search(word)) - set(page)
+        if len(page) == PAGE_LIMIT and others:
+            self.assertLessEqual(max(self.score(sentence_id, level) for sentence_id in others),
+                                 scores[-1] + TOLERANCE, f"{word} has better sentences for {level} than its page")
+
+    def test_each_response_is_ranked_for_its_own_level(self):
+        index = self.user.sentence_dictionary.index
+        words = [word for word in jlpt_vocabulary() if len(index.search(word) or ()) > PAGE_LIMIT][:12]
+        self.assertTrue(words, "the corpus has no word with enough sentences")
+        requests = [{'text': word, 'offset': 0, 'level': level, 'page_limit': PAGE_LIMIT}
+                    for word in words for level in LEVELS]
+        # Only hovers that find the word as written, so each request is for the word it names
+        requests = [payload for payload in requests if post(self.url, payload).get('word') == payload['text']]
+        self.assertTrue(requests)
+
+        expected = [post(self.url, payload) for payload in requests]
+        pages = {}
+        for payload, response in zip(requests, expected):
+            self.assert_ranked_for(payload['text'], payload['level'], response)
+            pages.setdefault(payload['text'], set()).add(tuple(s['id'] for s in response['sentences']))
+        self.assertTrue(any(len(level_pages) > 1 for level_pages in pages.values()),
+                        "no word is ranked differently for different levels, so the test would not notice a mix-up")
+
+        replay = list(range(len(requests))) * 3
+        random.Random(0).shuffle(replay)
+        with ThreadPoolExecutor(16) as executor:
+            responses = list(executor.map(lambda i: post(self.url, requests[i]), replay))
+        for i, response in zip(replay, responses):
+            self.assertEqual(response, expected[i], f"{requests[i]['text']} for {requests[i]['level']}")
+            self.assert_ranked_for(requests[i]['text'], requests[i]['level'], response)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+import os
+import subprocess
+import sys
+import unittest
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+root_dir = os.path.dirname(os.path.dirname(current_dir))
+if root_dir not in sys.path:
+    sys.path.append(root_dir)
+
+from Main.Model import sudachipi
+
+"""
+    The size bound of the dictionary form cache: set from TOKENIZATION_CACHE_SIZE when sudachipi is imported and changed
+    at runtime with set_cache_size, as the server does for --tokenization-cache-size.
+
+    Usage: python -m unittest discover -s Main/Tests
+"""
+
+SENTENCES = ["猫が好きです。", "犬と散歩に行きました。", "明日は雨が降るでしょう。", "本を読むのが楽しい。", "駅まで歩いて十分です。"]
+
+
+class TokenizationCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.previous_size = sudachipi.dict_form_cache.max_size
+        sudachipi.dict_form_cache.clear()
+
+    def tearDown(self):
+        sudachipi.set_cache_size(self.previous_size)
+        sudachipi.dict_form_cache.clear()
+
+    def test_set_cache_size_bounds_the_cache(self):
+        sudachipi.set_cache_size(2)
+        forms = [sudachipi.get_dict_forms(sentence) for sentence in SENTENCES]
+        self.assertEqual(len(sudachipi.dict_form_cache), 2)
+        # The most recently analysed sentences are kept and give the same forms without tokenizing again
+        hits = sudachipi.cache_stats()["hits"]
+        self.assertEqual(sudachipi.get_dict_forms(SENTENCES[-1]), forms[-1])
+        self.assertEqual(sudachipi.cache_stats()["hits"], hits + 1)
+
+    def test_shrinking_evicts_the_least_recently_used(self):
+        sudachipi.set_cache_size(10)
+        for sentence in SENTENCES:
+            sudachipi.get_dict_forms(sentence)
+        sudachipi.set_cache_size(1)
+        self.assertEqual(len(sudachipi.dict_form_cache), 1)
+        self.assertIsNotNone(sudachipi.dict_form_cache.get(SENTENCES[-1]))
+
+    def test_zero_disables_the_cache(self):
+        sudachipi.set_cache_size(0)
+        sudachipi.get_dict_forms(SENTENCES[0])
+        self.assertEqual(len(sudachipi.dict_form_cache), 0)
+
+    def test_invalid_sizes_are_rejected(self):
+        for size in (-1, 2.5, "10", True, None):
+            with self.assertRaises(ValueError):
+                sudachipi.set_cache_size(size)
+
+    def test_environment_setting(self):
+        self.assertEqual(sudachipi.cache_size_setting({}), sudachipi.DEFAULT_CACHE_SIZE)
+        self.assertEqual(sudachipi.cache_size_setting({"TOKENIZATION_CACHE_SIZE": "50"}), 50)
+        self.assertEqual(sudachipi.cache_size_setting({"TOKENIZATION_CACHE_SIZE": "0"}), 0)
+        for value in ("-1", "many", ""):
+            with self.assertLogs(sudachipi.logger, "WARNING"):
+                self.assertEqual(sudachipi.cache_size_setting({"TOKENIZATION_CACHE_SIZE": value}),
+                                 sudachipi.DEFAULT_CACHE_SIZE)
+
+    def test_environment_applies_at_import(self):
+        environment = dict(os.environ, TOKENIZATION_CACHE_SIZE="123")
+        output = subprocess.run(
+            [sys.executable, "-c", "from Main.Model import sudachipi; print(sudachipi.dict_form_cache.max_size)"],
+            cwd=root_dir, env=environment, capture_output=True, text=True, check=True).stdout
+        self.assertEqual(output.strip(), "123")
+
+
+if __name__ == "__main__":
+    unittest.main()
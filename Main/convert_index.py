@@ -0,0 +1,33 @@
+import argparse
+import os
+import sys
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+if parent_dir not in sys.path:
+    sys.path.append(parent_dir)
+
+from Main.Model import index_format
+from Main.Model.list_management import list_management
+
+
+def main():
+    dictionary_dir = os.path.join(parent_dir, 'dictionary_files')
+    parser = argparse.ArgumentParser(description="Convert book_dictionary.txt to the binary book index format.")
+    parser.add_argument("source", nargs="?", default=os.path.join(dictionary_dir, 'book_dictionary.txt'))
+    parser.add_argument("destination", nargs="?", default=os.path.join(dictionary_dir, 'book_index.bin'))
+    args = parser.parse_args()
+
+    if not os.path.exists(args.source):
+        print(f"{args.source} does not exist.")
+        return
+
+    jlpt_lists = list_management()
+    jlpt_lists.initialise()
+    sentence_count, word_count = index_format.convert_text_index(args.source, args.destination,
+                                                                 jlpt_lists.get_level_table())
+    print(f"Wrote {sentence_count} sentences and {word_count} words to {args.destination}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+import argparse
+import os
+import sys
+import time
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+if parent_dir not in sys.path:
+    sys.path.append(parent_dir)
+
+from Main.Model import offline_dictionary
+
+
+def main():
+    dictionary_dir = os.path.join(parent_dir, 'dictionary_files')
+    parser = argparse.ArgumentParser(
+        description="Import a JMdict XML (JMdict_e.xml) or jmdict-simplified JSON file, optionally gzipped, as the "
+                    "offline dictionary.")
+    parser.add_argument("source")
+    parser.add_argument("destination", nargs="?", default=os.path.join(dictionary_dir, 'jmdict.bin'))
+    args = parser.parse_args()
+
+    if not os.path.exists(args.source):
+        print(f"{args.source} does not exist.")
+        return
+
+    start = time.perf_counter()
+    headword_count, entry_count = offline_dictionary.import_jmdict(args.source, args.destination)
+    print(f"Wrote {headword_count} headwords and {entry_count} entries to {args.destination} "
+          f"in {time.perf_counter() - start:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
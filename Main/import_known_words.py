@@ -0,0 +1,35 @@
+import argparse
+import os
+import sys
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+if parent_dir not in sys.path:
+    sys.path.append(parent_dir)
+
+from Main.Model.known_words import KnownWords, read_word_list
+
+
+def main():
+    dictionary_dir = os.path.join(parent_dir, 'dictionary_files')
+    parser = argparse.ArgumentParser(
+        description="Add the words of a word list (one dictionary form per line, or the first column of a "
+                    "tab-separated file) to the words you know.")
+    parser.add_argument("source")
+    parser.add_argument("destination", nargs="?", default=os.path.join(dictionary_dir, 'known_words.txt'))
+    parser.add_argument("--replace", action="store_true", help="forget the words known so far first")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.source):
+        print(f"{args.source} does not exist.")
+        return
+
+    known_words = KnownWords(args.destination)
+    if args.replace:
+        known_words.remove(list(known_words.words))
+    added = known_words.add(read_word_list(args.source))
+    print(f"Added {added} words, {len(known_words)} words are known.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+import argparse
+import logging
+import os
+import sys
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+if parent_dir not in sys.path:
+    sys.path.append(parent_dir)
+
+from Main.Model.book_management import MEMORY_BUDGET as BOOK_MEMORY_BUDGET, BookManagement
+from Main.Model.list_management import list_management
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Add new and changed books in book_files to the book index and retract removed ones.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="number of worker processes used to tokenize books (1 processes them serially)")
+    parser.add_argument("--memory-budget", type=int, default=BOOK_MEMORY_BUDGET // (1024 * 1024),
+                        help="megabytes of new sentences held in memory before they are written to the index")
+    parser.add_argument("--compact", action="store_true",
+                        help="merge the index segments into one even if they would not be merged yet")
+    args = parser.parse_args()
+    logging.basicConfig(level=os.environ.get("LOG_LEVEL", "INFO").upper(), format="%(message)s")
+
+    jlpt_lists = list_management()
+    jlpt_lists.initialise()
+    # An interrupted run resumes from the last checkpoint when this is run again
+    book_management = BookManagement(jlpt_lists, workers=max(1, args.workers),
+                                     memory_budget=args.memory_budget * 1024 * 1024)
+    if args.compact:
+        book_management.compact(wait=True)
+    # A merge started by the scan has to finish before the process exits
+    book_management.wait_for_compaction()
+    print(f"The book index holds {len(book_management.index)} sentences.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,4 @@
+import logging
 import sys
 import os
 
@@ -7,11 +8,43 @@ parent_dir = os.path.dirname(current_dir)
 if parent_dir not in sys.path:
     sys.path.append(parent_dir)
 
+from Main.Model.query import Query
+from Main.Model.startup import BackgroundLoader
 from Main.Model.user import User
 
 
+def show_sentences(user, sentences, level):
+    """
+    Prints the sentences one at a time with the words above the level, until the user asks for a new search.
+    """
+    for i, sentence_data in enumerate(sentences):
+        # sentence_data structure is [sentence_string, scores, non_jlpt_words, count, etc.]
+        sentence_text = sentence_data[0].strip()
+        print(f"\nSentence #{i + 1}:")
+        print(f"  {sentence_text}")
+
+        # --- NEW: Display definitions for difficult words ---
+        difficult_words = user.get_difficult_words_in_sentence(sentence_text, level)
+        if difficult_words:
+            print("  [Words above your level]:")
+            for word, w_level, w_def in difficult_words:
+                print(f"    - {word} ({w_level}): {w_def}")
+        # ----------------------------------------------------
+
+        # Simple pagination
+        if i < len(sentences) - 1:
+            cont = input("\n[Enter] for next sentence, [n] for new search: ").lower()
+            if cont == 'n':
+                break
+    print("-" * 30 + "\n")
+
+
 def main():
+    # Progress of loading is logged by the model
+    logging.basicConfig(level=os.environ.get("LOG_LEVEL", "INFO").upper(), format="%(message)s")
     print("--- Japanese Sentence Search Tool ---")
+    # Dictionaries and books load while the level is being entered
+    loader = BackgroundLoader(lambda _: User("N5"), name="user-loader")
 
     # 1. Get User Level
     while True:
@@ -20,19 +53,19 @@ def main():
             break
         print("Invalid level. Please enter N1, N2, N3, N4, or N5.")
 
-    print(f"\nInitializing dictionaries for level {level}...")
-    print("This may take a moment while we load the book data...")
+    if not loader.ready:
+        print(f"\nInitializing dictionaries for level {level}...")
+        print("This may take a moment while we load the book data...")
 
-    try:
-        user = User(level)
-        print("Initialization complete!\n")
-    except Exception as e:
-        print(f"Error initializing application: {e}")
+    user = loader.wait()
+    if user is None:
+        print(f"Error initializing application: {loader.error}")
         return
+    print("Initialization complete!\n")
 
     # 2. Main Search Loop
     while True:
-        search_word = input("Enter a word to search (or 'q' to quit): ").strip()
+        search_word = input("Enter a word or a query such as '彼女 結婚する' (or 'q' to quit): ").strip()
 
         if search_word.lower() == 't':
             print("Goodbye!")
@@ -42,8 +75,16 @@ def main():
             continue
 
         try:
+            query = Query(search_word)
+            if query.root[0] != "word":
+                # Several words, OR or NOT: every matching sentence, ranked like the sentences of a single word
+                count, sentences = user.search_query(query, level=level)
+                print(f"\n--- Found {count} Sentences for '{query}' ---")
+                show_sentences(user, sentences, level)
+                continue
+
             # Search returns a tuple: (definitions_list, sorted_sentences_list)
-            result = user.search_for_word(search_word)
+            result = user.search_for_word(search_word, level=level)
 
             if result:
                 definitions, sentences = result
@@ -58,27 +99,7 @@ def main():
 
                 # Display Sentences
                 print(f"\n--- Found {len(sentences)} Sentences ---")
-
-                for i, sentence_data in enumerate(sentences):
-                    # sentence_data structure is [sentence_string, scores, non_jlpt_words, count, etc.]
-                    sentence_text = sentence_data[0].strip()
-                    print(f"\nSentence #{i + 1}:")
-                    print(f"  {sentence_text}")
-
-                    # --- NEW: Display definitions for difficult words ---
-                    difficult_words = user.get_difficult_words_in_sentence(sentence_text)
-                    if difficult_words:
-                        print("  [Words above your level]:")
-                        for word, w_level, w_def in difficult_words:
-                            print(f"    - {word} ({w_level}): {w_def}")
-                    # ----------------------------------------------------
-
-                    # Simple pagination
-                    if i < len(sentences) - 1:
-                        cont = input("\n[Enter] for next sentence, [n] for new search: ").lower()
-                        if cont == 'n':
-                            break
-                print("-" * 30 + "\n")
+                show_sentences(user, sentences, level)
 
         except Exception as e:
             print(f"An error occurred during search: {e}")
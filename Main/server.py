@@ -1,6 +1,13 @@
+import argparse
+import bisect
+import functools
+import json
+import logging
 import sys
 import os
-from flask import Flask, request, jsonify
+import threading
+import time
+from flask import Flask, Response, g, request, jsonify
 from flask_cors import CORS
 
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -8,84 +15,609 @@ parent_dir = os.path.dirname(current_dir)
 if parent_dir not in sys.path:
     sys.path.append(parent_dir)
 
-from Main.Model.user import User
-from Main.Model.sudachipi import sentence_breakdown
+from Main.Model.startup import BackgroundLoader
+from Main.Model.user import INCOMPLETE_RESPONSE_TTL, User
+from Main.Model import metrics, ranking, sudachipi, tokenizer_pool
+from Main.Model.query import Query
+
+# LOG_LEVEL=DEBUG shows every lookup, WARNING only problems
+logging.basicConfig(level=os.environ.get("LOG_LEVEL", "INFO").upper(),
+                    format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 CORS(app)  # Allow the extension to communicate with this server
 
-print("Loading dictionaries... please wait.")
-user = User("N5")
-print("Server ready.")
+# Longest text /analyze_batch accepts, in characters
+MAX_BATCH_TEXT = 20000
+# Sentence IDs returned per word by /analyze_batch unless the request asks for another number
+BATCH_SENTENCES = 5
+
+# Sentences of a /hover_analyze response whose difficult words are analysed, the others on request via /sentence_details
+DETAILED_SENTENCES = 5
+
+# Seconds a request made while the server is still loading waits for it before being answered with 503
+READY_WAIT = 30
+
+user = None
+startup = None
+startup_lock = threading.Lock()
+
+REQUEST_SECONDS = metrics.histogram("http_request_seconds", "Seconds until the response of a request was ready to send",
+                                    ("endpoint", "status"))
+REQUESTS = metrics.counter("http_requests_total", "Requests answered", ("endpoint", "status"))
+
+
+def load_user(loader):
+    """
+    Opens the word lists, the definition caches and the book index as last saved, then loads the tokenizer so the
+    first hover does not have to.
+    """
+    logger.info("Loading dictionaries... please wait.")
+    loader.set_stage("loading dictionaries and book index")
+    user = User("N5", scan_books=False)
+    loader.set_stage("loading tokenizer")
+    tokenizer_pool.get_tokenizer()
+    logger.info(f"Server ready after {loader.status()['seconds']:.2f} s.")
+    return user
+
+
+def scan_library(loader):
+    """
+    Indexes books added since the last start. Requests are answered from the saved index meanwhile.
+    """
+    loader.set_stage("scanning for new books")
+    added_books = loader.value.update_book_library()
+    if added_books:
+        logger.info(f"Indexed {len(added_books)} new books.")
+
+
+def serve(load, loader):
+    global user
+    user = load(loader)
+    return user
+
+
+def start(load=None, then=None):
+    """
+    Starts loading the user in the background unless it has been started already, so importing this module loads
+    nothing. Flask accepts connections while it runs and /ready reports its progress.
+    :param load: called with the loader, returns the User to answer requests with. By default load_user followed by
+                 scan_library
+    :param then: work after loading, only used with load
+    :return: the BackgroundLoader
+    """
+    global startup
+    with startup_lock:
+        if startup is None:
+            if load is None:
+                load, then = load_user, scan_library
+            startup = BackgroundLoader(functools.partial(serve, load), then=then, name="server-startup")
+        return startup
+
+
+def count_parameter(data, name, default=None, minimum=0):
+    """
+    Reads a whole number from a request, given as a JSON number or as digits.
+    :param default: returned if the request does not have the parameter
+    :raises ValueError: if the value is not a whole number of at least minimum
+    """
+    value = data.get(name)
+    if value is None:
+        return default
+    if isinstance(value, str) and value.strip().isdigit():
+        value = int(value)
+    if isinstance(value, bool) or not isinstance(value, int) or value < minimum:
+        raise ValueError(f"'{name}' has to be a whole number of at least {minimum}")
+    return value
+
+
+def paging(data):
+    """
+    :return: the 'page_offset' (0 by default) and 'page_limit' (None, every sentence, by default) of a request
+    :raises ValueError: if either is not a whole number of at least 0
+    """
+    return count_parameter(data, 'page_offset', 0), count_parameter(data, 'page_limit')
+
+
+def requires_user(route):
+    """
+    Makes a route wait for the server to finish loading, answering 503 if it does not within READY_WAIT seconds.
+    Loading starts with the first such request if nothing started it before.
+    """
+    @functools.wraps(route)
+    def wrapper(*args, **kwargs):
+        loader = start()
+        if loader.wait(READY_WAIT) is None:
+            return jsonify({'error': "The server is still loading", **loader.status()}), 503
+        return route(*args, **kwargs)
+    return wrapper
+
+
+def cache_counters():
+    """
+    :return: the counters of every cache by name. The caches of the user are left out while the server is loading
+    """
+    stats = {'tokenization': sudachipi.cache_stats(), 'text_chunks': sudachipi.chunk_cache_stats()}
+    if user is not None:
+        stats['responses'] = user.response_cache.stats()
+        definitions = user.JLPT_lists.definitions.stats()
+        stats['definitions'] = {key[len("hot_"):]: value for key, value in definitions.items() if key.startswith("hot_")}
+    return stats
+
+
+def definition_counters():
+    return user.JLPT_lists.definitions.stats()
+
+
+def index_gauges():
+    index = user.sentence_dictionary.index
+    return {'sentences': len(index), 'segments': len(index.segments), 'dead': index.dead_count}
+
+
+# Read when /metrics is rendered; while the server is loading the ones that need the user are left out
+for field, kind in (('hits', 'counter'), ('misses', 'counter'), ('evictions', 'counter'), ('size', 'gauge')):
+    metrics.callback(f"cache_{field}" + ("_total" if kind == 'counter' else ""), f"Cache {field} by cache", kind,
+                     ("cache",), lambda field=field: {(name,): stats[field] for name, stats in cache_counters().items()})
+for field, documentation in (('offline_hits', "Definitions found in the offline dictionary"),
+                             ('upstream_fetches', "Definitions requested from Jisho"),
+                             ('coalesced', "Definition lookups that joined a Jisho request already in flight")):
+    metrics.callback(f"definition_{field}_total", documentation, 'counter', (),
+                     lambda field=field: {(): definition_counters()[field]})
+for field, documentation in (('sentences', "Sentence IDs in the book index, retracted ones included"),
+                             ('segments', "Segments of the book index"),
+                             ('dead', "Retracted sentences waiting for compaction")):
+    metrics.callback(f"index_{field}", documentation, 'gauge', (), lambda field=field: {(): index_gauges()[field]})
+
+
+@app.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+
+
+@app.after_request
+def record_request(response):
+    # Streamed responses are recorded once their headers are ready, the body may take longer
+    start = getattr(g, 'request_start', None)
+    if start is not None:
+        labels = {'endpoint': request.endpoint or "unknown", 'status': response.status_code}
+        REQUEST_SECONDS.observe(time.perf_counter() - start, **labels)
+        REQUESTS.inc(**labels)
+    return response
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Request and per-stage latency histograms, cache and index counters in the Prometheus text format."""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/ready', methods=['GET'])
+def ready():
+    """Health check: 200 once requests can be answered, 503 while loading or if loading failed."""
+    status = start().status()
+    return jsonify(status), 200 if status['ready'] else 503
 
 
 @app.route('/hover_analyze', methods=['POST'])
+@requires_user
 def hover_analyze():
     data = request.json
     text_chunk = data.get('text', '')
     offset = data.get('offset', 0)
     user_level = data.get('level', 'N5')
+    # Stream the response as NDJSON events, see stream_word
+    stream = data.get('stream', False)
+
+    # The level only travels with the request: the server is threaded and other requests may be for other levels
+    if user_level not in ranking.SCORE_DISTRIBUTIONS:
+        return jsonify({'error': f"Unknown level {user_level}"}), 400
+    # Optional paging of the ranked sentences, by default every sentence is returned
+    try:
+        page_offset, page_limit = paging(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # Hovers move around the same paragraph, so its tokenization is cached and the offset found by bisection
+    with metrics.stage("tokenize"):
+        target_word = sudachipi.tokenize_chunk(text_chunk).word_at(offset)
 
-    if user.user_level != user_level:
-        user.user_level = user_level
-        user.JLPT_lists.set_user_level(user_level)
+    if not target_word:
+        if stream:
+            return Response(ndjson([{'type': 'word', 'found': False}, {'type': 'done'}]),
+                            mimetype='application/x-ndjson')
+        return jsonify({'found': False})
 
-    sb = sentence_breakdown()
-    sb.set_sentence(text_chunk)
+    # Users hover the same words over and over, so finished responses are cached
+    key = (target_word, user_level, page_offset, page_limit)
+    if stream:
+        return Response(ndjson(stream_word(key, target_word, user_level, page_offset, page_limit)),
+                        mimetype='application/x-ndjson')
+    response = cached_response(key, lambda _: analyze_word(target_word, user_level, page_offset, page_limit))
+    return jsonify(response)
 
-    target_word = None
-    current_pos = 0
 
-    # Sudachi tokens
-    tokens = sb.tokenizer_obj.tokenize(text_chunk, sb.mode)
+def response_ttl(response):
+    """
+    :return: the seconds a response stays cached: briefly if it misses definitions that could not be looked up in
+             time, so a later request picks them up once they are fetched, None for the usual time
+    """
+    return INCOMPLETE_RESPONSE_TTL if response.get('unresolved_definitions') else None
 
-    for token in tokens:
-        token_len = len(token.surface())
-        # Check if the cursor offset falls within this token
-        if current_pos <= offset < current_pos + token_len:
-            target_word = token.dictionary_form()
-            break
-        current_pos += token_len
 
-    if not target_word:
-        return jsonify({'found': False})
+def cached_response(key, compute):
+    """
+    :return: the response cached under key, computed with compute(key) on a miss
+    """
+    return user.response_cache.get_or_compute(key, compute, ttl_of=response_ttl)
+
+
+def with_unresolved(response, unresolved):
+    """
+    Lists the words of a response whose definitions could not be looked up in time, if there are any.
+    """
+    if unresolved:
+        response['unresolved_definitions'] = sorted(unresolved)
+    return response
 
-    result = user.search_for_word(target_word)
+
+def difficult_words(sentence, user_level, target_word=None, unresolved=None):
+    """
+    :param unresolved: optional set the words whose definitions could not be looked up in time are added to
+    :return: the words of the sentence above the level, except the target word, as dictionaries for a response
+    """
+    return [{'word': w, 'level': l, 'def': d}
+            for w, l, d in user.get_difficult_words_in_sentence(sentence, user_level, unresolved)
+            if w != target_word]
+
+
+def analyze_word(target_word, user_level, page_offset, page_limit):
+    """
+    Searches for the word and enriches the first sentences with the words above the level.
+    :return: the /hover_analyze response as a dictionary
+    """
+    unresolved = set()
+    result = user.search_for_word(target_word, page_offset, page_limit, user_level, unresolved)
 
     if not result:
-        return jsonify({'found': False, 'word': target_word})
+        return {'found': False, 'word': target_word}
 
     definitions, sentences = result
 
     processed_sentences = []
 
-    # Optimization: Only process difficult words for the first 5 sentences
+    # Optimization: Only process difficult words for the first few sentences
     for i, s_data in enumerate(sentences):
         sent_text = s_data[0].strip()
 
         diff_words = []
-        # Only analyze difficult words for the first 5 to keep response time fast
-        if i < 5:
-            raw_diff_words = user.get_difficult_words_in_sentence(sent_text)
-            # Filter out the target word
-            diff_words = [
-                {'word': w, 'level': l, 'def': d}
-                for w, l, d in raw_diff_words
-                if w != target_word
-            ]
+        # Only analyze difficult words for the first few to keep response time fast
+        if i < DETAILED_SENTENCES:
+            diff_words = difficult_words(sent_text, user_level, target_word, unresolved)
 
         processed_sentences.append({
+            'id': s_data[4],
             'text': sent_text,
             'difficult_words': diff_words
         })
 
-    return jsonify({
+    return with_unresolved({
         'found': True,
         'word': target_word,
         'definitions': definitions,
         'sentences': processed_sentences
+    }, unresolved)
+
+
+def ndjson(events):
+    """
+    :return: iterator of the events as newline-delimited JSON
+    """
+    for event in events:
+        yield json.dumps(event, ensure_ascii=False) + "\n"
+
+
+def response_events(response):
+    """
+    :return: the events stream_word sends for a response built by analyze_word
+    """
+    yield {'type': 'word', 'found': response['found'], 'word': response['word'],
+           'definitions': response.get('definitions')}
+    for sentence in response.get('sentences', ()):
+        yield {'type': 'sentence', 'id': sentence['id'], 'text': sentence['text']}
+    for sentence in response.get('sentences', ())[:DETAILED_SENTENCES]:
+        yield {'type': 'difficult_words', 'id': sentence['id'], 'difficult_words': sentence['difficult_words']}
+    yield with_unresolved({'type': 'done'}, response.get('unresolved_definitions'))
+
+
+def stream_word(key, target_word, user_level, page_offset, page_limit):
+    """
+    The /hover_analyze response as events sent as soon as each part is ready: the word with its definitions, then every
+    ranked sentence, then the difficult words of the first sentences one sentence at a time, and finally 'done', which
+    lists the words whose definitions could not be looked up in time. The assembled response is cached under key, like one that is not streamed. While it is being assembled, other
+    requests for the same key wait for it instead of searching again, and then send it all at once.
+    """
+    cached = user.response_cache.get(key)
+    reservation = None if cached is not None else user.response_cache.reserve(key)
+    if reservation is None:
+        if cached is None:
+            # Another request is searching for the same page
+            cached = cached_response(key, lambda _: analyze_word(target_word, user_level, page_offset, page_limit))
+        yield from response_events(cached)
+        return
+
+    unresolved = set()
+    try:
+        result = user.search_for_word(target_word, page_offset, page_limit, user_level, unresolved)
+        if not result:
+            response = {'found': False, 'word': target_word}
+            reservation.complete(response)
+            yield from response_events(response)
+            return
+
+        definitions, sentences = result
+        yield {'type': 'word', 'found': True, 'word': target_word, 'definitions': definitions}
+        processed_sentences = [{'id': s_data[4], 'text': s_data[0].strip(), 'difficult_words': []}
+                               for s_data in sentences]
+        for sentence in processed_sentences:
+            yield {'type': 'sentence', 'id': sentence['id'], 'text': sentence['text']}
+        for sentence in processed_sentences[:DETAILED_SENTENCES]:
+            sentence['difficult_words'] = difficult_words(sentence['text'], user_level, target_word, unresolved)
+            yield {'type': 'difficult_words', 'id': sentence['id'], 'difficult_words': sentence['difficult_words']}
+    except BaseException:
+        # Also when the client disconnects mid-stream, so requests waiting for the response search themselves
+        reservation.abandon()
+        raise
+
+    response = with_unresolved({'found': True, 'word': target_word, 'definitions': definitions,
+                                'sentences': processed_sentences}, unresolved)
+    reservation.complete(response, response_ttl(response))
+    yield with_unresolved({'type': 'done'}, unresolved)
+
+
+@app.route('/query', methods=['POST'])
+@requires_user
+def query_sentences():
+    """
+    Ranked sentences matching a boolean query over dictionary forms, e.g. "彼女 結婚する" or "猫 (見る OR 聞く) -犬",
+    see query.Query. Takes the 'query', the 'level' and optionally 'page_offset' and 'page_limit'. The first sentences
+    come with their difficult words, leaving out the words of the query.
+    """
+    data = request.json
+    user_level = data.get('level', 'N5')
+    if user_level not in ranking.SCORE_DISTRIBUTIONS:
+        return jsonify({'error': f"Unknown level {user_level}"}), 400
+    try:
+        page_offset, page_limit = paging(data)
+        query = Query(data.get('query', ''))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    key = ("query", str(query), user_level, page_offset, page_limit)
+    return jsonify(cached_response(key, lambda _: analyze_query(query, user_level, page_offset, page_limit)))
+
+
+def analyze_query(query, user_level, page_offset, page_limit):
+    """
+    :return: the /query response as a dictionary
+    """
+    count, sentences = user.search_query(query, page_offset, page_limit, user_level)
+    words = query.words
+    unresolved = set()
+    processed_sentences = []
+    for i, s_data in enumerate(sentences):
+        sent_text = s_data[0].strip()
+        diff_words = []
+        if i < DETAILED_SENTENCES:
+            diff_words = [word for word in difficult_words(sent_text, user_level, unresolved=unresolved)
+                          if word['word'] not in words]
+        processed_sentences.append({'id': s_data[4], 'text': sent_text, 'difficult_words': diff_words})
+    return with_unresolved({
+        'found': count > 0,
+        'query': str(query),
+        'words': words,
+        'count': count,
+        'sentences': processed_sentences,
+    }, unresolved)
+
+
+@app.route('/known_words', methods=['GET', 'POST'])
+@requires_user
+def known_words():
+    """
+    GET lists the words the user knows. POST takes lists of words to 'add' and to 'remove', as dictionary forms.
+    """
+    if request.method == 'GET':
+        return jsonify({'count': len(user.known_words), 'words': sorted(user.known_words.words)})
+    data = request.json
+    add, remove = data.get('add', []), data.get('remove', [])
+    if not all(isinstance(words, list) and all(isinstance(word, str) for word in words) for words in (add, remove)):
+        return jsonify({'error': "'add' and 'remove' have to be lists of words"}), 400
+    return jsonify({
+        'added': user.known_words.add(add),
+        'removed': user.known_words.remove(remove),
+        'count': len(user.known_words),
     })
 
 
+@app.route('/mine', methods=['POST'])
+@requires_user
+def mine():
+    """
+    Sentences with few words the user does not know yet ("i+1" sentences), ranked for the level. Takes an optional
+    'word' the sentences have to contain, 'max_unknown' (default 1), the 'level' and optionally 'page_offset' and
+    'page_limit'. Each sentence lists its unknown words.
+    """
+    data = request.json
+    word = data.get('word')
+    user_level = data.get('level', 'N5')
+    if user_level not in ranking.SCORE_DISTRIBUTIONS:
+        return jsonify({'error': f"Unknown level {user_level}"}), 400
+    try:
+        max_unknown = count_parameter(data, 'max_unknown', 1)
+        page_offset, page_limit = paging(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if word is not None and not isinstance(word, str):
+        return jsonify({'error': "'word' has to be a dictionary form"}), 400
+
+    # Results change with the known words, so their version is part of the key
+    key = ("mine", word, user_level, max_unknown, page_offset, page_limit, user.known_words.version)
+
+    def compute(_):
+        count, sentences = user.mine_sentences(word, max_unknown, page_offset, page_limit, user_level)
+        return {
+            'word': word,
+            'count': count,
+            'sentences': [{'id': s_data[4], 'text': s_data[0].strip(),
+                           'unknown_words': user.get_unknown_words(s_data[4])} for s_data in sentences],
+        }
+
+    return jsonify(user.response_cache.get_or_compute(key, compute))
+
+
+@app.route('/sentence_details', methods=['GET', 'POST'])
+@requires_user
+def sentence_details():
+    """
+    The difficult words of one sentence, e.g. of a sentence past the first few of a /hover_analyze response or of an ID
+    returned by /analyze_batch. Takes the sentence 'id', the 'level' and optionally the hovered 'word' to leave out,
+    as JSON or as query parameters.
+    """
+    data = request.get_json(silent=True) or request.args
+    user_level = data.get('level', 'N5')
+    target_word = data.get('word')
+    try:
+        sentence_id = int(data.get('id'))
+    except (TypeError, ValueError):
+        return jsonify({'error': "A sentence id is required"}), 400
+
+    if user_level not in ranking.SCORE_DISTRIBUTIONS:
+        return jsonify({'error': f"Unknown level {user_level}"}), 400
+    if not user.sentence_dictionary.has_sentence(sentence_id):
+        return jsonify({'error': f"No sentence {sentence_id}"}), 404
+
+    key = ("details", sentence_id, user_level, target_word)
+    return jsonify(cached_response(key, lambda _: describe_sentence(sentence_id, user_level, target_word)))
+
+
+def describe_sentence(sentence_id, user_level, target_word=None):
+    """
+    :return: the /sentence_details response as a dictionary
+    """
+    level_counts, _, word_count = user.sentence_dictionary.get_sentence_scores(sentence_id)
+    text = user.sentence_dictionary.get_sentence(sentence_id).strip()
+    unresolved = set()
+    return with_unresolved({
+        'id': sentence_id,
+        'text': text,
+        'word_count': word_count,
+        'level_counts': list(level_counts),
+        'difficult_words': difficult_words(text, user_level, target_word, unresolved),
+    }, unresolved)
+
+
+@app.route('/analyze_batch', methods=['POST'])
+@requires_user
+def analyze_batch():
+    """
+    Analyses every word of a paragraph in one call, so the extension can answer hovers without asking again.
+    Takes the paragraph as 'text', the 'level', optionally the 'offsets' of the hovered characters (by default every
+    word except particles and punctuation) and 'top_n', the number of sentence IDs returned per word.
+    """
+    data = request.json
+    text = data.get('text', '')
+    offsets = data.get('offsets')
+    user_level = data.get('level', 'N5')
+
+    if user_level not in ranking.SCORE_DISTRIBUTIONS:
+        return jsonify({'error': f"Unknown level {user_level}"}), 400
+    if not isinstance(text, str):
+        return jsonify({'error': "'text' has to be a string"}), 400
+    if len(text) > MAX_BATCH_TEXT:
+        return jsonify({'error': f"Text is longer than {MAX_BATCH_TEXT} characters"}), 400
+    if offsets is not None and not (isinstance(offsets, list) and all(
+            isinstance(offset, int) and not isinstance(offset, bool) for offset in offsets)):
+        return jsonify({'error': "'offsets' has to be a list of character offsets"}), 400
+    try:
+        top_n = count_parameter(data, 'top_n', BATCH_SENTENCES, minimum=1)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    offsets = sorted(set(offsets)) if offsets is not None else None
+    tokens = []
+    # The text is tokenized once for every word in it, and not again for hovers over it later
+    for start, end, word, content in sudachipi.tokenize_chunk(text).tokens():
+        if offsets is None:
+            if not content:
+                continue
+        elif bisect.bisect_left(offsets, start) == bisect.bisect_left(offsets, end):
+            # No requested offset falls within this token
+            continue
+        tokens.append({'start': start, 'end': end, 'word': word})
+
+    words = list(dict.fromkeys(token['word'] for token in tokens))
+    unresolved = set()
+    described = describe_words(words, user_level, top_n, unresolved)
+    return jsonify(with_unresolved({'level': user_level, 'tokens': tokens, 'words': described}, unresolved))
+
+
+def describe_words(words, user_level, top_n, unresolved=None):
+    """
+    :param unresolved: optional set the words whose definitions could not be looked up in time are added to
+    :return: mapping of each word to its JLPT level, whether it is above user_level, its definition and the IDs of the
+             top_n sentences ranked for user_level
+    """
+    searches = user.search_many(words, top_n, user_level)
+    jlpt_results = {word: user.JLPT_lists.search_lists(word) for word in words}
+    # Words outside the JLPT lists are defined in one batch, offline where possible
+    outside_words = [word for word, result in jlpt_results.items() if result is None]
+    outside_definitions = user.JLPT_lists.get_jisho_definitions(outside_words)
+    if unresolved is not None:
+        unresolved.update(word for word in outside_words if word not in outside_definitions)
+
+    user_idx = user.JLPT_lists.levels.index(user_level)
+    described = {}
+    for word in words:
+        if jlpt_results[word]:
+            definition, level = jlpt_results[word]
+            difficult = user.JLPT_lists.levels.index(level) > user_idx
+        else:
+            definition, level = outside_definitions.get(word), "Outside JLPT"
+            difficult = definition is not None
+        count, sentence_ids = searches[word] or (0, [])
+        described[word] = {
+            'level': level,
+            'difficult': difficult,
+            'definition': definition,
+            'sentence_count': count,
+            'sentence_ids': sentence_ids,
+        }
+    return described
+
+
+@app.route('/cache_stats', methods=['GET'])
+@requires_user
+def cache_stats():
+    """Hit rates of the response, definition and tokenization caches."""
+    return jsonify({
+        'responses': user.response_cache.stats(),
+        'definitions': user.JLPT_lists.definitions.stats(),
+        'tokenization': sudachipi.cache_stats(),
+        'text_chunks': sudachipi.chunk_cache_stats(),
+    })
+
 if __name__ == '__main__':
-    app.run(port=5000)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Backend of the browser extension")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--tokenization-cache-size", type=int,
+                        help="sentences whose dictionary forms are cached, TOKENIZATION_CACHE_SIZE or 10000 by default")
+    args = parser.parse_args()
+    if args.tokenization_cache_size is not None:
+        try:
+            sudachipi.set_cache_size(args.tokenization_cache_size)
+        except ValueError as e:
+            parser.error(str(e))
+    start()
+    # Requests share no mutable state, so they are served on a thread each
+    app.run(port=args.port, threaded=True)
\ No newline at end of file